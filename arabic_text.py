@@ -0,0 +1,46 @@
+"""
+توحيد النص العربي للبحث.
+
+يُخزن لكل اسم نسخة موحدة (عمود ظل) يُبحث فيها بدلاً من النص الأصلي، فتتطابق
+الأشكال المختلفة لنفس الكلمة:
+- أشكال الألف (أ إ آ ٱ) -> ا
+- التاء المربوطة ة -> ه، والألف المقصورة ى -> ي
+- الهمزة على الواو/الياء (ؤ ئ) -> و/ي
+- حذف التشكيل والتطويل (ـ)
+- الأرقام العربية الهندية -> أرقام لاتينية، والحروف اللاتينية إلى صغيرة، ومسافة واحدة بين الكلمات
+"""
+import re
+
+_DIACRITICS = [chr(code) for code in range(0x064B, 0x0653)] + ["ٰ", "ـ"]
+
+_TRANSLATION = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ة": "ه",
+    "ى": "ي",
+    "ؤ": "و",
+    "ئ": "ي",
+    **{digit: str(i) for i, digit in enumerate("٠١٢٣٤٥٦٧٨٩")},
+    **{mark: None for mark in _DIACRITICS},
+})
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_arabic(text):
+    """النسخة الموحدة من النص للبحث (None تبقى None)."""
+    if text is None:
+        return None
+    return _SPACES.sub(" ", str(text).translate(_TRANSLATION).casefold()).strip()
+
+
+def trigrams(text):
+    """مجموعة المقاطع الثلاثية في النص الموحد (كما يقسمها مقسم trigram في FTS5)."""
+    text = normalize_arabic(text) or ""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(query_trigrams, text):
+    """نسبة مقاطع الاستعلام الموجودة في النص (0..1)، لترتيب النتائج التقريبية."""
+    if not query_trigrams:
+        return 0.0
+    return len(query_trigrams & trigrams(text)) / len(query_trigrams)
@@ -0,0 +1,44 @@
+"""
+ذاكرة LRU لمرفقات المستندات المعروضة في جدول المستندات.
+
+مرفقات الصفوف الظاهرة تُجلب مسبقاً باستعلام واحد (backend.get_attachments_for_documents) وتُحفظ هنا،
+فيُعرض المستند المحدد دون استعلام. عند امتلاء الذاكرة يُسقط الأقدم استخداماً فقط، فتبقى مرفقات
+الصفحة الحالية (الأحدث إضافة أو قراءة) محفوظة.
+"""
+from collections import OrderedDict
+
+DEFAULT_SIZE = 2000
+
+
+class AttachmentCache:
+    """{معرف المستند: [(id, filename, filepath, upload_date)]} بترتيب آخر استخدام."""
+
+    def __init__(self, maxsize=DEFAULT_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, document_id):
+        attachments = self._entries.get(document_id)
+        if attachments is not None:
+            self._entries.move_to_end(document_id)
+        return attachments
+
+    def put(self, document_id, attachments):
+        self._entries[document_id] = list(attachments)
+        self._entries.move_to_end(document_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, document_id):
+        self._entries.pop(document_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def apply_changes(self, change):
+        """إسقاط مستندات تغيرت مرفقاتها حسب fetch_changes_since()["tables"]["attachments"]."""
+        changed_documents = {att[4] for att in change["rows"]}
+        deleted = set(change["deleted"])
+        for document_id, attachments in list(self._entries.items()):
+            if document_id in changed_documents or any(att[0] in deleted for att in attachments):
+                del self._entries[document_id]
@@ -0,0 +1,268 @@
+"""
+فحص سلامة المرفقات في الخلفية.
+
+يعمل عاملان بالتوازي:
+- فاحص السجلات: يمر على جدول attachments على دفعات حسب id ويتحقق من وجود الملف
+  والمستند، ومن تطابق الحجم (والبصمة عند الطلب).
+- فاحص الملفات: يمر على ATTACHMENTS_DIR بترتيب الأسماء ويبحث عن ملفات لا يشير إليها أي سجل.
+  مجلد المرفقات مشترك بين كل قواعد السجل (db_registry)، فالملف لا يُعد يتيماً ما دامت أي منها
+  (أو أرشيفها) تشير إليه.
+
+كل دفعة تُقرأ في معاملة قصيرة، ويُحفظ موقع كل عامل في maintenance_state ليُستأنف
+الفحص من حيث توقف. عند طلب الإصلاح تُحذف سجلات المرفقات التي حُذف مستندها، وتُنقل الملفات
+اليتيمة إلى مجلد الحجر، وتُكمل أحجام وبصمات السجلات القديمة. السجلات التي فُقد ملفها يُبلغ
+عنها فقط، ولا تُحذف إلا بطلب صريح (delete_missing)، فمسارات قديمة بعد نقل مجلد المرفقات
+لا تمحو كل السجلات دفعة واحدة. وقبل أي حذف أو تحديث يُعاد قراءة مسار السجل والتحقق منه داخل
+معاملة الإصلاح، لأن ضغط المرفقات قد يبدل المسار بين القراءة والإصلاح.
+"""
+import os
+import time
+import shutil
+import threading
+
+import backend
+import db_registry
+
+ROWS_CURSOR_KEY = "integrity.last_attachment_id"
+FILES_CURSOR_KEY = "integrity.last_filename"
+LAST_COMPLETED_KEY = "integrity.last_completed"
+BATCH_SIZE = 200
+BATCH_PAUSE_SECONDS = 0.05
+# الملفات الأحدث من هذه المدة قد تكون قيد الإضافة (نُسخت ولم يُسجَّل صفها بعد) فلا تُعد يتيمة
+ORPHAN_GRACE_SECONDS = 600
+
+# أنواع المشكلات
+MISSING_FILE = "ملف مفقود"
+MISSING_DOCUMENT = "مستند محذوف"
+SIZE_MISMATCH = "اختلاف الحجم"
+HASH_MISMATCH = "اختلاف البصمة"
+ORPHAN_FILE = "ملف يتيم"
+
+
+def sharing_databases(db_path):
+    """قواعد السجل الموجودة التي تشارك db_path مجلد المرفقات، ومنها db_path نفسها أولاً."""
+    current = os.path.abspath(db_path)
+    others = [os.path.abspath(path) for path in db_registry.get_registry().values()]
+    return [current] + sorted({path for path in others if path != current and os.path.exists(path)})
+
+
+def quarantine_dir():
+    return os.path.join(os.path.dirname(os.path.abspath(backend.ATTACHMENTS_DIR)), "attachments_quarantine")
+
+
+def _free_quarantine_path(target_dir, name):
+    """مسار في الحجر لا يطمس ملفاً محجوراً سابقاً بالاسم نفسه: يُضاف الوقت ثم عداد عند التكرار."""
+    target = os.path.join(target_dir, name)
+    if not os.path.exists(target):
+        return target
+    stem, ext = os.path.splitext(name)
+    stamped = f"{stem}.{time.strftime('%Y%m%d_%H%M%S')}"
+    target = os.path.join(target_dir, stamped + ext)
+    counter = 1
+    while os.path.exists(target):
+        counter += 1
+        target = os.path.join(target_dir, f"{stamped}_{counter}{ext}")
+    return target
+
+
+class AttachmentIntegrityCheck:
+    """
+    مهمة فحص (وإصلاح اختياري) تعمل في خيوط خلفية.
+    الواجهة تقرأ progress وissues دورياً؛ stop() يوقف المهمة بعد الدفعة الحالية مع حفظ الموقع.
+    """
+
+    def __init__(self, repair=False, verify_hashes=False, batch_size=BATCH_SIZE, pause=BATCH_PAUSE_SECONDS,
+                 delete_missing=False):
+        self.repair = repair
+        self.delete_missing = delete_missing
+        self.verify_hashes = verify_hashes
+        self.batch_size = batch_size
+        self.pause = pause
+        self.issues = []
+        self.progress = {"rows": 0, "files": 0, "repaired": 0}
+        self.error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._db_path = backend.current_database()
+
+    # --- التحكم ---
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._guard, args=(self._check_rows,), name="dms-integrity-rows", daemon=True),
+            threading.Thread(target=self._guard, args=(self._check_files,), name="dms-integrity-files", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def wait(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+        return not self.is_running()
+
+    def run(self):
+        """تشغيل الفحص وانتظار انتهائه (لسطر الأوامر)."""
+        self.start().wait()
+        if self.error is None and not self._stop.is_set():
+            backend.set_maintenance_state(LAST_COMPLETED_KEY, time.strftime("%Y-%m-%d %H:%M:%S"))
+        return self.issues
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.progress), list(self.issues)
+
+    # --- التنفيذ ---
+    def _guard(self, worker):
+        try:
+            with backend.using_database(self._db_path):
+                worker()
+        except Exception as e:
+            self.error = e
+
+    def _report(self, kind, attachment_id, filepath, details=""):
+        with self._lock:
+            self.issues.append((kind, attachment_id, filepath, details))
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.progress[key] += amount
+
+    def _check_rows(self):
+        last_id = int(backend.get_maintenance_state(ROWS_CURSOR_KEY, 0))
+        while not self._stop.is_set():
+            with backend.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT a.id, a.filepath, a.file_size, a.sha256, d.id
+                    FROM attachments a
+                    LEFT JOIN documents d ON d.id = a.document_id
+                    WHERE a.id > ?
+                    ORDER BY a.id
+                    LIMIT ?
+                """, (last_id, self.batch_size))
+                rows = cursor.fetchall()
+            if not rows:
+                backend.set_maintenance_state(ROWS_CURSOR_KEY, 0)
+                return
+
+            dangling_ids = []
+            missing = []
+            backfill = []
+            for attachment_id, filepath, file_size, sha256, document_id in rows:
+                if document_id is None:
+                    self._report(MISSING_DOCUMENT, attachment_id, filepath)
+                    dangling_ids.append(attachment_id)
+                    continue
+                try:
+                    actual_size = os.path.getsize(filepath)
+                except OSError:
+                    self._report(MISSING_FILE, attachment_id, filepath)
+                    missing.append((attachment_id, filepath))
+                    continue
+                if file_size is None:
+                    backfill.append((actual_size, backend.file_sha256(filepath), attachment_id, filepath))
+                elif actual_size != file_size:
+                    self._report(SIZE_MISMATCH, attachment_id, filepath, f"{file_size} ≠ {actual_size}")
+                elif self.verify_hashes and sha256 and backend.file_sha256(filepath) != sha256:
+                    self._report(HASH_MISMATCH, attachment_id, filepath)
+
+            if not self.delete_missing:
+                missing = []
+            if self.repair and (dangling_ids or missing or backfill):
+                with backend.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("BEGIN IMMEDIATE")
+                    deleted_missing = self._still_missing(cursor, missing)
+                    cursor.executemany("DELETE FROM attachments WHERE id = ?", [(i,) for i in dangling_ids + deleted_missing])
+                    # مسار تغير منذ القراءة (ضغط المرفق مثلاً): البيانات المحسوبة تخص الملف القديم
+                    cursor.executemany("UPDATE attachments SET file_size = ?, sha256 = ? WHERE id = ? AND filepath = ?", backfill)
+                    backfilled = cursor.rowcount if backfill else 0
+                    if dangling_ids:
+                        backend._insert_audit(cursor, "إصلاح المرفقات", f"حذف {len(dangling_ids)} سجل مرفق معلق: {', '.join(map(str, dangling_ids))}")
+                    if deleted_missing:
+                        backend._insert_audit(cursor, "إصلاح المرفقات", f"حذف {len(deleted_missing)} سجل مرفق ملفه مفقود: {', '.join(map(str, deleted_missing))}")
+                    conn.commit()
+                self._count("repaired", len(dangling_ids) + len(deleted_missing) + max(backfilled, 0))
+
+            last_id = rows[-1][0]
+            backend.set_maintenance_state(ROWS_CURSOR_KEY, last_id)
+            self._count("rows", len(rows))
+            time.sleep(self.pause)
+
+    @staticmethod
+    def _still_missing(cursor, missing):
+        """معرفات السجلات التي ما زال ملفها مفقوداً بمسارها الحالي في القاعدة (داخل معاملة الإصلاح)."""
+        confirmed = []
+        for attachment_id, _ in missing:
+            row = cursor.execute("SELECT filepath FROM attachments WHERE id = ?", (attachment_id,)).fetchone()
+            if row is not None and not os.path.exists(row[0]):
+                confirmed.append(attachment_id)
+        return confirmed
+
+    def _check_files(self):
+        directory = backend.ATTACHMENTS_DIR
+        if not os.path.isdir(directory):
+            return
+        last_name = backend.get_maintenance_state(FILES_CURSOR_KEY, "")
+        databases = sharing_databases(self._db_path)
+        # ملفات المستندات المؤرشفة تبقى في مجلد المرفقات وسجلاتها في قواعد الأرشيف
+        archived = set()
+        for db_path in databases:
+            with backend.using_database(db_path):
+                archived |= backend.fetch_archived_attachment_paths()
+        names = sorted(entry.name for entry in os.scandir(directory) if entry.is_file() and entry.name > last_name)
+        for start in range(0, len(names), self.batch_size):
+            if self._stop.is_set():
+                return
+            batch = names[start:start + self.batch_size]
+            paths = [os.path.join(directory, name) for name in batch]
+            placeholders = ",".join("?" * len(paths))
+            referenced = set()
+            for db_path in databases:
+                with backend.using_database(db_path), backend.get_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(f"SELECT filepath FROM attachments WHERE filepath IN ({placeholders})", paths)
+                    referenced.update(row[0] for row in cursor.fetchall())
+            newest_allowed = time.time() - ORPHAN_GRACE_SECONDS
+            quarantined = []
+            for path in paths:
+                if path in referenced or path in archived:
+                    continue
+                try:
+                    if os.path.getmtime(path) > newest_allowed:
+                        continue
+                except OSError:
+                    continue
+                self._report(ORPHAN_FILE, None, path)
+                if self.repair:
+                    target = self._quarantine(path)
+                    if target:
+                        quarantined.append(f"{path} ← {os.path.basename(target)}")
+            if quarantined:
+                # المسار الأصلي مسجل مع اسم الملف في الحجر (قد يختلف عنه) لإمكان إعادته
+                backend.log_audit_event("إصلاح المرفقات", f"نقل {len(quarantined)} ملف يتيم إلى الحجر: {', '.join(quarantined)}")
+            backend.set_maintenance_state(FILES_CURSOR_KEY, batch[-1])
+            self._count("files", len(batch))
+            time.sleep(self.pause)
+        backend.set_maintenance_state(FILES_CURSOR_KEY, "")
+
+    def _quarantine(self, path):
+        """نقل ملف يتيم إلى مجلد الحجر وإرجاع مساره الجديد (أو None عند الفشل)."""
+        target_dir = quarantine_dir()
+        try:
+            if not os.path.exists(target_dir):
+                os.makedirs(target_dir)
+            target = _free_quarantine_path(target_dir, os.path.basename(path))
+            shutil.move(path, target)
+            self._count("repaired")
+            return target
+        except OSError as e:
+            self._report(ORPHAN_FILE, None, path, f"تعذر النقل إلى الحجر: {e}")
+            return None
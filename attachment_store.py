@@ -0,0 +1,187 @@
+"""
+ضغط المرفقات عند التخزين وفكها عند الفتح.
+
+عند تفعيل الضغط (db_registry.compress_attachments) يُضغط الملف أثناء نسخه إلى مجلد
+المرفقات بصيغة gzip ويُضاف إلى اسمه COMPRESSED_SUFFIX، فيبقى كل ملف معرفاً بنفسه
+دون عمود إضافي، وتعمل النسخ الاحتياطية وفحص السلامة على الملف المخزن كما هو.
+الصيغ المضغوطة أصلاً (صور JPEG/PNG، ملفات Office الحديثة وZIP، ...) تُعرف من أول
+بايتاتها وتُخزن كما هي، وكذلك أي ملف لا يوفر الضغط فيه MIN_SAVING من حجمه.
+
+عند الفتح يُفك الملف إلى مجلد مؤقت خاص بالمستخدم (CACHE_DIR، صلاحيات 0700) ويُعاد استخدامه ما دام أحدث من الملف
+المخزن؛ وتُحذف أقدم النسخ المفكوكة استخداماً عند تجاوز CACHE_LIMIT_BYTES.
+"""
+import os
+import gzip
+import shutil
+import stat
+import hashlib
+import tempfile
+
+COMPRESSED_SUFFIX = ".dmsz"
+COMPRESSION_LEVEL = 6
+MIN_SAVING = 0.05
+CHUNK_SIZE = 1024 * 1024
+
+
+def _user_suffix():
+    if hasattr(os, "getuid"):
+        return str(os.getuid())
+    try:
+        import getpass
+        return getpass.getuser()
+    except Exception:
+        return "user"
+
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), f"dms_attachment_cache_{_user_suffix()}")
+CACHE_LIMIT_BYTES = 512 * 1024 * 1024
+
+# بدايات الصيغ المضغوطة أصلاً
+_COMPRESSED_SIGNATURES = (
+    b"PK\x03\x04",            # ZIP وملفات Office الحديثة (docx/xlsx/pptx) وODF
+    b"\x1f\x8b",              # gzip
+    b"BZh",                   # bzip2
+    b"\xfd7zXZ\x00",          # xz
+    b"7z\xbc\xaf\x27\x1c",    # 7z
+    b"Rar!",                  # RAR
+    b"\xff\xd8\xff",          # JPEG
+    b"\x89PNG",               # PNG
+    b"GIF8",                  # GIF
+    b"RIFF",                  # WebP/AVI/WAV
+    b"\x00\x00\x00\x0cjP",    # JPEG 2000
+    b"ID3",                   # MP3
+)
+
+
+def is_compressed(filepath):
+    return filepath.endswith(COMPRESSED_SUFFIX)
+
+
+def is_compressible(filepath):
+    """هل يستحق الملف الضغط؟ (ليس بصيغة مضغوطة أصلاً حسب أول بايتاته)."""
+    with open(filepath, "rb") as f:
+        head = f.read(12)
+    if head.startswith(_COMPRESSED_SIGNATURES):
+        return False
+    # حاويات MP4/MOV/HEIC: "ftyp" بعد أول أربعة بايتات
+    return head[4:8] != b"ftyp"
+
+
+class _DigestWriter:
+    """كاتب يحسب حجم وبصمة ما يُكتب إلى الملف الفعلي (مخرجات gzip)."""
+
+    def __init__(self, f):
+        self._f = f
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.digest.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    def flush(self):
+        self._f.flush()
+
+
+def compress_file(source, destination):
+    """
+    ضغط source إلى destination تدفقياً. يعيد (حجم الملف المخزن، بصمته)، أو None إذا
+    كان التوفير أقل من MIN_SAVING (ولا يُنشأ destination ليُخزن الملف كما هو).
+    الكتابة إلى ملف مؤقت بجانبه يحل محله عند النجاح فقط، فلا يبقى ملف ناقص إذا امتلأ القرص مثلاً.
+    """
+    original_size = 0
+    temp_path = destination + ".part"
+    try:
+        with open(source, "rb") as src, open(temp_path, "wb") as dst:
+            writer = _DigestWriter(dst)
+            # mtime=0 وبلا اسم ملف: نفس المحتوى يعطي نفس الملف المضغوط ونفس البصمة
+            with gzip.GzipFile(filename="", mode="wb", fileobj=writer, compresslevel=COMPRESSION_LEVEL, mtime=0) as gz:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    gz.write(chunk)
+                    original_size += len(chunk)
+        if writer.size > original_size * (1 - MIN_SAVING):
+            return None
+        os.replace(temp_path, destination)
+        return writer.size, writer.digest.hexdigest()
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def ensure_private_dir(path):
+    """
+    إنشاء مجلد لا يقرؤه غير المستخدم الحالي (0700)، ورفض مجلد موجود يملكه مستخدم آخر
+    أو رابط رمزي، حتى لا تُكتب نسخ مستندات الموظفين المفكوكة في مكان يطلع عليه غيره.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return path  # ويندوز: المجلد المؤقت خاص بالمستخدم أصلاً
+    info = os.lstat(path)
+    if stat.S_ISLNK(info.st_mode) or not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"مجلد الذاكرة المؤقتة غير آمن (يملكه مستخدم آخر أو ليس مجلداً): {path}")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def trim_cache(keep_path):
+    """
+    حذف أقدم الملفات استخداماً في CACHE_DIR حتى لا تتجاوز CACHE_LIMIT_BYTES، مع إبقاء keep_path.
+    يشمل المجلدات الفرعية (تنزيلات وضع العميل في remote_client.DOWNLOAD_DIR) بحد واحد مشترك.
+    """
+    entries = []
+    for root, _, names in os.walk(CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            if path == keep_path:
+                continue
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    try:
+        total += os.path.getsize(keep_path)
+    except OSError:
+        pass
+    for _, size, path in sorted(entries):
+        if total <= CACHE_LIMIT_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass  # مفتوح في برنامج آخر (ويندوز)؛ يُحاول حذفه في المرة القادمة
+
+
+def readable_path(filepath):
+    """
+    مسار يمكن فتحه مباشرة: الملف نفسه إن لم يكن مضغوطاً، وإلا نسخته المفكوكة في الذاكرة المؤقتة.
+    الاسم المفكوك يحتفظ بالامتداد الأصلي ليفتحه البرنامج المناسب.
+    """
+    if not is_compressed(filepath):
+        return filepath
+    ensure_private_dir(CACHE_DIR)
+    cached = os.path.join(CACHE_DIR, os.path.basename(filepath)[:-len(COMPRESSED_SUFFIX)])
+    try:
+        fresh = os.path.getmtime(cached) >= os.path.getmtime(filepath)
+    except OSError:
+        fresh = False
+    if fresh:
+        os.utime(cached)  # تحديث ترتيب الاستخدام (LRU)
+    else:
+        temp_path = cached + ".part"
+        with gzip.open(filepath, "rb") as src, open(temp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(temp_path, cached)
+    trim_cache(cached)
+    return cached
+
+
+def extract_to(filepath, destination):
+    """نسخ المحتوى الأصلي لمرفق (مضغوط أو لا) إلى destination."""
+    opener = gzip.open if is_compressed(filepath) else open
+    with opener(filepath, "rb") as src, open(destination, "wb") as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
@@ -1,117 +1,740 @@
 import os
+import re
+import json
+import math
+import queue
+import atexit
+import shutil
+import hashlib
 import sqlite3
-from datetime import datetime, timedelta
-import pandas as pd
+import threading
+import pathlib
+from contextlib import contextmanager
+from datetime import datetime
+from query_metrics import InstrumentedConnection, get_file_logger
+import datecodec
+from arabic_text import normalize_arabic, trigrams, similarity
+import db_registry
+import attachment_store
 
-# إعداد المسارات
+# إعداد المسارات (قابلة للتهيئة عبر db_registry: ملف databases.json أو متغيرات DMS_*)
 script_dir = os.path.dirname(os.path.abspath(__file__))
-DB_NAME = os.path.join(script_dir, 'document_management.db')
-ATTACHMENTS_DIR = os.path.join(script_dir, 'attachments')
+DB_NAME = db_registry.default_database_path()
+ATTACHMENTS_DIR = db_registry.attachments_dir()
 
 if not os.path.exists(ATTACHMENTS_DIR):
     os.makedirs(ATTACHMENTS_DIR)
 
+def _chunks(items, size=500):
+    """تقسيم قائمة إلى أجزاء لا تتجاوز حد معاملات SQLite في جمل IN."""
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+# --- الاتصال بقاعدة البيانات ---
+_thread_local = threading.local()
+_reuse_connections = False
+
+def enable_connection_reuse():
+    """
+    تفعيل إعادة استخدام اتصال واحد لكل خيط (يستخدمه الخادم كمجمع اتصالات).
+    يفعّل أيضاً وضع WAL حتى لا يحجب الكاتب القراء المتزامنين.
+    """
+    global _reuse_connections
+    _reuse_connections = True
+    with get_connection() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+
+def current_database():
+    """مسار قاعدة البيانات المستخدمة في الخيط الحالي."""
+    return getattr(_thread_local, "db_path", None) or DB_NAME
+
+def set_database(db_path):
+    """تغيير قاعدة البيانات الافتراضية للعملية كلها."""
+    global DB_NAME
+    DB_NAME = db_path
+
+@contextmanager
+def using_database(db_path):
+    """توجيه دوال backend في الخيط الحالي إلى قاعدة بيانات أخرى داخل كتلة with."""
+    previous = getattr(_thread_local, "db_path", None)
+    _thread_local.db_path = db_path
+    try:
+        yield db_path
+    finally:
+        _thread_local.db_path = previous
+
+def get_connection():
+    """فتح اتصال بقاعدة البيانات تمر استعلاماته عبر طبقة القياس (query_metrics)."""
+    db_path = current_database()
+    if _reuse_connections:
+        connections = getattr(_thread_local, "connections", None)
+        if connections is None:
+            connections = _thread_local.connections = {}
+        conn = connections.get(db_path)
+        if conn is None:
+            conn = connections[db_path] = _open_connection(db_path, timeout=30)
+        return conn
+    return _open_connection(db_path)
+
+def _open_connection(db_path, timeout=5.0):
+    conn = sqlite3.connect(db_path, factory=InstrumentedConnection, timeout=timeout)
+    # تفعيل قيود المفاتيح الأجنبية (ON DELETE CASCADE / SET NULL) فهي معطلة افتراضياً في SQLite
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
 # --- دوال تحويل التاريخ ---
+# التواريخ مخزنة كأرقام أيام صحيحة (انظر datecodec)
 def convert_date_to_db_format(date_str_ddmmyyyy):
     if not date_str_ddmmyyyy:
         return None
     try:
-        return datetime.strptime(date_str_ddmmyyyy, "%d-%m-%Y").strftime("%Y-%m-%d")
+        return datecodec.parse_display(date_str_ddmmyyyy)
     except ValueError:
         raise ValueError("تنسيق تاريخ غير صحيح. يرجى استخدام DD-MM-YYYY.")
 
-def convert_date_from_db_format(date_str_yyyymmdd):
-    if not date_str_yyyymmdd:
-        return ""
+def convert_date_from_db_format(day_number):
     try:
-        return datetime.strptime(date_str_yyyymmdd, "%Y-%m-%d").strftime("%d-%m-%Y")
-    except ValueError:
+        return datecodec.format_day(day_number)
+    except (TypeError, ValueError, OverflowError):
         return ""
 
 # --- إنشاء قاعدة البيانات ---
+# تعريفات الجداول التي تحتوي تواريخ، مشتركة بين الإنشاء وترحيل التواريخ إلى أرقام صحيحة
+_TABLE_COLUMNS = {
+    "documents": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        number TEXT NOT NULL UNIQUE,
+        date INTEGER NOT NULL,
+        expiry_date INTEGER,
+        issuer TEXT NOT NULL,
+        employee_id INTEGER,
+        category TEXT,
+        tags TEXT,
+        name_norm TEXT,
+        issuer_norm TEXT,
+        FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE SET NULL
+    ''',
+    "employees": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        employee_number TEXT NOT NULL UNIQUE,
+        department TEXT,
+        contact_info TEXT,
+        hire_date INTEGER,
+        name_norm TEXT
+    ''',
+    "audit_log": '''
+        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp INTEGER NOT NULL,
+        user_action TEXT NOT NULL,
+        details TEXT
+    ''',
+    "attachments": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        document_id INTEGER NOT NULL,
+        filename TEXT NOT NULL,
+        filepath TEXT NOT NULL,
+        upload_date INTEGER NOT NULL,
+        file_size INTEGER,
+        sha256 TEXT,
+        FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+    ''',
+    "salaries": '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        employee_id INTEGER NOT NULL,
+        basic_salary REAL NOT NULL, -- هذا هو الراتب الشهري
+        allowances REAL NOT NULL,
+        deductions REAL NOT NULL,
+        net_salary REAL NOT NULL,
+        payment_method TEXT NOT NULL,
+        payment_date INTEGER NOT NULL,
+        FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+    ''',
+}
+
+# الأعمدة التي كانت نصية: رقم يوم لتواريخ YYYY-MM-DD، أو ثوانٍ لطوابع YYYY-MM-DD HH:MM:SS (بالتوقيت المحلي)
+_DAY_COLUMNS = {
+    "documents": ["date", "expiry_date"],
+    "employees": ["hire_date"],
+    "salaries": ["payment_date"],
+}
+_TIMESTAMP_COLUMNS = {
+    "audit_log": ["timestamp"],
+    "attachments": ["upload_date"],
+}
+
+# إصدار المخطط في PRAGMA user_version؛ يُكتب في نهاية create_database بعد اكتمال كل الجداول والمشغلات
+# 1: التواريخ أرقام أيام. 2: جداول الإحصاءات وسجل التغييرات والفهارس المضافة بعده.
+# 3: أعمدة الظل الموحدة (name_norm/issuer_norm) معبأة للصفوف القديمة.
+SCHEMA_VERSION = 3
+
+def readonly_uri(db_path):
+    """عنوان file: لفتح قاعدة للقراءة فقط؛ المسار مُرمّز فلا تُفسَّر فيه ? و# و% كأجزاء من العنوان."""
+    return pathlib.Path(db_path).resolve().as_uri() + "?mode=ro"
+
+def schema_version(db_path=None):
+    """إصدار مخطط قاعدة (PRAGMA user_version) بفتحها للقراءة فقط، دون ترحيل أو أقفال كتابة."""
+    conn = sqlite3.connect(readonly_uri(db_path or current_database()), uri=True)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
 def create_database():
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
+        # يسري فوراً على القاعدة الجديدة قبل إنشاء أول جدول؛ القائمة تُحوّل في نهاية الدالة
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                number TEXT NOT NULL UNIQUE,
-                date TEXT NOT NULL,
-                expiry_date TEXT,
-                issuer TEXT NOT NULL,
-                employee_id INTEGER,
-                category TEXT,
-                tags TEXT,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE SET NULL
-            )
-        ''')
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS documents ({_TABLE_COLUMNS['documents']})")
         cursor.execute("PRAGMA table_info(documents)")
         columns = [col[1] for col in cursor.fetchall()]
         if 'category' not in columns:
             cursor.execute("ALTER TABLE documents ADD COLUMN category TEXT")
         if 'tags' not in columns:
             cursor.execute("ALTER TABLE documents ADD COLUMN tags TEXT")
+        # أعمدة ظل موحدة للبحث العربي (انظر arabic_text)
+        if 'name_norm' not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN name_norm TEXT")
+        if 'issuer_norm' not in columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN issuer_norm TEXT")
 
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS employees (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                employee_number TEXT NOT NULL UNIQUE,
-                department TEXT,
-                contact_info TEXT,
-                hire_date TEXT
-            )
-        ''')
-
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS audit_log (
-                log_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                user_action TEXT NOT NULL,
-                details TEXT
-            )
-        ''')
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS employees ({_TABLE_COLUMNS['employees']})")
+        cursor.execute("PRAGMA table_info(employees)")
+        if 'name_norm' not in [col[1] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE employees ADD COLUMN name_norm TEXT")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS audit_log ({_TABLE_COLUMNS['audit_log']})")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS attachments ({_TABLE_COLUMNS['attachments']})")
+        cursor.execute("PRAGMA table_info(attachments)")
+        attachment_columns = [col[1] for col in cursor.fetchall()]
+        if 'file_size' not in attachment_columns:
+            cursor.execute("ALTER TABLE attachments ADD COLUMN file_size INTEGER")
+        if 'sha256' not in attachment_columns:
+            cursor.execute("ALTER TABLE attachments ADD COLUMN sha256 TEXT")
 
+        # حالة مهام الصيانة الخلفية (مثل مؤشر الاستئناف لفحص المرفقات)
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS attachments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id INTEGER NOT NULL,
-                filename TEXT NOT NULL,
-                filepath TEXT NOT NULL,
-                upload_date TEXT NOT NULL,
-                FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+            CREATE TABLE IF NOT EXISTS maintenance_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
             )
         ''')
 
         # جدول الرواتب الجديد
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS salaries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                employee_id INTEGER NOT NULL,
-                basic_salary REAL NOT NULL, -- هذا هو الراتب الشهري
-                allowances REAL NOT NULL,
-                deductions REAL NOT NULL,
-                net_salary REAL NOT NULL,
-                payment_method TEXT NOT NULL,
-                payment_date TEXT NOT NULL,
-                FOREIGN KEY (employee_id) REFERENCES employees(id) ON DELETE CASCADE
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS salaries ({_TABLE_COLUMNS['salaries']})")
+
+        conn.commit()
+        cursor.execute("PRAGMA user_version")
+        version = cursor.fetchone()[0]
+        if version < 1:
+            _migrate_dates_to_numbers(conn)
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attachments_document_id ON attachments(document_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_attachments_filepath ON attachments(filepath)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_salaries_employee_date ON salaries(employee_id, payment_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_employee_id ON documents(employee_id)")
+        _create_archive_registry(cursor)
+        _create_payroll_summary(cursor)
+        _create_document_stats(cursor)
+        if version < 3:
+            # مرة واحدة لكل قاعدة: الصفوف الجديدة تُعبأ أعمدتها في add_/update_ (المسح دون فهرس مكلف)
+            _backfill_normalized_names(cursor)
+        _create_search_index(cursor)
+        _create_tag_index(cursor)
+        _create_content_index(cursor)
+        _create_change_log(cursor)
+
+        if version < SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            _enable_incremental_vacuum(conn)
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+def _enable_incremental_vacuum(conn):
+    """
+    تحويل قاعدة قائمة إلى auto_vacuum=INCREMENTAL لتُستعاد مساحة المحذوفات على شرائح
+    (انظر db_maintenance). يتطلب VACUUM كاملاً مرة واحدة؛ إذا كانت القاعدة مشغولة في برنامج
+    آخر يُؤجل التحويل إلى التشغيل التالي.
+    """
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    try:
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError:
+        return
+    _insert_audit(conn.cursor(), "صيانة قاعدة البيانات", "تفعيل الاستعادة التزايدية للمساحة (auto_vacuum=INCREMENTAL)")
+    conn.commit()
+
+def _migrate_dates_to_numbers(conn):
+    """
+    ترحيل الأعمدة النصية للتواريخ إلى أرقام أيام صحيحة والطوابع الزمنية إلى ثوانٍ.
+    نوع العمود في SQLite لا يتغير بـ ALTER، فيُعاد بناء كل جدول لا يزال عموده نصياً
+    (نسخ إلى جدول جديد ثم استبدال) في معاملة واحدة مع تعطيل المفاتيح الأجنبية مؤقتاً.
+    مشغلات الملخص تُحذف هنا وتُعاد بتعبير الشهر الجديد في _create_payroll_summary.
+    """
+    cursor = conn.cursor()
+    to_rebuild = []
+    for table in _TABLE_COLUMNS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        declared = {col[1]: col[2].upper() for col in cursor.fetchall()}
+        converted = _DAY_COLUMNS.get(table, []) + _TIMESTAMP_COLUMNS.get(table, [])
+        if any(declared.get(column) == "TEXT" for column in converted):
+            to_rebuild.append(table)
+    if not to_rebuild:
+        return
+
+    cursor.execute("PRAGMA foreign_keys = OFF")
+    try:
+        cursor.execute("BEGIN")
+        for trigger_name in _PAYROLL_TRIGGER_NAMES:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+        for table in to_rebuild:
+            cursor.execute(f"PRAGMA table_info({table})")
+            old_columns = [col[1] for col in cursor.fetchall()]
+            select_list = []
+            for column in old_columns:
+                if column in _DAY_COLUMNS.get(table, []):
+                    select_list.append(f"CAST(julianday(NULLIF({column}, '')) - 2440587.5 AS INTEGER)")
+                elif column in _TIMESTAMP_COLUMNS.get(table, []):
+                    select_list.append(f"CAST(strftime('%s', {column}, 'utc') AS INTEGER)")
+                else:
+                    select_list.append(column)
+            cursor.execute(f"CREATE TABLE {table}_migrated ({_TABLE_COLUMNS[table]})")
+            cursor.execute(f"INSERT INTO {table}_migrated ({', '.join(old_columns)}) SELECT {', '.join(select_list)} FROM {table}")
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_migrated RENAME TO {table}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("PRAGMA foreign_keys = ON")
+
+# --- فهرس البحث الموحد (FTS5 بمقسم trigram) ---
+# جداول FTS خارجية المحتوى: النص يبقى في documents/employees، والفهرس يُحدث بالمشغلات.
+# أعمدة *_norm تُملأ من بايثون عند الإضافة والتعديل، فلا تعتمد المشغلات على دوال مخصصة.
+_SEARCH_INDEXES = {
+    "documents_fts": ("documents", ["name_norm", "issuer_norm", "number", "category", "tags"]),
+    "employees_fts": ("employees", ["name_norm", "employee_number", "department"]),
+}
+
+def _search_index_triggers(fts_table, table, columns):
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    delete_old = f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_insert AFTER INSERT ON {table} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_delete AFTER DELETE ON {table} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts_table}_update AFTER UPDATE OF {column_list} ON {table} BEGIN {delete_old} {insert_new} END",
+    ]
+
+def _backfill_normalized_names(cursor):
+    """تعبئة أعمدة الظل الموحدة للصفوف القديمة التي لم تُملأ بعد."""
+    cursor.execute("SELECT id, name, issuer FROM documents WHERE name_norm IS NULL OR issuer_norm IS NULL")
+    rows = [(normalize_arabic(name), normalize_arabic(issuer), doc_id) for doc_id, name, issuer in cursor.fetchall()]
+    cursor.executemany("UPDATE documents SET name_norm = ?, issuer_norm = ? WHERE id = ?", rows)
+    cursor.execute("SELECT id, name FROM employees WHERE name_norm IS NULL")
+    rows = [(normalize_arabic(name), emp_id) for emp_id, name in cursor.fetchall()]
+    cursor.executemany("UPDATE employees SET name_norm = ? WHERE id = ?", rows)
+
+def _create_search_index(cursor):
+    for fts_table, (table, columns) in _SEARCH_INDEXES.items():
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,))
+        is_new = cursor.fetchone() is None
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"{', '.join(columns)}, content='{table}', content_rowid='id', tokenize='trigram')"
+        )
+        for trigger_sql in _search_index_triggers(fts_table, table, columns):
+            cursor.execute(trigger_sql)
+        if is_new:
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+# عدد مرفقات كل مستند كعمود أخير: استعلام فرعي على الفهرس المغطي idx_attachments_document_id لكل صف معروض
+_DOCUMENT_SEARCH_COLUMNS = (
+    "id, name, number, date, expiry_date, issuer, category, tags, "
+    "(SELECT COUNT(*) FROM attachments a WHERE a.document_id = documents.id)"
+)
+_EMPLOYEE_COLUMNS = "id, name, employee_number, department, contact_info, hire_date"
+# البحث التقريبي: عدد المرشحين من الفهرس قبل إعادة الترتيب، وأدنى نسبة مقاطع مشتركة للقبول
+FUZZY_CANDIDATE_LIMIT = 500
+FUZZY_THRESHOLD = 0.4
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+# --- فهرس العلامات ---
+# documents.tags يبقى النص كما أدخله المستخدم، وتُفكك العلامات إلى tags/document_tags
+# للتصفية المطابقة وعدّ الاستخدام دون مسح كل المستندات.
+_TAG_SEPARATORS = re.compile(r"[,،]")
+
+def split_tags(text):
+    """تفكيك نص العلامات (مفصولة بفاصلة عربية أو لاتينية) إلى قائمة بلا تكرار أو فراغات."""
+    if not text:
+        return []
+    return list(dict.fromkeys(tag.strip() for tag in _TAG_SEPARATORS.split(text) if tag.strip()))
+
+def _set_document_tags(cursor, doc_id, tags_text):
+    tag_names = json.dumps(split_tags(tags_text), ensure_ascii=False)
+    cursor.execute("DELETE FROM document_tags WHERE document_id = ?", (doc_id,))
+    cursor.execute("INSERT OR IGNORE INTO tags (name) SELECT value FROM json_each(?)", (tag_names,))
+    cursor.execute(
+        "INSERT OR IGNORE INTO document_tags (document_id, tag_id) "
+        "SELECT ?, id FROM tags WHERE name IN (SELECT value FROM json_each(?))",
+        (doc_id, tag_names)
+    )
+
+def _create_tag_index(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document_tags'")
+    is_new = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_tags (
+            document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+            tag_id INTEGER NOT NULL REFERENCES tags(id) ON DELETE CASCADE,
+            PRIMARY KEY (document_id, tag_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags(tag_id, document_id)")
+    if is_new:
+        cursor.execute("SELECT id, tags FROM documents WHERE tags IS NOT NULL AND tags != ''")
+        for doc_id, tags_text in cursor.fetchall():
+            _set_document_tags(cursor, doc_id, tags_text)
+
+# --- فهرس محتوى المرفقات ---
+# النص المستخرج من المرفقات (انظر content_index) يُخزن موحداً في جدول FTS5 رقم صفه هو
+# attachments.id، ويُحذف مع المرفق عبر المشغل.
+def _create_content_index(cursor):
+    cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS attachment_content USING fts5(text, tokenize='unicode61')")
+    cursor.execute(
+        "CREATE TRIGGER IF NOT EXISTS trg_attachment_content_delete AFTER DELETE ON attachments "
+        "BEGIN DELETE FROM attachment_content WHERE rowid = old.id; END"
+    )
+
+# --- سجل التغييرات ---
+# كل إضافة أو تعديل أو حذف في الجداول التالية يُسجل بمشغل كصف صغير (الجدول، رقم الصف، العملية)
+# برقم تغيير متزايد، فتعرف الواجهات المفتوحة على نفس القاعدة ما تغير بسؤال MAX(change_id) فقط.
+# AUTOINCREMENT يضمن ألا يُعاد استخدام رقم تغيير بعد التقليم.
+CHANGE_LOG_TABLES = ("documents", "employees", "salaries", "attachments")
+CHANGE_LOG_KEEP = 20000
+CHANGE_LOG_TRIM_EVERY = 1000
+# أكثر من هذا العدد من الصفوف المتغيرة: يُطلب من الواجهة إعادة التحميل الكامل بدل التطبيق صفاً صفاً
+CHANGE_FETCH_LIMIT = 2000
+
+def _create_change_log(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL
+        )
+    ''')
+    for table in CHANGE_LOG_TABLES:
+        for event, op, row in (("INSERT", "I", "new"), ("UPDATE", "U", "new"), ("DELETE", "D", "old")):
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_{event.lower()} AFTER {event} ON {table} "
+                f"BEGIN INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', {row}.id, '{op}'); END"
             )
-        ''')
+    # إضافة مرفق أو حذفه يغير عدد مرفقات مستنده المعروض في صفه
+    for event, row in (("INSERT", "new"), ("DELETE", "old")):
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS trg_change_log_attachments_document_{event.lower()} AFTER {event} ON attachments "
+            f"BEGIN INSERT INTO change_log (table_name, row_id, op) VALUES ('documents', {row}.document_id, 'U'); END"
+        )
+    # تقليم تلقائي: كل CHANGE_LOG_TRIM_EVERY تغيير تُحذف السجلات الأقدم من آخر CHANGE_LOG_KEEP
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS trg_change_log_trim AFTER INSERT ON change_log "
+        f"WHEN new.change_id % {CHANGE_LOG_TRIM_EVERY} = 0 "
+        f"BEGIN DELETE FROM change_log WHERE change_id <= new.change_id - {CHANGE_LOG_KEEP}; END"
+    )
+
+def _create_archive_registry(cursor):
+    """سجل السنوات المنقولة إلى قواعد الأرشيف (انظر قسم أرشيف السنوات المغلقة)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            year INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            archived_at INTEGER NOT NULL,
+            PRIMARY KEY (year, kind)
+        ) WITHOUT ROWID
+    ''')
+
+# --- ملخصات الرواتب الشهرية (تُحدث تلقائياً عبر المشغلات) ---
+# مفتاح الشهر YYYY-MM مستخرج من رقم يوم الدفع
+PAYROLL_MONTH_SQL = datecodec.SQL_MONTH
+
+_PAYROLL_TRIGGER_NAMES = [
+    "trg_salaries_summary_insert", "trg_salaries_summary_delete", "trg_salaries_summary_update",
+    "trg_employees_summary_department", "trg_employees_summary_delete",
+]
+
+_SUMMARY_ADD_COLUMNS = """
+    ON CONFLICT (month, department, payment_method) DO UPDATE SET
+        total_basic = total_basic + excluded.total_basic,
+        total_allowances = total_allowances + excluded.total_allowances,
+        total_deductions = total_deductions + excluded.total_deductions,
+        total_net = total_net + excluded.total_net,
+        headcount = headcount + excluded.headcount
+"""
+
+def _payroll_summary_triggers():
+    """
+    مشغلات تحافظ على payroll_monthly_summary متسقاً مع salaries.
+    الملخص يشمل فقط الرواتب المرتبطة بموظف موجود (مثل الربط في fetch_all_salaries)،
+    لذا عند حذف موظف تُطرح رواتبه قبل الحذف، وتتجاهل مشغلات حذف الرواتب المتتالية (CASCADE) ذلك الموظف.
+    """
+    new_month = PAYROLL_MONTH_SQL.format("NEW.payment_date")
+    old_month = PAYROLL_MONTH_SQL.format("OLD.payment_date")
+    row_month = PAYROLL_MONTH_SQL.format("payment_date")
+
+    def subtract_row(prefix, month):
+        return f"""
+            UPDATE payroll_monthly_summary SET
+                total_basic = total_basic - {prefix}.basic_salary,
+                total_allowances = total_allowances - {prefix}.allowances,
+                total_deductions = total_deductions - {prefix}.deductions,
+                total_net = total_net - {prefix}.net_salary,
+                headcount = headcount - 1
+            WHERE month = {month} AND payment_method = {prefix}.payment_method
+              AND department = (SELECT COALESCE(department, '') FROM employees WHERE id = {prefix}.employee_id);
+            DELETE FROM payroll_monthly_summary
+            WHERE month = {month} AND payment_method = {prefix}.payment_method AND headcount <= 0;
+        """
+
+    add_new_row = f"""
+            INSERT INTO payroll_monthly_summary (month, department, payment_method, total_basic, total_allowances, total_deductions, total_net, headcount)
+            SELECT {new_month}, COALESCE(department, ''), NEW.payment_method, NEW.basic_salary, NEW.allowances, NEW.deductions, NEW.net_salary, 1
+            FROM employees WHERE id = NEW.employee_id
+            {_SUMMARY_ADD_COLUMNS};
+    """
+
+    employee_salaries = f"""
+        SELECT {row_month} AS month, payment_method,
+               SUM(basic_salary) AS basic, SUM(allowances) AS allow, SUM(deductions) AS deduct,
+               SUM(net_salary) AS net, COUNT(*) AS cnt
+        FROM salaries WHERE employee_id = OLD.id GROUP BY 1, 2
+    """
 
+    def subtract_employee(department):
+        return f"""
+            UPDATE payroll_monthly_summary SET
+                total_basic = total_basic - agg.basic,
+                total_allowances = total_allowances - agg.allow,
+                total_deductions = total_deductions - agg.deduct,
+                total_net = total_net - agg.net,
+                headcount = headcount - agg.cnt
+            FROM ({employee_salaries}) AS agg
+            WHERE payroll_monthly_summary.month = agg.month
+              AND payroll_monthly_summary.payment_method = agg.payment_method
+              AND payroll_monthly_summary.department = COALESCE({department}, '');
+            DELETE FROM payroll_monthly_summary WHERE department = COALESCE({department}, '') AND headcount <= 0;
+        """
+
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_salaries_summary_insert AFTER INSERT ON salaries BEGIN
+            {add_new_row}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_salaries_summary_delete AFTER DELETE ON salaries BEGIN
+            {subtract_row("OLD", old_month)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_salaries_summary_update
+            AFTER UPDATE OF employee_id, basic_salary, allowances, deductions, net_salary, payment_method, payment_date ON salaries BEGIN
+            {subtract_row("OLD", old_month)}
+            {add_new_row}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_employees_summary_department AFTER UPDATE OF department ON employees
+            WHEN COALESCE(OLD.department, '') <> COALESCE(NEW.department, '') BEGIN
+            {subtract_employee("OLD.department")}
+            INSERT INTO payroll_monthly_summary (month, department, payment_method, total_basic, total_allowances, total_deductions, total_net, headcount)
+            SELECT month, COALESCE(NEW.department, ''), payment_method, basic, allow, deduct, net, cnt FROM ({employee_salaries}) WHERE true
+            {_SUMMARY_ADD_COLUMNS};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_employees_summary_delete BEFORE DELETE ON employees BEGIN
+            {subtract_employee("OLD.department")}
+        END""",
+    ]
+
+def _create_payroll_summary(cursor):
+    """إنشاء جدول ملخص الرواتب ومشغلاته، وتعبئته من البيانات الحالية عند إنشائه لأول مرة."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'payroll_monthly_summary'")
+    is_new = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_monthly_summary (
+            month TEXT NOT NULL,
+            department TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            total_basic REAL NOT NULL DEFAULT 0,
+            total_allowances REAL NOT NULL DEFAULT 0,
+            total_deductions REAL NOT NULL DEFAULT 0,
+            total_net REAL NOT NULL DEFAULT 0,
+            headcount INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, department, payment_method)
+        ) WITHOUT ROWID
+    ''')
+    for trigger_sql in _payroll_summary_triggers():
+        cursor.execute(trigger_sql)
+    if is_new:
+        _rebuild_payroll_summary(cursor)
+
+def _rebuild_payroll_summary(cursor):
+    # رواتب السنوات المؤرشفة ليست في القاعدة الرئيسية، فملخصها المحفوظ عند الأرشفة يبقى كما هو
+    cursor.execute(
+        "DELETE FROM payroll_monthly_summary WHERE CAST(substr(month, 1, 4) AS INTEGER) NOT IN "
+        "(SELECT year FROM archive_partitions WHERE kind = 'salaries')"
+    )
+    cursor.execute(f"""
+        INSERT INTO payroll_monthly_summary (month, department, payment_method, total_basic, total_allowances, total_deductions, total_net, headcount)
+        SELECT {PAYROLL_MONTH_SQL.format("s.payment_date")}, COALESCE(e.department, ''), s.payment_method,
+               SUM(s.basic_salary), SUM(s.allowances), SUM(s.deductions), SUM(s.net_salary), COUNT(*)
+        FROM salaries s
+        JOIN employees e ON s.employee_id = e.id
+        GROUP BY 1, 2, 3
+    """)
+
+def rebuild_payroll_summary():
+    """إعادة حساب ملخص الرواتب بالكامل من جدول الرواتب (للإصلاح فقط؛ المشغلات تحافظ عليه عادةً)."""
+    with get_connection() as conn:
+        _rebuild_payroll_summary(conn.cursor())
+        conn.commit()
+    log_audit_event("إعادة بناء ملخص الرواتب", "تمت إعادة حساب ملخص الرواتب الشهرية من جدول الرواتب")
+
+# --- عدادات المستندات للوحة المعلومات (تُحدث تلقائياً عبر المشغلات) ---
+# عدد المستندات لكل يوم انتهاء، ولكل فئة ولكل جهة إصدار. الحالة (منتهية/قرب الانتهاء/صالحة) تُشتق
+# عند القراءة بجمع نطاقات أيام حول اليوم الحالي، فالانتقال إلى يوم جديد لا يتطلب إعادة كتابة أي عداد.
+_DOCUMENT_FACETS = ("category", "issuer")
+
+def _document_stats_triggers():
+    def add_row(prefix):
+        return f"""
+            INSERT INTO document_expiry_counts (expiry_day, documents)
+            SELECT {prefix}.expiry_date, 1 WHERE {prefix}.expiry_date IS NOT NULL
+            ON CONFLICT (expiry_day) DO UPDATE SET documents = documents + 1;
+            INSERT INTO document_facet_counts (facet, value, documents)
+            VALUES ('category', COALESCE({prefix}.category, ''), 1), ('issuer', COALESCE({prefix}.issuer, ''), 1)
+            ON CONFLICT (facet, value) DO UPDATE SET documents = documents + 1;
+        """
+
+    def subtract_row(prefix):
+        facet_match = f"""(facet = 'category' AND value = COALESCE({prefix}.category, ''))
+                OR (facet = 'issuer' AND value = COALESCE({prefix}.issuer, ''))"""
+        return f"""
+            UPDATE document_expiry_counts SET documents = documents - 1 WHERE expiry_day = {prefix}.expiry_date;
+            DELETE FROM document_expiry_counts WHERE expiry_day = {prefix}.expiry_date AND documents <= 0;
+            UPDATE document_facet_counts SET documents = documents - 1 WHERE {facet_match};
+            DELETE FROM document_facet_counts WHERE documents <= 0 AND ({facet_match});
+        """
+
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_documents_stats_insert AFTER INSERT ON documents BEGIN
+            {add_row("NEW")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_documents_stats_delete AFTER DELETE ON documents BEGIN
+            {subtract_row("OLD")}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_documents_stats_update AFTER UPDATE OF expiry_date, category, issuer ON documents
+            WHEN OLD.expiry_date IS NOT NEW.expiry_date OR OLD.category IS NOT NEW.category OR OLD.issuer IS NOT NEW.issuer BEGIN
+            {subtract_row("OLD")}
+            {add_row("NEW")}
+        END""",
+    ]
+
+def _create_document_stats(cursor):
+    """إنشاء جداول عدادات المستندات ومشغلاتها، وتعبئتها من البيانات الحالية عند إنشائها لأول مرة."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document_expiry_counts'")
+    is_new = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_expiry_counts (
+            expiry_day INTEGER PRIMARY KEY,
+            documents INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS document_facet_counts (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            documents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (facet, value)
+        ) WITHOUT ROWID
+    ''')
+    for trigger_sql in _document_stats_triggers():
+        cursor.execute(trigger_sql)
+    if is_new:
+        _rebuild_document_stats(cursor)
+
+def _rebuild_document_stats(cursor):
+    cursor.execute("DELETE FROM document_expiry_counts")
+    cursor.execute("DELETE FROM document_facet_counts")
+    cursor.execute("""
+        INSERT INTO document_expiry_counts (expiry_day, documents)
+        SELECT expiry_date, COUNT(*) FROM documents WHERE expiry_date IS NOT NULL GROUP BY expiry_date
+    """)
+    for facet in _DOCUMENT_FACETS:
+        cursor.execute(f"""
+            INSERT INTO document_facet_counts (facet, value, documents)
+            SELECT ?, COALESCE({facet}, ''), COUNT(*) FROM documents GROUP BY 2
+        """, (facet,))
+
+def rebuild_document_stats():
+    """إعادة حساب عدادات المستندات بالكامل (للإصلاح فقط؛ المشغلات تحافظ عليها عادةً)."""
+    with get_connection() as conn:
+        _rebuild_document_stats(conn.cursor())
+        conn.commit()
+    log_audit_event("إعادة بناء عدادات المستندات", "تمت إعادة حساب عدادات لوحة المعلومات من جدول المستندات")
+
+# --- حالة مهام الصيانة ---
+def get_maintenance_state(key, default=None):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM maintenance_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+    return row[0] if row else default
+
+def set_maintenance_state(key, value):
+    with get_connection() as conn:
+        conn.execute("INSERT INTO maintenance_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                     (key, None if value is None else str(value)))
         conn.commit()
 
 # --- سجل التدقيق ---
+def _insert_audit(cursor, action, details):
+    """إضافة سجل تدقيق ضمن معاملة قائمة."""
+    timestamp = datecodec.now_timestamp()
+    cursor.execute("INSERT INTO audit_log (timestamp, user_action, details) VALUES (?, ?, ?)",
+                   (timestamp, action, details))
+
 def log_audit_event(action, details):
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT INTO audit_log (timestamp, user_action, details) VALUES (?, ?, ?)",
-                       (timestamp, action, details))
+        _insert_audit(cursor, action, details)
         conn.commit()
 
+# نصوص سجل التدقيق لعمليات التصدير من الواجهة (الخادم لا يقبل سجلات تدقيق بنص حر من العملاء)
+_EXPORT_AUDIT = {
+    "documents": ("تصدير بيانات", "تم تصدير جميع المستندات إلى ملف Excel: {}"),
+    "salaries": ("تصدير رواتب", "تم تصدير جميع الرواتب إلى ملف Excel: {}"),
+}
+
+def log_data_export(kind, destination):
+    """تسجيل تصدير المستندات أو الرواتب (kind: documents أو salaries) إلى ملف في سجل التدقيق."""
+    if kind not in _EXPORT_AUDIT:
+        raise ValueError(f"نوع تصدير غير معروف: {kind}")
+    action, details = _EXPORT_AUDIT[kind]
+    log_audit_event(action, details.format(destination))
+
 # --- CRUD: المستندات ---
 def add_document(name, number, date_ddmmyyyy, expiry_date_ddmmyyyy, issuer, employee_id, category, tags):
     if not name or not number or not date_ddmmyyyy or not issuer:
@@ -124,11 +747,12 @@ def add_document(name, number, date_ddmmyyyy, expiry_date_ddmmyyyy, issuer, empl
         if date_db is None:
             raise ValueError("تنسيق تاريخ الإصدار غير صحيح. يرجى استخدام DD-MM-YYYY.")
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO documents (name, number, date, expiry_date, issuer, employee_id, category, tags) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                           (name, number, date_db, expiry_date_db, issuer, employee_id, category, tags))
+            cursor.execute("INSERT INTO documents (name, number, date, expiry_date, issuer, employee_id, category, tags, name_norm, issuer_norm) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (name, number, date_db, expiry_date_db, issuer, employee_id, category, tags, normalize_arabic(name), normalize_arabic(issuer)))
             doc_id = cursor.lastrowid
+            _set_document_tags(cursor, doc_id, tags)
             conn.commit()
             log_audit_event("إضافة مستند", f"تمت إضافة المستند: {name} ({number})")
             return doc_id
@@ -150,13 +774,14 @@ def update_document(doc_id, name, number, date_ddmmyyyy, expiry_date_ddmmyyyy, i
         if date_db is None:
             raise ValueError("تنسيق تاريخ الإصدار غير صحيح. يرجى استخدام DD-MM-YYYY.")
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("UPDATE documents SET name=?, number=?, date=?, expiry_date=?, issuer=?, employee_id=?, category=?, tags=? WHERE id=?",
-                           (name, number, date_db, expiry_date_db, issuer, employee_id, category, tags, doc_id))
-            conn.commit()
+            cursor.execute("UPDATE documents SET name=?, number=?, date=?, expiry_date=?, issuer=?, employee_id=?, category=?, tags=?, name_norm=?, issuer_norm=? WHERE id=?",
+                           (name, number, date_db, expiry_date_db, issuer, employee_id, category, tags, normalize_arabic(name), normalize_arabic(issuer), doc_id))
             if cursor.rowcount == 0:
                 raise ValueError(f"لم يتم العثور على مستند بالرقم التعريفي {doc_id} للتعديل.")
+            _set_document_tags(cursor, doc_id, tags)
+            conn.commit()
             log_audit_event("تحديث مستند", f"تم تحديث المستند ID: {doc_id} إلى: {name} ({number})")
     except sqlite3.IntegrityError:
         raise ValueError("⚠ رقم المستند موجود مسبقاً لمستند آخر. يرجى إدخال رقم فريد.")
@@ -166,26 +791,40 @@ def update_document(doc_id, name, number, date_ddmmyyyy, expiry_date_ddmmyyyy, i
         raise Exception(f"❌ حدث خطأ غير متوقع أثناء تحديث المستند: {str(e)}")
 
 def delete_document(doc_id):
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, number FROM documents WHERE id=?", (doc_id,))
-        doc_info = cursor.fetchone()
-        if doc_info:
-            cursor.execute("SELECT filepath FROM attachments WHERE document_id = ?", (doc_id,))
-            attachments = cursor.fetchall()
-            for att_path in attachments:
-                if os.path.exists(att_path[0]):
-                    try:
-                        os.remove(att_path[0])
-                        log_audit_event("حذف مرفق", f"تم حذف الملف المرفق من القرص: {att_path[0]}")
-                    except OSError as e:
-                        print(f"خطأ في حذف الملف {att_path[0]}: {e}")
-            
-            cursor.execute("DELETE FROM documents WHERE id=?", (doc_id,))
-            conn.commit()
-            log_audit_event("حذف مستند", f"تم حذف المستند: {doc_info[0]} ({doc_info[1]}) ID: {doc_id}")
-        else:
-            raise ValueError(f"لم يتم العثور على مستند بالرقم التعريفي {doc_id} للحذف.")
+    if not delete_documents([doc_id]):
+        raise ValueError(f"لم يتم العثور على مستند بالرقم التعريفي {doc_id} للحذف.")
+
+def delete_documents(doc_ids):
+    """
+    حذف عدة مستندات مع مرفقاتها في معاملة واحدة وبسجل تدقيق واحد.
+    ملفات المرفقات تُحذف من القرص لاحقاً عبر خيط الحذف الخلفي. يعيد عدد المستندات المحذوفة.
+    """
+    doc_ids = list(dict.fromkeys(doc_ids))
+    if not doc_ids:
+        return 0
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        documents = []
+        filepaths = []
+        for chunk in _chunks(doc_ids):
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(f"SELECT id, name, number FROM documents WHERE id IN ({placeholders})", chunk)
+            documents += cursor.fetchall()
+            cursor.execute(f"SELECT filepath FROM attachments WHERE document_id IN ({placeholders})", chunk)
+            filepaths += [row[0] for row in cursor.fetchall()]
+        if not documents:
+            return 0
+
+        found_ids = [(doc[0],) for doc in documents]
+        cursor.executemany("DELETE FROM attachments WHERE document_id = ?", found_ids)
+        cursor.executemany("DELETE FROM documents WHERE id = ?", found_ids)
+        summary = "، ".join(f"{name} ({number}) ID: {doc_id}" for doc_id, name, number in documents[:20])
+        if len(documents) > 20:
+            summary += f"، و{len(documents) - 20} أخرى"
+        _insert_audit(cursor, "حذف مستندات", f"تم حذف {len(documents)} مستند/ات و{len(filepaths)} مرفق/ات: {summary}")
+        conn.commit()
+    enqueue_file_removals(filepaths)
+    return len(documents)
 
 # --- CRUD: الموظفين ---
 def add_employee(name, employee_number, department, contact_info, hire_date_ddmmyyyy):
@@ -196,10 +835,10 @@ def add_employee(name, employee_number, department, contact_info, hire_date_ddmm
         if hire_date_db is None:
             raise ValueError("تنسيق تاريخ التعيين غير صحيح. يرجى استخدام DD-MM-YYYY.")
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO employees (name, employee_number, department, contact_info, hire_date) VALUES (?, ?, ?, ?, ?)",
-                           (name, employee_number, department, contact_info, hire_date_db))
+            cursor.execute("INSERT INTO employees (name, employee_number, department, contact_info, hire_date, name_norm) VALUES (?, ?, ?, ?, ?, ?)",
+                           (name, employee_number, department, contact_info, hire_date_db, normalize_arabic(name)))
             conn.commit()
             log_audit_event("إضافة موظف", f"تمت إضافة الموظف: {name} ({employee_number})")
     except sqlite3.IntegrityError:
@@ -217,10 +856,10 @@ def update_employee(emp_id, name, employee_number, department, contact_info, hir
         if hire_date_db is None:
             raise ValueError("تنسيق تاريخ التعيين غير صحيح. يرجى استخدام DD-MM-YYYY.")
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("UPDATE employees SET name=?, employee_number=?, department=?, contact_info=?, hire_date=? WHERE id=?",
-                           (name, employee_number, department, contact_info, hire_date_db, emp_id))
+            cursor.execute("UPDATE employees SET name=?, employee_number=?, department=?, contact_info=?, hire_date=?, name_norm=? WHERE id=?",
+                           (name, employee_number, department, contact_info, hire_date_db, normalize_arabic(name), emp_id))
             conn.commit()
             if cursor.rowcount == 0:
                 raise ValueError(f"لم يتم العثور على موظف بالرقم التعريفي {emp_id} للتعديل.")
@@ -233,7 +872,7 @@ def update_employee(emp_id, name, employee_number, department, contact_info, hir
         raise Exception(f"❌ حدث خطأ غير متوقع أثناء تحديث بيانات الموظف: {str(e)}")
 
 def delete_employee(emp_id):
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT name, employee_number FROM employees WHERE id=?", (emp_id,))
         emp_info = cursor.fetchone()
@@ -246,91 +885,305 @@ def delete_employee(emp_id):
             raise ValueError(f"لم يتم العثور على موظف بالرقم التعريفي {emp_id} للحذف.")
 
 # --- دوال إدارة المرفقات ---
-def add_attachment(document_id, original_filepath):
-    filename = os.path.basename(original_filepath)
+# دوال تُستدعى برقم المرفق بعد إضافته (مثل إيقاظ مفهرس المحتوى)
+_attachment_listeners = []
+
+def on_attachment_added(listener):
+    _attachment_listeners.append(listener)
+
+def add_attachment(document_id, original_filepath, filename=None):
+    """إرفاق ملف بمستند. filename هو الاسم المعروض (افتراضياً اسم الملف المصدر)."""
+    filename = os.path.basename(filename or original_filepath)
     unique_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
     destination_filepath = os.path.join(ATTACHMENTS_DIR, unique_filename)
 
     try:
-        import shutil
-        shutil.copy(original_filepath, destination_filepath)
-        
-        with sqlite3.connect(DB_NAME) as conn:
+        destination_filepath, file_size, sha256 = _store_attachment_file(original_filepath, destination_filepath)
+
+        with get_connection() as conn:
             cursor = conn.cursor()
-            upload_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cursor.execute("INSERT INTO attachments (document_id, filename, filepath, upload_date) VALUES (?, ?, ?, ?)",
-                           (document_id, filename, destination_filepath, upload_date))
-            conn.commit()
+            upload_date = datecodec.now_timestamp()
+            try:
+                cursor.execute("INSERT INTO attachments (document_id, filename, filepath, upload_date, file_size, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+                               (document_id, filename, destination_filepath, upload_date, file_size, sha256))
+                attachment_id = cursor.lastrowid
+                conn.commit()
+            except sqlite3.Error:
+                os.remove(destination_filepath)
+                raise
             log_audit_event("إضافة مرفق", f"تم إرفاق الملف {filename} للمستند ID: {document_id}")
+            for listener in _attachment_listeners:
+                listener(attachment_id)
             return destination_filepath
     except Exception as e:
         raise Exception(f"❌ حدث خطأ أثناء إرفاق الملف: {str(e)}")
 
+def _store_attachment_file(source, destination):
+    """
+    تخزين ملف مرفق في destination، مضغوطاً إذا كان الضغط مفعلاً ومجدياً (انظر attachment_store).
+    يعيد (المسار المخزن، حجم الملف المخزن، بصمته).
+    """
+    if db_registry.compress_attachments() and attachment_store.is_compressible(source):
+        compressed_path = destination + attachment_store.COMPRESSED_SUFFIX
+        stored = attachment_store.compress_file(source, compressed_path)
+        if stored is not None:
+            return (compressed_path,) + stored
+    return (destination,) + _copy_with_digest(source, destination)
+
+def compress_existing_attachments(batch_size=100):
+    """
+    ضغط المرفقات المخزنة دون ضغط (بعد تفعيل الضغط على مجلد قائم). كل ملف يُضغط ثم يُحدث
+    صفه، ويُحذف الأصل بعد الحفظ فقط. يعيد (عدد المضغوط، عدد المتخطى، البايتات الموفرة).
+    """
+    compressed = skipped = saved = 0
+    last_id = 0
+    while True:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, filepath FROM attachments WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+            rows = cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        for attachment_id, filepath in rows:
+            if attachment_store.is_compressed(filepath):
+                continue
+            stored = None
+            try:
+                if attachment_store.is_compressible(filepath):
+                    stored = attachment_store.compress_file(filepath, filepath + attachment_store.COMPRESSED_SUFFIX)
+            except OSError:
+                stored = None  # ملف مفقود: يعالجه فحص سلامة المرفقات
+            if stored is None:
+                skipped += 1
+                continue
+            original_size = os.path.getsize(filepath)
+            with get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("UPDATE attachments SET filepath = ?, file_size = ?, sha256 = ? WHERE id = ? AND filepath = ?",
+                               (filepath + attachment_store.COMPRESSED_SUFFIX, stored[0], stored[1], attachment_id, filepath))
+                updated = cursor.rowcount
+                conn.commit()
+            # المرفق حُذف أو تغير أثناء الضغط: تُزال النسخة المضغوطة ويبقى الوضع كما كان
+            enqueue_file_removals([filepath] if updated else [filepath + attachment_store.COMPRESSED_SUFFIX])
+            if updated:
+                compressed += 1
+                saved += original_size - stored[0]
+    if compressed:
+        log_audit_event("ضغط المرفقات", f"تم ضغط {compressed} مرفق وتوفير {saved // 1024} كيلوبايت")
+    return compressed, skipped, saved
+
+def _copy_with_digest(source, destination):
+    """نسخ ملف مع حساب حجمه وبصمته SHA-256 في نفس القراءة. يعيد (الحجم، البصمة)."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        for chunk in iter(lambda: src.read(1024 * 1024), b""):
+            digest.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    shutil.copymode(source, destination)
+    return size, digest.hexdigest()
+
+def file_sha256(filepath):
+    """حساب بصمة SHA-256 لملف على دفعات."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 def get_attachments_for_document(document_id):
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id, filename, filepath, upload_date FROM attachments WHERE document_id = ?", (document_id,))
-        return cursor.fetchall()
+        rows = cursor.fetchall()
+        if not rows:
+            # مستند غير موجود في القاعدة الرئيسية قد يكون مؤرشفاً (معروضاً مع خيار تضمين الأرشيف)
+            cursor.execute("SELECT 1 FROM documents WHERE id = ?", (document_id,))
+            if cursor.fetchone() is None:
+                rows = _query_archives(cursor, _archive_years(cursor, "documents"),
+                                       "SELECT id, filename, filepath, upload_date FROM {archive}.attachments WHERE document_id = ?",
+                                       (document_id,))
+        return rows
+
+def get_attachments_for_documents(document_ids):
+    """
+    مرفقات عدة مستندات في استعلام واحد (للتحميل المسبق للصفوف المعروضة):
+    [(document_id, id, filename, filepath, upload_date)]، ومنها مرفقات المستندات المؤرشفة.
+    """
+    document_ids = list(document_ids)
+    if not document_ids:
+        return []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT document_id, id, filename, filepath, upload_date FROM attachments "
+            "WHERE document_id IN (SELECT value FROM json_each(?)) ORDER BY document_id, id",
+            (json.dumps(document_ids),)
+        )
+        rows = cursor.fetchall()
+        cursor.execute("SELECT value FROM json_each(?) WHERE value NOT IN (SELECT id FROM documents)", (json.dumps(document_ids),))
+        archived_ids = [row[0] for row in cursor.fetchall()]
+        if archived_ids:
+            rows += _query_archives(
+                cursor, _archive_years(cursor, "documents"),
+                "SELECT document_id, id, filename, filepath, upload_date FROM {archive}.attachments "
+                "WHERE document_id IN (SELECT value FROM json_each(?))",
+                (json.dumps(archived_ids),)
+            )
+        return rows
 
-def delete_attachment(attachment_id, filepath):
-    with sqlite3.connect(DB_NAME) as conn:
+def get_attachment_file(attachment_id):
+    """(اسم الملف، مسار الملف المخزن) لمرفق، ومنها مرفقات المستندات المؤرشفة."""
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM attachments WHERE id = ?", (attachment_id,))
+        cursor.execute("SELECT filename, filepath FROM attachments WHERE id = ?", (attachment_id,))
+        row = cursor.fetchone()
+        if row is None:
+            rows = _query_archives(cursor, _archive_years(cursor, "documents"),
+                                   "SELECT filename, filepath FROM {archive}.attachments WHERE id = ?",
+                                   (attachment_id,))
+            row = rows[0] if rows else None
+    if row is None:
+        raise ValueError(f"المرفق غير موجود: {attachment_id}")
+    return row
+
+def readable_attachment_path(attachment_id):
+    """مسار محلي يمكن فتحه لمرفق (النسخة المفكوكة للمرفقات المضغوطة)."""
+    filepath = get_attachment_file(attachment_id)[1]
+    if not os.path.exists(filepath):
+        raise ValueError("الملف غير موجود في المسار المحدد.")
+    return attachment_store.readable_path(filepath)
+
+def delete_attachment(attachment_id):
+    delete_attachments([attachment_id])
+
+def delete_attachments(attachment_ids):
+    """
+    حذف عدة مرفقات في معاملة واحدة (executemany) وبسجل تدقيق واحد.
+    ملفاتها تُحذف من القرص لاحقاً عبر خيط الحذف الخلفي. يعيد عدد المرفقات المحذوفة.
+    """
+    attachment_ids = list(dict.fromkeys(attachment_ids))
+    if not attachment_ids:
+        return 0
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        attachments = []
+        for chunk in _chunks(attachment_ids):
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(f"SELECT id, document_id, filepath FROM attachments WHERE id IN ({placeholders})", chunk)
+            attachments += cursor.fetchall()
+        if not attachments:
+            return 0
+        cursor.executemany("DELETE FROM attachments WHERE id = ?", [(att[0],) for att in attachments])
+        document_ids = sorted({att[1] for att in attachments})
+        _insert_audit(cursor, "حذف مرفقات",
+                      f"تم حذف {len(attachments)} مرفق/ات للمستند/ات ID: {', '.join(map(str, document_ids))}")
         conn.commit()
-        if os.path.exists(filepath):
-            try:
+    enqueue_file_removals(att[2] for att in attachments)
+    return len(attachments)
+
+# --- حذف الملفات في الخلفية ---
+# الملفات التي تعذر حذفها تُسجل في logs/file_removals.log (وتظهر كملفات يتيمة في فحص سلامة المرفقات)
+FILE_REMOVAL_LOG = "file_removals.log"
+_unlink_queue = queue.Queue()
+_unlinker_thread = None
+_unlinker_lock = threading.Lock()
+
+def _file_unlinker():
+    while True:
+        filepath = _unlink_queue.get()
+        try:
+            if os.path.exists(filepath):
                 os.remove(filepath)
-                log_audit_event("حذف مرفق", f"تم حذف الملف المرفق من القرص: {filepath}")
-            except OSError as e:
-                print(f"خطأ في حذف الملف من القرص {filepath}: {e}")
-        log_audit_event("حذف مرفق", f"تم حذف المرفق ID: {attachment_id} والملف: {filepath}")
+        except OSError as e:
+            get_file_logger("dms.file_removals", FILE_REMOVAL_LOG).error(
+                json.dumps({"path": filepath, "error": str(e)}, ensure_ascii=False))
+        finally:
+            _unlink_queue.task_done()
+
+def enqueue_file_removals(filepaths):
+    """إضافة ملفات إلى طابور الحذف الخلفي حتى لا تنتظر الواجهة عمليات القرص."""
+    global _unlinker_thread
+    with _unlinker_lock:
+        if _unlinker_thread is None:
+            _unlinker_thread = threading.Thread(target=_file_unlinker, name="dms-unlinker", daemon=True)
+            _unlinker_thread.start()
+    for filepath in filepaths:
+        _unlink_queue.put(filepath)
+
+def wait_for_pending_file_removals():
+    """الانتظار حتى يفرغ طابور حذف الملفات (يُستدعى تلقائياً عند إنهاء البرنامج)."""
+    if _unlinker_thread is not None:
+        _unlink_queue.join()
+
+atexit.register(wait_for_pending_file_removals)
 
 # --- دوال مساعدة عامة ---
 def fetch_employee_id_name():
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id, name FROM employees ORDER BY name")
         rows = cursor.fetchall()
     return rows
 
 def fetch_all_employees():
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id, name, employee_number, department, contact_info, hire_date FROM employees")
+        cursor.execute(f"SELECT {_EMPLOYEE_COLUMNS} FROM employees")
         rows = cursor.fetchall()
     return rows
 
 def fetch_audit_log():
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT timestamp, user_action, details FROM audit_log ORDER BY timestamp DESC")
+        cursor.execute("SELECT timestamp, user_action, details FROM audit_log ORDER BY timestamp DESC, log_id DESC")
         rows = cursor.fetchall()
     return rows
 
 def get_all_categories():
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT category FROM documents WHERE category IS NOT NULL AND category != '' ORDER BY category")
+        cursor.execute("SELECT value FROM document_facet_counts WHERE facet = 'category' AND value != '' ORDER BY value")
         return [row[0] for row in cursor.fetchall()]
 
+def get_document_facets():
+    """
+    عدد المستندات لكل فئة (من عدادات المستندات) ولكل علامة في استعلام واحد.
+    يعيد {"categories": [(الفئة، العدد)، ...]، "tags": [(العلامة، العدد)، ...]} مرتبة بالاسم.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT 'categories', value, documents FROM document_facet_counts
+            WHERE facet = 'category' AND value != ''
+            UNION ALL
+            SELECT 'tags', t.name, COUNT(*) FROM document_tags dt
+            JOIN tags t ON t.id = dt.tag_id
+            GROUP BY dt.tag_id
+            ORDER BY 1, 2
+        """)
+        facets = {"categories": [], "tags": []}
+        for facet, value, count in cursor.fetchall():
+            facets[facet].append((value, count))
+    return facets
+
 # New function to get all unique departments
 def get_all_departments():
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT DISTINCT department FROM employees WHERE department IS NOT NULL AND department != '' ORDER BY department")
         return [row[0] for row in cursor.fetchall()]
 
-def calculate_remaining_time(expiry_date_str_yyyymmdd):
-    if not expiry_date_str_yyyymmdd:
+def calculate_remaining_time(expiry_day):
+    if expiry_day is None or expiry_day == "":
         return "N/A"
     try:
-        expiry_date = datetime.strptime(expiry_date_str_yyyymmdd, "%Y-%m-%d").date()
-        today = datetime.today().date()
-        
-        if expiry_date < today:
-            return "منتهية الصلاحية"
+        delta_days = int(expiry_day) - datecodec.today()
 
-        delta_days = (expiry_date - today).days
+        if delta_days < 0:
+            return "منتهية الصلاحية"
 
         years = delta_days // 365
         remaining_days_after_years = delta_days % 365
@@ -344,11 +1197,206 @@ def calculate_remaining_time(expiry_date_str_yyyymmdd):
 
 def fetch_all_documents_for_export():
     """يجلب جميع بيانات المستندات من قاعدة البيانات للتصدير."""
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT id, name, number, date, expiry_date, issuer, category, tags FROM documents")
         return cursor.fetchall()
 
+def iter_documents_for_export(batch_size=500):
+    """يولد صفوف المستندات للتصدير على دفعات دون تحميل الجدول كاملاً في الذاكرة."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, number, date, expiry_date, issuer, category, tags FROM documents ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+def fetch_expiring_documents(days=90):
+    """يجلب المستندات المنتهية أو التي تنتهي خلال عدد الأيام المحدد، مرتبة حسب تاريخ الانتهاء."""
+    upcoming = datecodec.today() + days
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, name, number, expiry_date, issuer, category
+            FROM documents
+            WHERE expiry_date IS NOT NULL AND expiry_date <= ?
+            ORDER BY expiry_date
+        """, (upcoming,))
+        return cursor.fetchall()
+
+def fetch_documents(keyword="", category=None, tag=None, include_archives=False):
+    """
+    البحث في المستندات حسب الكلمة المفتاحية والفئة والعلامة.
+    الاسم والجهة يُطابقان بصيغتهما الموحدة (الهمزات، التاء المربوطة، التشكيل...) عبر فهرس trigram.
+    include_archives يضيف المستندات المنقولة إلى قواعد الأرشيف (بحث بمسح عادي، فهي خارج الفهرس).
+    """
+    norm = normalize_arabic(keyword) or ""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        query = f"SELECT {_DOCUMENT_SEARCH_COLUMNS} FROM documents WHERE 1 = 1"
+        params = ()
+        if len(norm) >= 3:
+            query += " AND id IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)"
+            params += (f"{{name_norm issuer_norm}} : {_fts_phrase(norm)} OR {{number category tags}} : {_fts_phrase(keyword.strip())}",)
+        elif norm:
+            # المقسم trigram لا يطابق أقل من ثلاثة أحرف، فالكلمات القصيرة تُبحث بمسح عادي
+            query += " AND (name_norm LIKE ? OR issuer_norm LIKE ? OR number LIKE ? OR category LIKE ? OR tags LIKE ?)"
+            params += (f"%{norm}%", f"%{norm}%", f"%{keyword.strip()}%", f"%{keyword.strip()}%", f"%{keyword.strip()}%")
+
+        query, params = _add_document_filters(query, params, category, tag)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        if include_archives:
+            rows += _fetch_archived_documents(cursor, keyword, category, tag)
+        return rows
+
+def _add_document_filters(query, params, category=None, tag=None):
+    if category and category != "الكل":
+        query += " AND category = ?"
+        params += (category,)
+    if tag and tag != "الكل":
+        query += " AND id IN (SELECT dt.document_id FROM document_tags dt JOIN tags t ON t.id = dt.tag_id WHERE t.name = ?)"
+        params += (tag,)
+    return query, params
+
+def search_document_content(keyword, category=None, tag=None):
+    """المستندات التي تحتوي مرفقاتها المفهرسة على كل كلمات البحث. الصفوف بنفس شكل fetch_documents."""
+    words = (normalize_arabic(keyword) or "").split()
+    if not words:
+        return []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        query = (
+            f"SELECT {_DOCUMENT_SEARCH_COLUMNS} FROM documents WHERE id IN ("
+            "SELECT a.document_id FROM attachment_content c JOIN attachments a ON a.id = c.rowid "
+            "WHERE attachment_content MATCH ?)"
+        )
+        params = (" ".join(_fts_phrase(word) for word in words),)
+        query, params = _add_document_filters(query, params, category, tag)
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+def _fuzzy_candidates(cursor, fts_table, columns, keyword):
+    """مرشحو البحث التقريبي: الصفوف التي تشترك مع الكلمة في أي مقطع ثلاثي، مرتبة بـ bm25."""
+    query_trigrams = trigrams(keyword)
+    if not query_trigrams:
+        return query_trigrams, []
+    match = f"{{{' '.join(columns)}}} : ({' OR '.join(_fts_phrase(t) for t in sorted(query_trigrams))})"
+    cursor.execute(f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ? ORDER BY rank LIMIT ?",
+                   (match, FUZZY_CANDIDATE_LIMIT))
+    return query_trigrams, [row[0] for row in cursor.fetchall()]
+
+def fuzzy_search_documents(keyword, category=None, tag=None, limit=50):
+    """
+    بحث متسامح مع الأخطاء الإملائية في اسم المستند وجهة الإصدار.
+    يعيد صفوفاً بنفس شكل fetch_documents مرتبة حسب نسبة المقاطع الثلاثية المشتركة.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        query_trigrams, candidate_ids = _fuzzy_candidates(cursor, "documents_fts", ["name_norm", "issuer_norm"], keyword)
+        if not candidate_ids:
+            return []
+        query = f"SELECT {_DOCUMENT_SEARCH_COLUMNS}, name_norm, issuer_norm FROM documents WHERE id IN (SELECT value FROM json_each(?))"
+        query, params = _add_document_filters(query, (json.dumps(candidate_ids),), category, tag)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    scored = []
+    for row in rows:
+        score = max(similarity(query_trigrams, row[-2]), similarity(query_trigrams, row[-1]))
+        if score >= FUZZY_THRESHOLD:
+            scored.append((score, row[:-2]))
+    scored.sort(key=lambda item: -item[0])
+    return [row for _, row in scored[:limit]]
+
+def search_employees(keyword, fuzzy=False, limit=50):
+    """
+    البحث في الموظفين بالاسم (بصيغته الموحدة) أو الرقم الوظيفي أو القسم.
+    مع fuzzy=True يُرتب بالتشابه ويتسامح مع الأخطاء الإملائية في الاسم.
+    الصفوف بنفس شكل fetch_all_employees.
+    """
+    norm = normalize_arabic(keyword) or ""
+    if not norm:
+        return fetch_all_employees()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if not fuzzy:
+            if len(norm) >= 3:
+                cursor.execute(
+                    f"SELECT {_EMPLOYEE_COLUMNS} FROM employees WHERE id IN "
+                    "(SELECT rowid FROM employees_fts WHERE employees_fts MATCH ?) ORDER BY name",
+                    (f"{{name_norm}} : {_fts_phrase(norm)} OR {{employee_number department}} : {_fts_phrase(keyword.strip())}",)
+                )
+            else:
+                cursor.execute(
+                    f"SELECT {_EMPLOYEE_COLUMNS} FROM employees WHERE name_norm LIKE ? OR employee_number LIKE ? OR department LIKE ? ORDER BY name",
+                    (f"%{norm}%", f"%{keyword.strip()}%", f"%{keyword.strip()}%")
+                )
+            return cursor.fetchall()
+        query_trigrams, candidate_ids = _fuzzy_candidates(cursor, "employees_fts", ["name_norm"], keyword)
+        if not candidate_ids:
+            return []
+        cursor.execute(
+            f"SELECT {_EMPLOYEE_COLUMNS}, name_norm FROM employees WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(candidate_ids),)
+        )
+        rows = cursor.fetchall()
+    scored = [(similarity(query_trigrams, row[-1]), row[:-1]) for row in rows]
+    scored = [item for item in scored if item[0] >= FUZZY_THRESHOLD]
+    scored.sort(key=lambda item: -item[0])
+    return [row for _, row in scored[:limit]]
+
+def fetch_documents_with_expiry():
+    """يجلب المستندات التي لها تاريخ انتهاء لحساب المدة المتبقية."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, number, expiry_date FROM documents WHERE expiry_date IS NOT NULL")
+        return cursor.fetchall()
+
+def count_expiring_documents(days=90):
+    """يعيد (عدد المستندات المنتهية، عدد المستندات التي تنتهي خلال عدد الأيام المحدد) من عدادات أيام الانتهاء."""
+    stats = get_dashboard_stats(days, top=0)
+    return stats["expired"], stats["near"]
+
+def get_dashboard_stats(near_days=90, top=15):
+    """
+    ملخص لوحة المعلومات من العدادات: الإجمالي وعدد المستندات حسب الحالة، وأكثر top فئة وجهة إصدار.
+    الحالات بنفس حدود get_row_color: منتهية قبل اليوم، قرب الانتهاء حتى near_days يوماً، وما بعدها صالحة.
+    """
+    today = datecodec.today()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COALESCE(SUM(CASE WHEN expiry_day < ? THEN documents END), 0),
+                   COALESCE(SUM(CASE WHEN expiry_day BETWEEN ? AND ? THEN documents END), 0),
+                   COALESCE(SUM(CASE WHEN expiry_day > ? THEN documents END), 0)
+            FROM document_expiry_counts
+        """, (today, today, today + near_days, today + near_days))
+        expired, near, valid = cursor.fetchone()
+        cursor.execute("SELECT COALESCE(SUM(documents), 0) FROM document_facet_counts WHERE facet = 'category'")
+        total = cursor.fetchone()[0]
+        stats = {"today": today, "total": total, "expired": expired, "near": near, "valid": valid,
+                 "no_expiry": total - expired - near - valid}
+        for facet in _DOCUMENT_FACETS:
+            cursor.execute(
+                "SELECT value, documents FROM document_facet_counts WHERE facet = ? ORDER BY documents DESC, value LIMIT ?",
+                (facet, top),
+            )
+            stats[facet] = cursor.fetchall()
+    return stats
+
+def fetch_expiry_calendar(days=365):
+    """[(رقم يوم الانتهاء، عدد المستندات)] من اليوم حتى days يوماً، للأيام التي تنتهي فيها مستندات فقط."""
+    today = datecodec.today()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT expiry_day, documents FROM document_expiry_counts WHERE expiry_day BETWEEN ? AND ? ORDER BY expiry_day",
+            (today, today + days),
+        )
+        return cursor.fetchall()
+
 # --- دوال الرواتب الجديدة ---
 def calculate_net_salary(basic_salary, allowances, deductions):
     try:
@@ -368,8 +1416,9 @@ def add_salary(employee_id, basic_salary, allowances, deductions, payment_method
         net_salary = calculate_net_salary(basic_salary, allowances, deductions)
         payment_date_db = convert_date_to_db_format(payment_date_ddmmyyyy)
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
+            _check_salary_year_open(cursor, payment_date_db)
             cursor.execute("INSERT INTO salaries (employee_id, basic_salary, allowances, deductions, net_salary, payment_method, payment_date) VALUES (?, ?, ?, ?, ?, ?, ?)",
                            (employee_id, basic_salary, allowances, deductions, net_salary, payment_method, payment_date_db))
             conn.commit()
@@ -387,8 +1436,9 @@ def update_salary(salary_id, employee_id, basic_salary, allowances, deductions,
         net_salary = calculate_net_salary(basic_salary, allowances, deductions)
         payment_date_db = convert_date_to_db_format(payment_date_ddmmyyyy)
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
+            _check_salary_year_open(cursor, payment_date_db)
             cursor.execute("UPDATE salaries SET employee_id=?, basic_salary=?, allowances=?, deductions=?, net_salary=?, payment_method=?, payment_date=? WHERE id=?",
                            (employee_id, basic_salary, allowances, deductions, net_salary, payment_method, payment_date_db, salary_id))
             conn.commit()
@@ -401,7 +1451,7 @@ def update_salary(salary_id, employee_id, basic_salary, allowances, deductions,
         raise Exception(f"❌ حدث خطأ غير متوقع أثناء تحديث الراتب: {str(e)}")
 
 def delete_salary(salary_id):
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT employee_id, net_salary FROM salaries WHERE id=?", (salary_id,))
         salary_info = cursor.fetchone()
@@ -412,28 +1462,179 @@ def delete_salary(salary_id):
         else:
             raise ValueError(f"لم يتم العثور على راتب بالرقم التعريفي {salary_id} للحذف.")
 
-def fetch_all_salaries(department_filter=None):
-    with sqlite3.connect(DB_NAME) as conn:
+# --- التعديل الجماعي للرواتب ---
+SALARY_ADJUSTMENT_FIELDS = {
+    "basic_salary": "الراتب الأساسي",
+    "allowances": "البدلات",
+    "deductions": "الخصومات",
+}
+SALARY_ADJUSTMENT_MODES = ("percent", "fixed")
+
+# آخر سجل راتب لكل موظف (حسب تاريخ الدفع ثم الرقم التعريفي)
+_LATEST_SALARY_IDS_SQL = """
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY employee_id ORDER BY payment_date DESC, id DESC) AS rn
+        FROM salaries
+    ) WHERE rn = 1
+"""
+
+def _salary_adjustment_target(department=None, employee_ids=None):
+    """شرط WHERE ومعاملاته لاختيار آخر راتب لكل موظف ضمن القسم أو قائمة الموظفين المحددة."""
+    where = f"id IN ({_LATEST_SALARY_IDS_SQL})"
+    params = []
+    if department and department != "الكل":
+        where += " AND employee_id IN (SELECT id FROM employees WHERE department = ?)"
+        params.append(department)
+    if employee_ids:
+        # قائمة الموظفين تُمرر كمصفوفة JSON واحدة بدلاً من آلاف المعاملات
+        where += " AND employee_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps([int(emp_id) for emp_id in employee_ids]))
+    return where, params
+
+def preview_salary_adjustment(department=None, employee_ids=None):
+    """عدد سجلات الرواتب (آخر راتب لكل موظف) التي سيشملها التعديل الجماعي."""
+    where, params = _salary_adjustment_target(department, employee_ids)
+    with get_connection() as conn:
         cursor = conn.cursor()
-        query = """
-            SELECT s.id, e.name, e.department, s.basic_salary, s.allowances, s.deductions, s.net_salary, s.payment_method, s.payment_date, s.employee_id
-            FROM salaries s
-            JOIN employees e ON s.employee_id = e.id
-        """
+        cursor.execute(f"SELECT COUNT(*) FROM salaries WHERE {where}", params)
+        return cursor.fetchone()[0]
+
+def apply_salary_adjustment(field, mode, amount, department=None, employee_ids=None):
+    """
+    تعديل حقل (الأساسي أو البدلات أو الخصومات) في آخر راتب لكل موظف ضمن النطاق بنسبة مئوية
+    أو بمبلغ ثابت، مع إعادة حساب الصافي، في جملة UPDATE واحدة ومعاملة واحدة وحدث تدقيق واحد.
+    القيم الناتجة لا تقل عن صفر. يعيد عدد السجلات المعدلة.
+    """
+    if field not in SALARY_ADJUSTMENT_FIELDS:
+        raise ValueError(f"حقل غير صالح للتعديل: {field}")
+    if mode not in SALARY_ADJUSTMENT_MODES:
+        raise ValueError(f"نوع تعديل غير صالح: {mode}")
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        amount = None
+    # nan وinf تُخزن NULL في SQLite فتمحو الرواتب في كل النطاق
+    if amount is None or not math.isfinite(amount):
+        raise ValueError("يرجى إدخال قيمة رقمية صحيحة للتعديل.")
+
+    adjusted = f"MAX(0, ROUND({field} * (1 + ? / 100.0), 2))" if mode == "percent" else f"MAX(0, ROUND({field} + ?, 2))"
+    # في SQLite تقرأ كل تعبيرات SET القيم القديمة، لذا يُعاد حساب الصافي بالتعبير الجديد للحقل
+    values = {name: name for name in SALARY_ADJUSTMENT_FIELDS}
+    values[field] = adjusted
+    net = f"ROUND({values['basic_salary']} + {values['allowances']} - {values['deductions']}, 2)"
+    where, params = _salary_adjustment_target(department, employee_ids)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"UPDATE salaries SET {field} = {adjusted}, net_salary = {net} WHERE {where}",
+                [amount, amount] + params
+            )
+            updated = cursor.rowcount
+            scope = f"القسم: {department}" if department and department != "الكل" else "جميع الأقسام"
+            if employee_ids:
+                scope += f"، {len(employee_ids)} موظف محدد"
+            change = f"{amount:+g}%" if mode == "percent" else f"{amount:+g}"
+            _insert_audit(cursor, "تعديل جماعي للرواتب",
+                          f"تعديل {SALARY_ADJUSTMENT_FIELDS[field]} بمقدار {change} في آخر راتب لـ {updated} موظف ({scope})")
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise Exception(f"❌ فشل التعديل الجماعي للرواتب: {e}")
+    return updated
+
+_SALARY_LIST_TEMPLATE = """
+    SELECT s.id, e.name, e.department, s.basic_salary, s.allowances, s.deductions, s.net_salary, s.payment_method, s.payment_date, s.employee_id
+    FROM {salaries} s
+    JOIN employees e ON s.employee_id = e.id
+"""
+_SALARY_LIST_SQL = _SALARY_LIST_TEMPLATE.format(salaries="salaries")
+
+def fetch_all_salaries(department_filter=None, include_archives=False):
+    """رواتب القاعدة الرئيسية (السنوات المفتوحة)، ومعها رواتب السنوات المؤرشفة عند include_archives."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        where = ""
         params = []
         if department_filter and department_filter != "الكل":
-            query += " WHERE e.department = ?"
+            where = " WHERE e.department = ?"
             params.append(department_filter)
         
-        query += " ORDER BY s.payment_date DESC"
-        
-        cursor.execute(query, tuple(params))
+        cursor.execute(_SALARY_LIST_SQL + where + " ORDER BY s.payment_date DESC", tuple(params))
         rows = cursor.fetchall()
+        if include_archives:
+            # السنوات المؤرشفة أقدم من كل السنوات المفتوحة، ومن الأحدث للأقدم يبقى الترتيب تنازلياً
+            archived = _query_archives(cursor, _archive_years(cursor, "salaries"),
+                                       _SALARY_LIST_TEMPLATE.format(salaries="{archive}.salaries") + where, params)
+            rows += sorted(archived, key=lambda row: row[8], reverse=True)
     return rows
 
+# --- قراءة سجل التغييرات (لتحديث الواجهات المفتوحة) ---
+def get_last_change_id():
+    """رقم آخر تغيير في سجل التغييرات (0 إذا كان فارغاً). استعلام فهرسي زهيد للاستطلاع الدوري."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(change_id), 0) FROM change_log")
+        return cursor.fetchone()[0]
+
+# الصفوف الحالية للجداول المتغيرة بنفس أشكال دوال التحميل في الواجهة
+_CHANGED_ROWS_SQL = {
+    "documents": f"SELECT {_DOCUMENT_SEARCH_COLUMNS} FROM documents WHERE id IN (SELECT value FROM json_each(?))",
+    "employees": f"SELECT {_EMPLOYEE_COLUMNS} FROM employees WHERE id IN (SELECT value FROM json_each(?))",
+    "salaries": _SALARY_LIST_SQL + " WHERE s.id IN (SELECT value FROM json_each(?)) ORDER BY s.payment_date DESC",
+    "attachments": "SELECT id, filename, filepath, upload_date, document_id FROM attachments WHERE id IN (SELECT value FROM json_each(?))",
+}
+
+# الموظفون الذين تخصهم الصفوف المتغيرة (لإسقاط ملفاتهم المخزنة في الواجهة)
+_CHANGED_OWNERS_SQL = {
+    "documents": "SELECT DISTINCT employee_id FROM documents WHERE id IN (SELECT value FROM json_each(?)) AND employee_id IS NOT NULL",
+    "salaries": "SELECT DISTINCT employee_id FROM salaries WHERE id IN (SELECT value FROM json_each(?))",
+    "attachments": """SELECT DISTINCT d.employee_id FROM attachments a JOIN documents d ON d.id = a.document_id
+                      WHERE a.id IN (SELECT value FROM json_each(?)) AND d.employee_id IS NOT NULL""",
+}
+
+def fetch_changes_since(change_id):
+    """
+    التغييرات بعد change_id مجمعة حسب الجدول:
+    {"last": آخر رقم تغيير، "reset": bool، "tables": {الجدول: {"rows": [الصفوف الحالية]، "deleted": [الأرقام المحذوفة]،
+    "employees": [الموظفون المرتبطون بالصفوف الحالية]}}}.
+    reset=True يعني أن التغييرات المطلوبة قُلمت أو كثيرة جداً، فعلى الواجهة إعادة التحميل الكامل.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT MIN(change_id), COALESCE(MAX(change_id), 0) FROM change_log")
+        first, last = cursor.fetchone()
+        result = {"last": last, "reset": False, "tables": {}}
+        if last == change_id:
+            return result
+        if change_id > last or first is None or change_id < first - 1:
+            result["reset"] = True
+            return result
+        cursor.execute(
+            "SELECT DISTINCT table_name, row_id FROM change_log WHERE change_id > ? AND change_id <= ? LIMIT ?",
+            (change_id, last, CHANGE_FETCH_LIMIT + 1)
+        )
+        changed = cursor.fetchall()
+        if len(changed) > CHANGE_FETCH_LIMIT:
+            result["reset"] = True
+            return result
+        ids_by_table = {}
+        for table, row_id in changed:
+            ids_by_table.setdefault(table, []).append(row_id)
+        for table, ids in ids_by_table.items():
+            cursor.execute(_CHANGED_ROWS_SQL[table], (json.dumps(ids),))
+            rows = cursor.fetchall()
+            found = {row[0] for row in rows}
+            result["tables"][table] = {"rows": rows, "deleted": [row_id for row_id in ids if row_id not in found], "employees": []}
+            if table in _CHANGED_OWNERS_SQL:
+                cursor.execute(_CHANGED_OWNERS_SQL[table], (json.dumps(ids),))
+                result["tables"][table]["employees"] = [row[0] for row in cursor.fetchall()]
+    return result
+
 def fetch_all_salaries_for_export():
     """يجلب جميع بيانات الرواتب من قاعدة البيانات للتصدير، بما في ذلك الراتب السنوي."""
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT s.id, e.name, e.department, s.basic_salary, s.allowances, s.deductions, s.net_salary, s.payment_method, s.payment_date
@@ -456,12 +1657,59 @@ def fetch_all_salaries_for_export():
         exported_data.append(row[0:3] + (monthly_basic_salary, annual_basic_salary) + row[4:8] + (payment_date_ddmmyyyy,))
     return exported_data
 
+def iter_salaries_for_export(batch_size=500):
+    """مثل fetch_all_salaries_for_export لكن يولد الصفوف على دفعات للتصدير المتدفق."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT s.id, e.name, e.department, s.basic_salary, s.allowances, s.deductions, s.net_salary, s.payment_method, s.payment_date
+            FROM salaries s
+            JOIN employees e ON s.employee_id = e.id
+            ORDER BY s.payment_date DESC
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row[0:3] + (row[3], row[3] * 12) + row[4:8] + (convert_date_from_db_format(row[8]),)
+
+def iter_salary_batches_for_payslips(year, month, department=None, batch_size=500):
+    """
+    سجلات رواتب شهر معين (وقسم اختياري) على دفعات مرتبة بالمعرف، لإصدار القسائم دون تحميلها كلها في الذاكرة.
+    كل دفعة قراءة قصيرة مستقلة تبدأ بعد آخر معرف، فلا يبقى قفل قراءة مفتوحاً طوال الإصدار يحجب الكتابة.
+    كل صف: (id, employee_id, employee_name, employee_number, department, basic_salary, allowances, deductions, net_salary, payment_method, payment_date).
+    """
+    start, end = datecodec.month_range(year, month)
+    query = """
+        SELECT s.id, e.id, e.name, e.employee_number, e.department, s.basic_salary, s.allowances, s.deductions,
+               s.net_salary, s.payment_method, s.payment_date
+        FROM salaries s
+        JOIN employees e ON s.employee_id = e.id
+        WHERE s.payment_date >= ? AND s.payment_date < ? AND s.id > ?
+    """
+    params = [start, end]
+    if department:
+        query += " AND e.department = ?"
+        params.append(department)
+    query += " ORDER BY s.id LIMIT ?"
+    last_id = 0
+    while True:
+        with get_connection() as conn:
+            rows = conn.execute(query, params[:2] + [last_id] + params[2:] + [batch_size]).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        yield rows
+        if len(rows) < batch_size:
+            break
+
 def get_last_employee_salary(employee_id):
     """
     يجلب آخر راتب أساسي وبدلات وخصومات لموظف معين.
     يعيد (basic_salary, allowances, deductions) أو None إذا لم يتم العثور على سجل.
     """
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT basic_salary, allowances, deductions
@@ -471,37 +1719,53 @@ def get_last_employee_salary(employee_id):
             LIMIT 1
         """, (employee_id,))
         result = cursor.fetchone()
+        if result is None:
+            # لا رواتب في السنوات المفتوحة: البحث في الأرشيف من الأحدث، والتوقف عند أول سنة فيها راتب
+            for year in _archive_years(cursor, "salaries"):
+                archived = _query_archives(cursor, [year], """
+                    SELECT basic_salary, allowances, deductions FROM {archive}.salaries
+                    WHERE employee_id = ? ORDER BY payment_date DESC LIMIT 1
+                """, (employee_id,))
+                if archived:
+                    return archived[0]
     return result
 
 def salary_exists_for_month(employee_id, year, month):
     """
     يتحقق مما إذا كان هناك سجل راتب لموظف معين في شهر وسنة محددين.
     """
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        # تنسيق الشهر والسنة للمقارنة مع payment_date المخزن كـYYYY-MM-DD
-        # نستخدم LIKE لأنه قد يكون هناك اختلاف في اليوم
-        month_str_db_format = f"{year}-{month:02d}-%"
-        cursor.execute("""
-            SELECT 1 FROM salaries
-            WHERE employee_id = ? AND payment_date LIKE ?
+        # payment_date رقم يوم، فالشهر نطاق أرقام [أول يوم، أول يوم في الشهر التالي)
+        month_start, month_end = datecodec.month_range(year, month)
+        sql = """
+            SELECT 1 FROM {salaries}
+            WHERE employee_id = ? AND payment_date >= ? AND payment_date < ?
             LIMIT 1
-        """, (employee_id, month_str_db_format))
+        """
+        params = (employee_id, month_start, month_end)
+        if int(year) in _archive_years(cursor, "salaries"):
+            return bool(_query_archives(cursor, [int(year)], sql.format(salaries="{archive}.salaries"), params))
+        cursor.execute(sql.format(salaries="salaries"), params)
         return cursor.fetchone() is not None
 
-def fetch_employee_salary_history(employee_id):
+def fetch_employee_salary_history(employee_id, include_archives=False):
     """
     يجلب جميع سجلات الرواتب لموظف معين، مرتبة تنازليًا حسب تاريخ الدفع.
+    include_archives يضيف رواتبه في السنوات المؤرشفة.
+    """
+    sql = """
+        SELECT id, basic_salary, allowances, deductions, net_salary, payment_method, payment_date
+        FROM {salaries}
+        WHERE employee_id = ?
     """
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, basic_salary, allowances, deductions, net_salary, payment_method, payment_date
-            FROM salaries
-            WHERE employee_id = ?
-            ORDER BY payment_date DESC
-        """, (employee_id,))
+        cursor.execute(sql.format(salaries="salaries") + " ORDER BY payment_date DESC", (employee_id,))
         rows = cursor.fetchall()
+        if include_archives:
+            archived = _query_archives(cursor, _archive_years(cursor, "salaries"), sql.format(salaries="{archive}.salaries"), (employee_id,))
+            rows += sorted(archived, key=lambda row: row[6], reverse=True)
     
     history_data = []
     for row in rows:
@@ -509,4 +1773,288 @@ def fetch_employee_salary_history(employee_id):
         payment_date_ddmmyyyy = convert_date_from_db_format(payment_date_db)
         annual_basic_salary = basic_salary * 12
         history_data.append((salary_id, basic_salary, annual_basic_salary, allowances, deductions, net_salary, payment_method, payment_date_ddmmyyyy))
-    return history_data
\ No newline at end of file
+    return history_data
+
+def fetch_employee_dossier(employee_id):
+    """
+    ملف الموظف في استعلامات مفهرسة قليلة (documents.employee_id، attachments.document_id، salaries.employee_id):
+    {"documents": [(id, name, number, date, expiry_date, category, عدد المرفقات)], "attachment_ids": [...],
+     "salaries": سجل الرواتب كما في fetch_employee_salary_history}.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT d.id, d.name, d.number, d.date, d.expiry_date, d.category,
+                   (SELECT COUNT(*) FROM attachments a WHERE a.document_id = d.id)
+            FROM documents d
+            WHERE d.employee_id = ?
+            ORDER BY d.expiry_date IS NULL, d.expiry_date
+        """, (employee_id,))
+        documents = cursor.fetchall()
+        cursor.execute("""
+            SELECT a.id FROM documents d JOIN attachments a ON a.document_id = d.id WHERE d.employee_id = ?
+        """, (employee_id,))
+        attachment_ids = [row[0] for row in cursor.fetchall()]
+    return {"documents": documents, "attachment_ids": attachment_ids, "salaries": fetch_employee_salary_history(employee_id)}
+
+def prepare_monthly_salaries(year, month, payment_date_ddmmyyyy, payment_method="تحويل بنكي", progress=None):
+    """
+    يعد سجلات رواتب شهر معين لجميع الموظفين الذين ليس لديهم سجل بعد لهذا الشهر،
+    باستخدام آخر راتب مسجل لكل موظف كقيمة افتراضية.
+    progress (اختياري) يُستدعى لكل موظف بالشكل progress(emp_id, emp_name, error) حيث error هو None عند النجاح.
+    يعيد (عدد الرواتب التي تم إعدادها، قائمة الأخطاء بالشكل (emp_id, emp_name, رسالة الخطأ)).
+    """
+    new_salaries_count = 0
+    failures = []
+    for emp in fetch_all_employees():
+        emp_id = emp[0]
+        emp_name = emp[1]
+
+        if salary_exists_for_month(emp_id, year, month):
+            continue
+
+        last_salary_data = get_last_employee_salary(emp_id)
+        basic_salary, allowances, deductions = last_salary_data if last_salary_data else (0.0, 0.0, 0.0)
+
+        try:
+            add_salary(emp_id, basic_salary, allowances, deductions, payment_method, payment_date_ddmmyyyy)
+            new_salaries_count += 1
+            log_audit_event("إعداد راتب شهري", f"تم إعداد راتب افتراضي للموظف: {emp_name} لشهر {month}/{year}")
+            if progress:
+                progress(emp_id, emp_name, None)
+        except Exception as e:
+            failures.append((emp_id, emp_name, str(e)))
+            if progress:
+                progress(emp_id, emp_name, e)
+    return new_salaries_count, failures
+
+
+def fetch_payroll_summary(year=None, department=None, payment_method=None):
+    """
+    يجلب إجماليات الرواتب الشهرية من الملخص المحدث تلقائياً دون إعادة تجميع جدول الرواتب.
+    يعيد صفوفاً بالشكل (month YYYY-MM, department, payment_method, total_basic, total_allowances, total_deductions, total_net, headcount).
+    """
+    query = """
+        SELECT month, department, payment_method, total_basic, total_allowances, total_deductions, total_net, headcount
+        FROM payroll_monthly_summary
+        WHERE 1 = 1
+    """
+    params = []
+    if year:
+        query += " AND month >= ? AND month < ?"
+        params += [f"{int(year):04d}-01", f"{int(year) + 1:04d}-01"]
+    if department and department != "الكل":
+        query += " AND department = ?"
+        params.append(department)
+    if payment_method and payment_method != "الكل":
+        query += " AND payment_method = ?"
+        params.append(payment_method)
+    query += " ORDER BY month DESC, department, payment_method"
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+
+def get_payroll_summary_years():
+    """السنوات المتوفرة في ملخص الرواتب تنازلياً."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT substr(month, 1, 4) FROM payroll_monthly_summary ORDER BY 1 DESC")
+        return [row[0] for row in cursor.fetchall()]
+
+# --- أرشيف السنوات المغلقة ---
+# رواتب السنوات المالية المغلقة والمستندات المنتهية منذ زمن تُنقل إلى قاعدة منفصلة لكل سنة
+# (db_registry.archives_dir)، فلا تمر عليها الاستعلامات اليومية. تُرفق (ATTACH) فقط عندما
+# يطلبها استعلام: خيار include_archives، أو استعلام يقع نطاقه التاريخي في سنة مؤرشفة.
+# ملخص الرواتب الشهرية يحتفظ بأشهر السنوات المؤرشفة كما كانت عند الأرشفة.
+SALARY_OPEN_YEARS = 2              # السنة الحالية والسابقة تبقيان مفتوحتين
+DOCUMENT_ARCHIVE_AFTER_YEARS = 3   # تُؤرشف المستندات المنتهية في سنة أقدم من هذا العدد من السنوات
+ARCHIVE_ATTACH_BATCH = 8           # أقل من حد SQLite الافتراضي للقواعد المرفقة (10)
+ARCHIVE_KINDS = ("salaries", "documents")
+
+_FOREIGN_KEY_LINES = re.compile(r",\s*FOREIGN KEY[^\n]*")
+
+def archive_path(year):
+    return os.path.join(db_registry.archives_dir(current_database()), f"{int(year)}.db")
+
+def _archive_years(cursor, kind):
+    """السنوات المؤرشفة من نوع معين من الأحدث للأقدم."""
+    cursor.execute("SELECT year FROM archive_partitions WHERE kind = ? ORDER BY year DESC", (kind,))
+    return [row[0] for row in cursor.fetchall()]
+
+def _attach_archive(cursor, year, alias, create=False):
+    path = archive_path(year)
+    if not create and not os.path.exists(path):
+        raise ValueError(f"ملف أرشيف سنة {year} غير موجود: {path}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cursor.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+    if create:
+        # نفس أعمدة القاعدة الرئيسية بلا مفاتيح أجنبية (لا تعبر بين الملفات)
+        for table in ("salaries", "documents", "attachments"):
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {alias}.{table} ({_FOREIGN_KEY_LINES.sub('', _TABLE_COLUMNS[table])})")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {alias}.document_tags (document_id INTEGER NOT NULL, tag TEXT NOT NULL, PRIMARY KEY (document_id, tag)) WITHOUT ROWID")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_salaries_employee_date ON salaries(employee_id, payment_date)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {alias}.idx_attachments_document_id ON attachments(document_id)")
+    return alias
+
+def _query_archives(cursor, years, sql, params=()):
+    """
+    تنفيذ sql على قواعد أرشيف السنوات المحددة ({archive} هو اسم القاعدة المرفقة) وجمع الصفوف.
+    تُرفق القواعد على دفعات من ARCHIVE_ATTACH_BATCH في استعلام UNION ALL واحد وتُفصل بعد كل دفعة.
+    """
+    rows = []
+    for batch in _chunks(years, ARCHIVE_ATTACH_BATCH):
+        aliases = []
+        try:
+            for year in batch:
+                aliases.append(_attach_archive(cursor, year, f"archive_{len(aliases)}"))
+            cursor.execute(" UNION ALL ".join(sql.format(archive=alias) for alias in aliases), tuple(params) * len(aliases))
+            rows.extend(cursor.fetchall())
+        finally:
+            for alias in aliases:
+                cursor.execute(f"DETACH DATABASE {alias}")
+    return rows
+
+def _fetch_archived_documents(cursor, keyword, category, tag):
+    norm = normalize_arabic(keyword) or ""
+    query = (
+        "SELECT id, name, number, date, expiry_date, issuer, category, tags, "
+        "(SELECT COUNT(*) FROM {archive}.attachments a WHERE a.document_id = documents.id) FROM {archive}.documents WHERE 1 = 1"
+    )
+    params = ()
+    if norm:
+        query += " AND (name_norm LIKE ? OR issuer_norm LIKE ? OR number LIKE ? OR category LIKE ? OR tags LIKE ?)"
+        params += (f"%{norm}%", f"%{norm}%", f"%{keyword.strip()}%", f"%{keyword.strip()}%", f"%{keyword.strip()}%")
+    if category and category != "الكل":
+        query += " AND category = ?"
+        params += (category,)
+    if tag and tag != "الكل":
+        query += " AND id IN (SELECT document_id FROM {archive}.document_tags WHERE tag = ?)"
+        params += (tag,)
+    return _query_archives(cursor, _archive_years(cursor, "documents"), query, params)
+
+def _check_salary_year_open(cursor, payment_day):
+    year = datecodec.date_from_day(payment_day).year
+    cursor.execute("SELECT 1 FROM archive_partitions WHERE year = ? AND kind = 'salaries'", (year,))
+    if cursor.fetchone() is not None:
+        raise ValueError(f"السنة المالية {year} مغلقة ومؤرشفة، ولا يمكن إضافة رواتب إليها أو نقل رواتب إليها.")
+
+def _copy_rows(cursor, source, target, table, where, params):
+    cursor.execute(f"PRAGMA {source}.table_info({table})")
+    columns = ", ".join(column[1] for column in cursor.fetchall())
+    cursor.execute(f"INSERT INTO {target}.{table} ({columns}) SELECT {columns} FROM {source}.{table} WHERE {where}", params)
+    return cursor.rowcount
+
+def _archive_year(year, kind, restore=False):
+    """نقل سنة من نوع معين إلى قاعدة أرشيفها (أو منها عند restore) في معاملة واحدة. يعيد عدد الصفوف."""
+    start, end = datecodec.year_range(year)
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        alias = _attach_archive(cursor, year, "archive_target", create=True)
+        source, target = (alias, "main") if restore else ("main", alias)
+        try:
+            if kind == "salaries":
+                where = "payment_date >= ? AND payment_date < ?"
+                months = (f"{year:04d}-01", f"{year + 1:04d}-01")
+                cursor.execute("SELECT * FROM payroll_monthly_summary WHERE month >= ? AND month < ?", months)
+                summary = cursor.fetchall()
+                if restore:
+                    # المشغلات ستضيف الرواتب المستعادة إلى الملخص من جديد
+                    cursor.execute("DELETE FROM payroll_monthly_summary WHERE month >= ? AND month < ?", months)
+                moved = _copy_rows(cursor, source, target, "salaries", where, (start, end))
+                cursor.execute(f"DELETE FROM {source}.salaries WHERE {where}", (start, end))
+                if not restore:
+                    # مشغلات الحذف طرحت الرواتب المنقولة؛ ملخص السنة المغلقة يبقى كما كان
+                    cursor.executemany("INSERT OR REPLACE INTO payroll_monthly_summary VALUES (?, ?, ?, ?, ?, ?, ?, ?)", summary)
+            else:
+                where = "expiry_date >= ? AND expiry_date < ?"
+                documents = f"document_id IN (SELECT id FROM {source}.documents WHERE {where})"
+                if restore:
+                    moved = _copy_rows(cursor, source, target, "documents", where, (start, end))
+                    _copy_rows(cursor, source, target, "attachments", documents, (start, end))
+                    cursor.execute(f"SELECT id, tags FROM {source}.documents WHERE {where}", (start, end))
+                    for doc_id, tags in cursor.fetchall():
+                        _set_document_tags(cursor, doc_id, tags)
+                    cursor.execute(f"DELETE FROM {source}.document_tags WHERE {documents}", (start, end))
+                    cursor.execute(f"DELETE FROM {source}.attachments WHERE {documents}", (start, end))
+                else:
+                    cursor.execute(f"""
+                        INSERT OR IGNORE INTO {target}.document_tags (document_id, tag)
+                        SELECT dt.document_id, t.name FROM main.document_tags dt JOIN main.tags t ON t.id = dt.tag_id
+                        WHERE dt.{documents}
+                    """, (start, end))
+                    _copy_rows(cursor, source, target, "attachments", documents, (start, end))
+                    moved = _copy_rows(cursor, source, target, "documents", where, (start, end))
+                # الحذف من الرئيسية يحذف المرفقات والعلامات المرتبطة (ON DELETE CASCADE)؛ الملفات تبقى في مكانها
+                cursor.execute(f"DELETE FROM {source}.documents WHERE {where}", (start, end))
+
+            if restore:
+                cursor.execute("DELETE FROM archive_partitions WHERE year = ? AND kind = ?", (year, kind))
+                _insert_audit(cursor, "استعادة من الأرشيف", f"تمت إعادة {moved} سجل ({kind}) لسنة {year} إلى القاعدة الرئيسية")
+            elif moved:
+                cursor.execute("""
+                    INSERT INTO archive_partitions (year, kind, row_count, archived_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (year, kind) DO UPDATE SET row_count = row_count + excluded.row_count, archived_at = excluded.archived_at
+                """, (year, kind, moved, datecodec.now_timestamp()))
+                _insert_audit(cursor, "أرشفة", f"تم نقل {moved} سجل ({kind}) لسنة {year} إلى {archive_path(year)}")
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise Exception(f"❌ فشل نقل سنة {year} ({kind}): {e}")
+        finally:
+            cursor.execute(f"DETACH DATABASE {alias}")
+        if restore:
+            cursor.execute("SELECT 1 FROM archive_partitions WHERE year = ?", (year,))
+            if cursor.fetchone() is None:
+                os.remove(archive_path(year))
+    return moved
+
+def get_archive_partitions():
+    """السنوات المؤرشفة: [(السنة، النوع، عدد السجلات، وقت الأرشفة)] من الأحدث."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT year, kind, row_count, archived_at FROM archive_partitions ORDER BY year DESC, kind")
+        return [(year, kind, count, datecodec.format_timestamp(at)) for year, kind, count, at in cursor.fetchall()]
+
+def archivable_years(salary_open_years=SALARY_OPEN_YEARS, document_after_years=DOCUMENT_ARCHIVE_AFTER_YEARS):
+    """السنوات التي لها بيانات في القاعدة الرئيسية ويمكن أرشفتها: [(السنة، النوع)]."""
+    current_year = datecodec.date_from_day(datecodec.today()).year
+    cutoffs = {"salaries": current_year - salary_open_years + 1, "documents": current_year - document_after_years + 1}
+    columns = {"salaries": "payment_date", "documents": "expiry_date"}
+    years = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        for kind in ARCHIVE_KINDS:
+            column = columns[kind]
+            cursor.execute(
+                f"SELECT DISTINCT CAST(strftime('%Y', {column} * 86400, 'unixepoch') AS INTEGER) FROM {kind} WHERE {column} < ? ORDER BY 1",
+                (datecodec.year_range(cutoffs[kind])[0],)
+            )
+            years += [(row[0], kind) for row in cursor.fetchall()]
+    return years
+
+def archive_closed_years(salary_open_years=SALARY_OPEN_YEARS, document_after_years=DOCUMENT_ARCHIVE_AFTER_YEARS):
+    """أرشفة كل السنوات المغلقة سنةً سنة. يعيد [(السنة، النوع، عدد السجلات المنقولة)]."""
+    results = []
+    for year, kind in archivable_years(salary_open_years, document_after_years):
+        moved = _archive_year(year, kind)
+        if moved:
+            results.append((year, kind, moved))
+    return results
+
+def restore_archived_year(year, kind):
+    """إعادة سنة مؤرشفة إلى القاعدة الرئيسية (مثلاً لتصحيح بيانات سنة مغلقة). يعيد عدد السجلات."""
+    if kind not in ARCHIVE_KINDS:
+        raise ValueError(f"نوع أرشيف غير معروف: {kind}")
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        if int(year) not in _archive_years(cursor, kind):
+            raise ValueError(f"السنة {year} ({kind}) غير مؤرشفة.")
+    return _archive_year(int(year), kind, restore=True)
+
+def fetch_archived_attachment_paths():
+    """مسارات ملفات مرفقات المستندات المؤرشفة (لا تُعد ملفات يتيمة في فحص السلامة)."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        rows = _query_archives(cursor, _archive_years(cursor, "documents"), "SELECT filepath FROM {archive}.attachments")
+    return {row[0] for row in rows}
@@ -0,0 +1,325 @@
+"""
+النسخ الاحتياطي الحي لقاعدة البيانات والمرفقات.
+
+- القاعدة تُنسخ بواجهة النسخ الاحتياطي في SQLite على خطوات صغيرة من الصفحات مع
+  استراحة بينها، فلا يُحجب الكتّاب أثناء النسخ، والنتيجة نسخة متسقة لا ملف ممزق.
+- المرفقات تُنسخ تزايدياً: الملف الذي لم يتغير حجمه ووقت تعديله منذ النسخة السابقة
+  يُربط بها ربطاً صلباً (hard link) بدل نسخه، فلا يُقرأ ولا يشغل مساحة إضافية.
+  كل نسخة تبقى مع ذلك مجلداً كاملاً قائماً بذاته يمكن حذفه أو استعادته منفرداً.
+
+- قواعد أرشيف السنوات (db_registry.archives_dir) تُنسخ بنفس طريقة المرفقات، فهي لا تتغير
+  بعد الأرشفة وتُربط غالباً بالنسخة السابقة.
+
+بنية النسخة: <مجلد النسخ>/<YYYYmmdd_HHMMSS.ffffff>_<اسم القاعدة>/
+    <ملف القاعدة>، attachments/، archives/، manifest.json (يُكتب أخيراً؛ النسخة بلا manifest غير مكتملة
+    ويُحذف مجلدها إذا فشل النسخ)
+مجلد النسخ مشترك بين قواعد السجل، فالعرض والربط بالنسخة السابقة والحذف تقتصر على نسخ القاعدة الحالية.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+
+import backend
+import db_registry
+
+MANIFEST_NAME = "manifest.json"
+PAGES_PER_STEP = 256
+STEP_PAUSE_SECONDS = 0.005
+LAST_BACKUP_KEY = "backup.last_run"
+DEFAULT_INTERVAL_HOURS = 24
+DEFAULT_KEEP = 14
+
+
+# الأجزاء من الثانية اختيارية لتبقى النسخ القديمة المسماة إلى الثانية معروفة
+_BACKUP_NAME = re.compile(r"^\d{8}_\d{6}(?:\.\d{6})?_(.+)$")
+
+
+def _database_stem(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def list_backups(backups_root=None, db_path=None):
+    """النسخ المكتملة (التي لها manifest) لقاعدة db_path (افتراضياً الحالية) من الأقدم إلى الأحدث."""
+    backups_root = backups_root or db_registry.backups_dir()
+    stem = _database_stem(db_path or backend.current_database())
+    if not os.path.isdir(backups_root):
+        return []
+    backups = []
+    for name in sorted(os.listdir(backups_root)):
+        match = _BACKUP_NAME.match(name)
+        if match and match.group(1) == stem and os.path.isfile(os.path.join(backups_root, name, MANIFEST_NAME)):
+            backups.append(os.path.join(backups_root, name))
+    return backups
+
+
+def read_manifest(backup_path):
+    with open(os.path.join(backup_path, MANIFEST_NAME), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _backup_database(db_path, target_path, progress=None):
+    """نسخ القاعدة الحية إلى target_path بواجهة SQLite backup على دفعات من الصفحات."""
+    temp_path = target_path + ".part"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    source = sqlite3.connect(db_path, timeout=30)
+    target = sqlite3.connect(temp_path)
+    try:
+        def report(status, remaining, total):
+            if progress:
+                progress("database", total - remaining, total)
+        source.backup(target, pages=PAGES_PER_STEP, progress=report, sleep=STEP_PAUSE_SECONDS)
+    finally:
+        target.close()
+        source.close()
+    os.replace(temp_path, target_path)
+
+
+def _snapshot_attachments(source_dir, target_dir, previous, progress=None):
+    """
+    نسخ المرفقات إلى target_dir. previous = (مجلد مرفقات النسخة السابقة، قائمة ملفاتها في manifest).
+    يعيد (قائمة الملفات، عدد المنسوخ، عدد المربوط).
+    """
+    os.makedirs(target_dir)
+    previous_dir, previous_files = previous
+    files = {}
+    copied = linked = 0
+    names = sorted(entry.name for entry in os.scandir(source_dir) if entry.is_file()) if os.path.isdir(source_dir) else []
+    for index, name in enumerate(names, start=1):
+        source = os.path.join(source_dir, name)
+        destination = os.path.join(target_dir, name)
+        try:
+            stat = os.stat(source)
+        except FileNotFoundError:
+            continue  # حُذف أثناء النسخ
+        old = previous_files.get(name)
+        if old and old["size"] == stat.st_size and old["mtime_ns"] == stat.st_mtime_ns:
+            try:
+                os.link(os.path.join(previous_dir, name), destination)
+                files[name] = old
+                linked += 1
+                continue
+            except OSError:
+                pass  # نظام ملفات لا يدعم الربط أو مجلد على جهاز آخر: نسخ عادي
+        try:
+            size, sha256 = backend._copy_with_digest(source, destination)
+        except FileNotFoundError:
+            continue
+        files[name] = {"size": size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+        copied += 1
+        if progress:
+            progress("attachments", index, len(names))
+    return files, copied, linked
+
+
+def create_backup(backups_root=None, progress=None):
+    """
+    إنشاء نسخة احتياطية كاملة (القاعدة أولاً ثم المرفقات) وإرجاع مسارها.
+    progress(المرحلة، المنجز، الإجمالي) اختياري ويُستدعى من خيط النسخ.
+    """
+    backups_root = backups_root or db_registry.backups_dir()
+    db_path = backend.current_database()
+    started = time.time()
+    os.makedirs(backups_root, exist_ok=True)
+    while True:
+        # نسختان في الثانية نفسها (يدوية ومجدولة) تحصلان على مجلدين مختلفين
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S.%f")
+        backup_path = os.path.join(backups_root, f"{stamp}_{_database_stem(db_path)}")
+        try:
+            os.mkdir(backup_path)
+            break
+        except FileExistsError:
+            continue
+
+    try:
+        manifest = _write_backup(backup_path, backups_root, db_path, started, progress)
+    except BaseException:
+        # نسخة ناقصة بلا manifest لا تظهر في list_backups ولا يحذفها prune_backups
+        shutil.rmtree(backup_path, ignore_errors=True)
+        raise
+
+    backend.set_maintenance_state(LAST_BACKUP_KEY, manifest["created"])
+    backend.log_audit_event(
+        "نسخ احتياطي",
+        f"تم إنشاء نسخة احتياطية في {backup_path} ({manifest['copied']} ملف منسوخ، {manifest['linked']} ملف مربوط، {manifest['seconds']} ثانية)"
+    )
+    return backup_path
+
+
+def _write_backup(backup_path, backups_root, db_path, started, progress):
+    """نسخ القاعدة والمرفقات وقواعد الأرشيف إلى backup_path ثم كتابة manifest وإرجاعه."""
+    existing = list_backups(backups_root, db_path)
+    previous = (None, {})
+    previous_archives = (None, {})
+    if existing:
+        previous_manifest = read_manifest(existing[-1])
+        previous = (os.path.join(existing[-1], "attachments"), previous_manifest["attachments"])
+        previous_archives = (os.path.join(existing[-1], "archives"), previous_manifest.get("archives", {}))
+
+    db_filename = os.path.basename(db_path)
+    _backup_database(db_path, os.path.join(backup_path, db_filename), progress)
+    files, copied, linked = _snapshot_attachments(
+        backend.ATTACHMENTS_DIR, os.path.join(backup_path, "attachments"), previous, progress
+    )
+    archives, _, _ = _snapshot_attachments(
+        db_registry.archives_dir(db_path), os.path.join(backup_path, "archives"), previous_archives
+    )
+
+    manifest = {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source_database": db_path,
+        "source_attachments": backend.ATTACHMENTS_DIR,
+        "database": db_filename,
+        "database_sha256": backend.file_sha256(os.path.join(backup_path, db_filename)),
+        "attachments": files,
+        "archives": archives,
+        "copied": copied,
+        "linked": linked,
+        "seconds": round(time.time() - started, 1),
+    }
+    with open(os.path.join(backup_path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+def verify_backup(backup_path, check_hashes=True):
+    """التحقق من نسخة: سلامة ملف القاعدة ووجود كل مرفق بحجمه (وبصمته). يعيد قائمة المشكلات."""
+    problems = []
+    try:
+        manifest = read_manifest(backup_path)
+    except (OSError, ValueError) as e:
+        return [f"تعذر قراءة {MANIFEST_NAME}: {e}"]
+
+    db_copy = os.path.join(backup_path, manifest["database"])
+    if not os.path.exists(db_copy):
+        problems.append(f"ملف القاعدة غير موجود: {db_copy}")
+    else:
+        if check_hashes and backend.file_sha256(db_copy) != manifest["database_sha256"]:
+            problems.append("بصمة ملف القاعدة لا تطابق manifest")
+        conn = sqlite3.connect(backend.readonly_uri(db_copy), uri=True)
+        try:
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        except sqlite3.DatabaseError as e:
+            result = str(e)
+        finally:
+            conn.close()
+        if result != "ok":
+            problems.append(f"فحص سلامة القاعدة: {result}")
+
+    attachments_dir = os.path.join(backup_path, "attachments")
+    for name, info in manifest["attachments"].items():
+        path = os.path.join(attachments_dir, name)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            problems.append(f"مرفق مفقود: {name}")
+            continue
+        if size != info["size"]:
+            problems.append(f"اختلاف حجم المرفق: {name}")
+        elif check_hashes and backend.file_sha256(path) != info["sha256"]:
+            problems.append(f"اختلاف بصمة المرفق: {name}")
+
+    # النسخ الأقدم من أرشفة السنوات لا تحتوي archives
+    for name, info in manifest.get("archives", {}).items():
+        path = os.path.join(backup_path, "archives", name)
+        if not os.path.exists(path) or os.path.getsize(path) != info["size"]:
+            problems.append(f"قاعدة أرشيف مفقودة أو مختلفة الحجم: {name}")
+        elif check_hashes and backend.file_sha256(path) != info["sha256"]:
+            problems.append(f"اختلاف بصمة قاعدة الأرشيف: {name}")
+    return problems
+
+
+def restore_backup(backup_path, db_path=None, attachments_dir=None):
+    """
+    استعادة نسخة بعد التحقق منها: محتوى القاعدة يُستبدل عبر واجهة backup (آمن مع الاتصالات
+    المفتوحة)، والمرفقات المفقودة أو المختلفة تُعاد إلى مجلد المرفقات. الملفات الزائدة لا تُحذف.
+    يعيد عدد المرفقات المستعادة.
+    """
+    problems = verify_backup(backup_path, check_hashes=False)
+    if problems:
+        raise ValueError("النسخة الاحتياطية غير سليمة:\n" + "\n".join(problems[:10]))
+    manifest = read_manifest(backup_path)
+    db_path = db_path or backend.current_database()
+    attachments_dir = attachments_dir or backend.ATTACHMENTS_DIR
+
+    source = sqlite3.connect(backend.readonly_uri(os.path.join(backup_path, manifest["database"])), uri=True)
+    target = sqlite3.connect(db_path, timeout=30)
+    try:
+        source.backup(target, pages=PAGES_PER_STEP)
+    finally:
+        target.close()
+        source.close()
+
+    os.makedirs(attachments_dir, exist_ok=True)
+    restored = 0
+    for name, info in manifest["attachments"].items():
+        destination = os.path.join(attachments_dir, name)
+        if os.path.exists(destination) and os.path.getsize(destination) == info["size"]:
+            continue
+        shutil.copy2(os.path.join(backup_path, "attachments", name), destination)
+        restored += 1
+
+    archives_dir = db_registry.archives_dir(db_path)
+    for name, info in manifest.get("archives", {}).items():
+        os.makedirs(archives_dir, exist_ok=True)
+        destination = os.path.join(archives_dir, name)
+        if os.path.exists(destination) and backend.file_sha256(destination) == info["sha256"]:
+            continue
+        shutil.copy2(os.path.join(backup_path, "archives", name), destination)
+
+    with backend.using_database(db_path):
+        backend.create_database()
+        backend.log_audit_event("استعادة نسخة احتياطية", f"تمت الاستعادة من {backup_path} ({restored} مرفق مستعاد)")
+    return restored
+
+
+def prune_backups(keep=DEFAULT_KEEP, backups_root=None, db_path=None):
+    """
+    حذف النسخ الأقدم لقاعدة db_path (افتراضياً الحالية) مع إبقاء آخر keep نسخة.
+    الملفات المربوطة تبقى ما دامت نسخة أحدث تشير إليها.
+    """
+    removed = []
+    for path in list_backups(backups_root, db_path)[:-keep] if keep > 0 else []:
+        shutil.rmtree(path)
+        removed.append(path)
+    return removed
+
+
+def backup_is_due(interval_hours=DEFAULT_INTERVAL_HOURS):
+    last = backend.get_maintenance_state(LAST_BACKUP_KEY)
+    if not last:
+        return True
+    elapsed = datetime.now() - datetime.strptime(last, "%Y-%m-%d %H:%M:%S")
+    return elapsed.total_seconds() >= interval_hours * 3600
+
+
+def run_scheduled_backup(interval_hours=DEFAULT_INTERVAL_HOURS, keep=DEFAULT_KEEP, backups_root=None):
+    """تشغيل نسخة إذا حان موعدها ثم حذف النسخ الزائدة. يعيد مسار النسخة أو None."""
+    if not backup_is_due(interval_hours):
+        return None
+    backup_path = create_backup(backups_root)
+    prune_backups(keep, backups_root)
+    return backup_path
+
+
+def start_backup_scheduler(interval_hours=DEFAULT_INTERVAL_HOURS, keep=DEFAULT_KEEP, check_every_seconds=600, on_error=None):
+    """خيط خلفي يتحقق دورياً من موعد النسخ ويشغله. يعيد حدث إيقاف."""
+    stop = threading.Event()
+    db_path = backend.current_database()
+
+    def loop():
+        while not stop.wait(check_every_seconds):
+            try:
+                with backend.using_database(db_path):
+                    run_scheduled_backup(interval_hours, keep)
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+
+    threading.Thread(target=loop, name="dms-backup-scheduler", daemon=True).start()
+    return stop
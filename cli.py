@@ -0,0 +1,572 @@
+"""
+واجهة سطر أوامر لتشغيل المهام الدورية دون واجهة رسومية (مثلاً من cron).
+
+أمثلة:
+    python cli.py payroll prepare --month 2024-05
+    python cli.py payroll payslips --month 2024-05 --department IT
+    python cli.py payroll project --months 24 --raise 3 --department-raise IT=5 --hire IT:2:1500:200
+    python cli.py export documents -o documents.csv
+    python cli.py export salaries -o salaries.xlsx
+    python cli.py expiry report --days 30
+    python cli.py import employees employees.csv
+    python cli.py --db sub_a expiry report
+    python cli.py export salaries --all-databases -o group_salaries.csv
+    python cli.py search "جواز" --databases main,sub_a
+    python cli.py maintenance verify-attachments --repair
+    python cli.py maintenance index-attachments
+    python cli.py maintenance compress-attachments
+    python cli.py maintenance database --vacuum --check
+    python cli.py search "عقد إيجار" --content
+    python cli.py archive run --dry-run
+    python cli.py search "عقد" --archives
+    python cli.py backup run --if-due --keep 14
+    python cli.py backup verify backups/20240501_020000_document_management
+
+لا تستورد هذه الواجهة tkinter، ولا تستورد pandas إلا عند القراءة أو الكتابة بصيغة xlsx.
+"""
+import argparse
+import csv
+import sys
+from functools import partial
+from datetime import datetime
+
+import backend
+import db_registry
+import fanout
+
+DOCUMENT_COLUMNS = ["ID", "الاسم", "الرقم", "تاريخ الإصدار", "تاريخ الانتهاء", "الجهة المصدرة", "الفئة", "العلامات"]
+SALARY_COLUMNS = [
+    "ID", "اسم الموظف", "القسم", "الراتب الأساسي (شهري)", "الراتب الأساسي (سنوي)",
+    "البدلات", "الخصومات", "صافي الراتب", "طريقة الدفع", "تاريخ الدفع"
+]
+EXPIRY_COLUMNS = ["ID", "الاسم", "الرقم", "تاريخ الانتهاء", "الجهة المصدرة", "الفئة", "المدة المتبقية"]
+PAYROLL_SUMMARY_COLUMNS = ["الشهر", "القسم", "طريقة الدفع", "إجمالي الأساسي", "إجمالي البدلات", "إجمالي الخصومات", "إجمالي الصافي", "عدد السجلات"]
+SEARCH_COLUMNS = ["ID", "الاسم", "الرقم", "تاريخ الإصدار", "تاريخ الانتهاء", "الجهة المصدرة", "الفئة", "العلامات", "المرفقات"]
+EXPIRY_COUNT_COLUMNS = ["قاعدة البيانات", "منتهية", "قريبة من الانتهاء"]
+EMPLOYEE_IMPORT_COLUMNS = ["الاسم", "الرقم الوظيفي", "القسم", "معلومات الاتصال", "تاريخ التعيين"]
+INTEGRITY_COLUMNS = ["المشكلة", "ID المرفق", "المسار", "تفاصيل"]
+DOCUMENT_IMPORT_COLUMNS = ["الاسم", "الرقم", "تاريخ الإصدار", "تاريخ الانتهاء", "الجهة المصدرة", "الفئة", "العلامات"]
+
+
+def _iter_export_documents():
+    for doc in backend.iter_documents_for_export():
+        doc = list(doc)
+        doc[3] = backend.convert_date_from_db_format(doc[3])
+        doc[4] = backend.convert_date_from_db_format(doc[4])
+        yield doc
+
+
+def _write_rows(rows, columns, output):
+    """كتابة الصفوف بصيغة CSV صفاً بصف، أو بصيغة xlsx عبر pandas إذا انتهى اسم الملف بـ .xlsx."""
+    if output and output.lower().endswith(".xlsx"):
+        import pandas as pd
+        pd.DataFrame(list(rows), columns=columns).to_excel(output, index=False)
+        return
+    if output and output != "-":
+        f = open(output, "w", newline="", encoding="utf-8-sig")
+    else:
+        f = sys.stdout
+    try:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            if f is sys.stdout:
+                f.flush()
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def _fanout_targets(options):
+    """قائمة القواعد المطلوبة للتشغيل الموزع، أو None للتشغيل على القاعدة الحالية فقط."""
+    if getattr(options, "all_databases", False):
+        return list(db_registry.get_registry())
+    if getattr(options, "databases", None):
+        return [name.strip() for name in options.databases.split(",") if name.strip()]
+    return None
+
+
+def _report_fanout_errors(errors):
+    for name, error in errors.items():
+        print(f"ERROR\t{name}\t{error}", file=sys.stderr, flush=True)
+    return 1 if errors else 0
+
+
+def _read_rows(filepath):
+    """قراءة ملف استيراد (CSV أو xlsx) كقواميس بأسماء الأعمدة."""
+    if filepath.lower().endswith((".xlsx", ".xls")):
+        import pandas as pd
+        df = pd.read_excel(filepath, dtype=str).fillna("")
+        yield from df.to_dict("records")
+        return
+    with open(filepath, newline="", encoding="utf-8-sig") as f:
+        yield from csv.DictReader(f)
+
+
+def cmd_payroll_prepare(options):
+    if options.month:
+        year, month = (int(part) for part in options.month.split("-"))
+    else:
+        today = datetime.now()
+        year, month = today.year, today.month
+    payment_date = options.payment_date or datetime.now().strftime("%d-%m-%Y")
+
+    def progress(emp_id, emp_name, error):
+        if error is None:
+            print(f"OK\t{emp_id}\t{emp_name}", flush=True)
+        else:
+            print(f"ERROR\t{emp_id}\t{emp_name}\t{error}", file=sys.stderr, flush=True)
+
+    count, failures = backend.prepare_monthly_salaries(year, month, payment_date, options.payment_method, progress=progress)
+    print(f"تم إعداد {count} راتب/رواتب لشهر {month:02d}/{year}، وفشل {len(failures)}.", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def cmd_payroll_payslips(options):
+    import payslips
+    year, month = (int(part) for part in options.month.split("-"))
+
+    def progress(written):
+        print(f"\rتمت كتابة {written} قسيمة...", end="", file=sys.stderr, flush=True)
+
+    result = payslips.generate_payslips(year, month, options.department, options.template, options.output_dir,
+                                        options.workers, progress=progress)
+    print(f"\nتم إصدار {result['written']} قسيمة (وتخطي {result['skipped']} صادرة سابقاً)، "
+          f"الإجمالي {result['total']} في: {result['folder']}", file=sys.stderr)
+    return 0
+
+
+def cmd_payroll_summary(options):
+    rows = backend.fetch_payroll_summary(options.year, options.department)
+    _write_rows(rows, PAYROLL_SUMMARY_COLUMNS, options.output)
+    return 0
+
+
+def _parse_department_values(items):
+    """تحويل قائمة "القسم=القيمة" إلى قاموس."""
+    values = {}
+    for item in items or []:
+        department, _, value = item.rpartition("=")
+        values[department] = float(value)
+    return values
+
+
+def cmd_payroll_project(options):
+    import payroll_model
+    new_hires = []
+    for item in options.hire or []:
+        parts = item.split(":")
+        if len(parts) < 3:
+            raise ValueError(f"صيغة التعيين غير صحيحة: {item} (المطلوب القسم:العدد:الأساسي[:البدلات[:الخصومات]])")
+        parts += ["0"] * (5 - len(parts))
+        new_hires.append((parts[0], int(parts[1]), float(parts[2]), float(parts[3]), float(parts[4])))
+    scenario = payroll_model.make_scenario(
+        options.raise_pct, _parse_department_values(options.department_raise),
+        _parse_department_values(options.allowance_change), new_hires, options.months, options.annual_raise
+    )
+    workforce = payroll_model.load_workforce()
+    _write_rows(payroll_model.evaluate_scenario(workforce, scenario), payroll_model.RESULT_COLUMNS, options.output)
+    if options.commit:
+        if not options.payment_date:
+            raise ValueError("يرجى تحديد --payment-date لاعتماد السيناريو.")
+        added, skipped = payroll_model.commit_scenario(workforce, scenario, options.payment_date)
+        print(f"تم اعتماد السيناريو: {added} سجل راتب جديد، وتخطي {skipped} موظف لديهم راتب في نفس الشهر.", file=sys.stderr)
+    return 0
+
+
+def cmd_payroll_adjust(options):
+    employee_ids = [int(emp_id) for emp_id in options.employees.split(",")] if options.employees else None
+    count = backend.preview_salary_adjustment(options.department, employee_ids)
+    if options.dry_run:
+        print(f"سيتم تعديل آخر راتب لـ {count} موظف.", file=sys.stderr)
+        return 0
+    mode, amount = ("percent", options.percent) if options.percent is not None else ("fixed", options.amount)
+    updated = backend.apply_salary_adjustment(options.field, mode, amount, options.department, employee_ids)
+    print(f"تم تعديل آخر راتب لـ {updated} موظف.", file=sys.stderr)
+    return 0
+
+
+def cmd_export(options):
+    if options.what == "documents":
+        _write_rows(_iter_export_documents(), DOCUMENT_COLUMNS, options.output)
+        backend.log_audit_event("تصدير بيانات", f"تم تصدير جميع المستندات من سطر الأوامر إلى: {options.output or 'stdout'}")
+    else:
+        targets = _fanout_targets(options)
+        if targets:
+            rows, errors = fanout.fanout_salaries_for_export(targets)
+            _write_rows(rows, ["قاعدة البيانات"] + SALARY_COLUMNS, options.output)
+            return _report_fanout_errors(errors)
+        _write_rows(backend.iter_salaries_for_export(), SALARY_COLUMNS, options.output)
+        backend.log_audit_event("تصدير رواتب", f"تم تصدير جميع الرواتب من سطر الأوامر إلى: {options.output or 'stdout'}")
+    return 0
+
+
+def cmd_expiry_report(options):
+    targets = _fanout_targets(options)
+    if targets:
+        rows, errors = fanout.fanout_expiry_counts(options.days, targets)
+        _write_rows(rows, EXPIRY_COUNT_COLUMNS, options.output)
+        return _report_fanout_errors(errors)
+    rows = (
+        (doc_id, name, number, backend.convert_date_from_db_format(expiry), issuer, category, backend.calculate_remaining_time(expiry))
+        for doc_id, name, number, expiry, issuer, category in backend.fetch_expiring_documents(options.days)
+    )
+    _write_rows(rows, EXPIRY_COLUMNS, options.output)
+    expired_count, near_count = backend.count_expiring_documents(options.days)
+    print(f"منتهية: {expired_count}، تنتهي خلال {options.days} يوماً: {near_count}", file=sys.stderr)
+    return 0
+
+
+def cmd_search(options):
+    if options.content:
+        search = backend.search_document_content
+    elif options.fuzzy:
+        search = backend.fuzzy_search_documents
+    elif options.archives:
+        search = partial(backend.fetch_documents, include_archives=True)
+    else:
+        search = backend.fetch_documents
+    targets = _fanout_targets(options)
+    if targets:
+        rows, errors = fanout.fanout_search_documents(options.keyword, options.category, targets, options.tag, search)
+        _write_rows(rows, ["قاعدة البيانات"] + SEARCH_COLUMNS, options.output)
+        return _report_fanout_errors(errors)
+    rows = (
+        row[:3] + (backend.convert_date_from_db_format(row[3]), backend.convert_date_from_db_format(row[4])) + row[5:]
+        for row in search(options.keyword, options.category, options.tag)
+    )
+    _write_rows(rows, SEARCH_COLUMNS, options.output)
+    return 0
+
+
+def cmd_databases(options):
+    current = backend.current_database()
+    for name, path in db_registry.get_registry().items():
+        marker = "*" if path == current else " "
+        print(f"{marker} {name}\t{path}")
+    return 0
+
+
+def _add_fanout_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--all-databases", action="store_true", help="التشغيل على كل القواعد المسجلة ودمج النتائج")
+    group.add_argument("--databases", help="أسماء القواعد مفصولة بفواصل")
+
+
+def cmd_import(options):
+    imported = 0
+    failed = 0
+    for line_number, record in enumerate(_read_rows(options.file), start=2):
+        try:
+            if options.what == "employees":
+                values = [str(record.get(col, "") or "").strip() for col in EMPLOYEE_IMPORT_COLUMNS]
+                backend.add_employee(*values)
+            else:
+                name, number, date, expiry, issuer, category, tags = (
+                    str(record.get(col, "") or "").strip() for col in DOCUMENT_IMPORT_COLUMNS
+                )
+                backend.add_document(name, number, date, expiry, issuer, None, category, tags)
+            imported += 1
+            print(f"OK\t{line_number}", flush=True)
+        except Exception as e:
+            failed += 1
+            print(f"ERROR\t{line_number}\t{e}", file=sys.stderr, flush=True)
+    print(f"تم استيراد {imported} سجل/سجلات، وفشل {failed}.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_verify_attachments(options):
+    from attachment_integrity import AttachmentIntegrityCheck
+    check = AttachmentIntegrityCheck(repair=options.repair, verify_hashes=options.hashes,
+                                     delete_missing=options.delete_missing)
+    issues = check.run()
+    _write_rows(issues, INTEGRITY_COLUMNS, options.output)
+    if check.error is not None:
+        print(f"ERROR\t{check.error}", file=sys.stderr)
+        return 1
+    progress = check.progress
+    print(f"تم فحص {progress['rows']} سجل و{progress['files']} ملف، وُجدت {len(issues)} مشكلة، وأُصلح {progress['repaired']}.", file=sys.stderr)
+    return 1 if issues and not options.repair else 0
+
+
+def cmd_index_attachments(options):
+    import content_index
+    if options.rebuild:
+        content_index.reset_index()
+    progress = content_index.ContentIndexer(workers=options.workers).run()
+    print(f"تمت فهرسة {progress[content_index.INDEXED]} مرفق، وتُخطي {progress[content_index.UNSUPPORTED]} غير مدعوم، "
+          f"وفشل {progress[content_index.FAILED]}.", file=sys.stderr)
+    return 0
+
+
+def cmd_compress_attachments(options):
+    compressed, skipped, saved = backend.compress_existing_attachments()
+    backend.wait_for_pending_file_removals()
+    print(f"تم ضغط {compressed} مرفق وتوفير {saved / (1024 * 1024):.1f} ميجابايت، وتُخطي {skipped} (مضغوط أصلاً أو غير مجدٍ).", file=sys.stderr)
+    return 0
+
+
+def cmd_migrate(options):
+    """ترقية مخطط القاعدة الحالية أو القواعد المحددة (شرط للتقارير الموزعة --all-databases)."""
+    targets = _fanout_targets(options)
+    paths = {name: db_registry.resolve_database(name) for name in targets} if targets else {None: backend.current_database()}
+    for name, path in paths.items():
+        with backend.using_database(path):
+            backend.create_database()
+        print(f"تم ترحيل {name or path} إلى إصدار المخطط {backend.SCHEMA_VERSION}.", file=sys.stderr)
+    return 0
+
+
+def cmd_database_maintenance(options):
+    import db_maintenance
+    if options.vacuum:
+        reclaimed = 0
+        while True:
+            pages = db_maintenance.reclaim_free_pages()
+            if not pages:
+                break
+            reclaimed += pages
+        print(f"تمت استعادة {reclaimed} صفحة حرة.", file=sys.stderr)
+    if options.analyze:
+        db_maintenance.analyze()
+    if options.checkpoint:
+        db_maintenance.checkpoint("TRUNCATE")
+    problems = []
+    if options.check:
+        problems = db_maintenance.IntegrityCheck(pause=0).run()
+        for problem in problems:
+            print(f"ERROR\t{problem}", file=sys.stderr)
+    stats = db_maintenance.database_stats(measure_fragmentation=options.fragmentation)
+    print(f"الملف\t{stats['path']}")
+    print(f"الحجم\t{stats['file_size']}")
+    print(f"حجم WAL\t{stats['wal_size']}")
+    print(f"الصفحات\t{stats['page_count']} × {stats['page_size']}")
+    print(f"الصفحات الحرة\t{stats['freelist_count']} ({stats['free_ratio']:.1%})")
+    print(f"auto_vacuum\t{stats['auto_vacuum']}")
+    print(f"journal_mode\t{stats['journal_mode']}")
+    if options.fragmentation and stats["fragmentation"] is not None:
+        print(f"التجزئة\t{stats['fragmentation']:.1%}")
+    print(f"آخر فحص سلامة\t{stats['last_check']}\t{stats['last_check_result']}")
+    return 1 if problems else 0
+
+
+def cmd_archive_run(options):
+    if options.dry_run:
+        for year, kind in backend.archivable_years(options.salary_open_years, options.document_after_years):
+            print(f"{year}\t{kind}")
+        return 0
+    for year, kind, moved in backend.archive_closed_years(options.salary_open_years, options.document_after_years):
+        print(f"{year}\t{kind}\t{moved}")
+        print(f"تمت أرشفة {moved} سجل ({kind}) لسنة {year} في {backend.archive_path(year)}", file=sys.stderr)
+    return 0
+
+
+def cmd_archive_list(options):
+    for year, kind, count, archived_at in backend.get_archive_partitions():
+        print(f"{year}\t{kind}\t{count}\t{archived_at}")
+    return 0
+
+
+def cmd_archive_restore(options):
+    restored = backend.restore_archived_year(options.year, options.kind)
+    print(f"تمت إعادة {restored} سجل ({options.kind}) لسنة {options.year} إلى القاعدة الرئيسية.", file=sys.stderr)
+    return 0
+
+
+def cmd_backup_run(options):
+    import backup
+    if options.if_due:
+        backup_path = backup.run_scheduled_backup(options.interval_hours, options.keep, options.dir)
+        if backup_path is None:
+            print("لم يحن موعد النسخ الاحتياطي بعد.", file=sys.stderr)
+            return 0
+    else:
+        backup_path = backup.create_backup(options.dir)
+        backup.prune_backups(options.keep, options.dir)
+    manifest = backup.read_manifest(backup_path)
+    print(backup_path)
+    print(f"تم النسخ في {manifest['seconds']} ثانية: {manifest['copied']} مرفق منسوخ، {manifest['linked']} مرفق مربوط.", file=sys.stderr)
+    return 0
+
+
+def cmd_backup_list(options):
+    import backup
+    for backup_path in backup.list_backups(options.dir):
+        manifest = backup.read_manifest(backup_path)
+        print(f"{backup_path}\t{manifest['created']}\t{len(manifest['attachments'])}")
+    return 0
+
+
+def cmd_backup_verify(options):
+    import backup
+    problems = backup.verify_backup(options.path, check_hashes=not options.quick)
+    for problem in problems:
+        print(f"ERROR\t{problem}", file=sys.stderr)
+    print("النسخة سليمة." if not problems else f"وُجدت {len(problems)} مشكلة.", file=sys.stderr)
+    return 1 if problems else 0
+
+
+def cmd_backup_restore(options):
+    import backup
+    if not options.yes:
+        print("الاستعادة تستبدل محتوى قاعدة البيانات الحالية. أعد التشغيل مع --yes للتأكيد.", file=sys.stderr)
+        return 2
+    restored = backup.restore_backup(options.path)
+    print(f"تمت الاستعادة إلى {backend.current_database()} ({restored} مرفق مستعاد).", file=sys.stderr)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="مهام نظام إدارة المستندات من سطر الأوامر")
+    parser.add_argument("--db", help="اسم قاعدة البيانات من السجل أو مسار ملفها")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    payroll = commands.add_parser("payroll", help="مهام الرواتب")
+    payroll_commands = payroll.add_subparsers(dest="action", required=True)
+    prepare = payroll_commands.add_parser("prepare", help="إعداد رواتب الشهر لجميع الموظفين")
+    prepare.add_argument("--month", help="الشهر بصيغة YYYY-MM (الافتراضي: الشهر الحالي)")
+    prepare.add_argument("--payment-date", help="تاريخ الدفع بصيغة DD-MM-YYYY (الافتراضي: اليوم)")
+    prepare.add_argument("--payment-method", default="تحويل بنكي")
+    prepare.set_defaults(func=cmd_payroll_prepare)
+    payslips_parser = payroll_commands.add_parser("payslips", help="إصدار قسيمة HTML لكل سجل راتب في الشهر (قابل للاستئناف)")
+    payslips_parser.add_argument("--month", required=True, help="الشهر بصيغة YYYY-MM")
+    payslips_parser.add_argument("--department")
+    payslips_parser.add_argument("--template", help="ملف قالب HTML بمتغيرات $employee_name و$net_salary ...")
+    payslips_parser.add_argument("--output-dir", help="المجلد الأساسي للقسائم (الافتراضي مجلد payslips)")
+    payslips_parser.add_argument("--workers", type=int, help="عدد العمليات (الافتراضي عدد الأنوية)")
+    payslips_parser.set_defaults(func=cmd_payroll_payslips)
+    summary = payroll_commands.add_parser("summary", help="إجماليات الرواتب الشهرية حسب القسم وطريقة الدفع")
+    summary.add_argument("--year", type=int)
+    summary.add_argument("--department")
+    summary.add_argument("-o", "--output")
+    summary.set_defaults(func=cmd_payroll_summary)
+    project = payroll_commands.add_parser("project", help="توقع تكلفة الرواتب وفق سيناريو زيادات وتعيينات (يتطلب NumPy)")
+    project.add_argument("--months", type=int, default=12)
+    project.add_argument("--raise", dest="raise_pct", type=float, default=0.0, help="زيادة عامة على الأساسي بالنسبة المئوية")
+    project.add_argument("--department-raise", action="append", metavar="القسم=النسبة")
+    project.add_argument("--allowance-change", action="append", metavar="القسم=المبلغ")
+    project.add_argument("--hire", action="append", metavar="القسم:العدد:الأساسي[:البدلات[:الخصومات]]")
+    project.add_argument("--annual-raise", type=float, default=0.0, help="زيادة سنوية مركبة خلال فترة التوقع")
+    project.add_argument("--commit", action="store_true", help="اعتماد السيناريو كسجلات رواتب جديدة")
+    project.add_argument("--payment-date", help="تاريخ الدفع لسجلات السيناريو بصيغة DD-MM-YYYY")
+    project.add_argument("-o", "--output")
+    project.set_defaults(func=cmd_payroll_project)
+    adjust = payroll_commands.add_parser("adjust", help="تعديل جماعي لآخر راتب لكل موظف في قسم أو قائمة موظفين")
+    adjust.add_argument("--field", choices=["basic_salary", "allowances", "deductions"], default="basic_salary")
+    change = adjust.add_mutually_exclusive_group(required=True)
+    change.add_argument("--percent", type=float, help="تغيير بنسبة مئوية (سالبة للتخفيض)")
+    change.add_argument("--amount", type=float, help="تغيير بمبلغ ثابت (سالب للتخفيض)")
+    adjust.add_argument("--department")
+    adjust.add_argument("--employees", help="أرقام الموظفين التعريفية مفصولة بفواصل")
+    adjust.add_argument("--dry-run", action="store_true", help="عرض عدد السجلات التي ستتأثر فقط")
+    adjust.set_defaults(func=cmd_payroll_adjust)
+
+    export = commands.add_parser("export", help="تصدير البيانات إلى CSV (أو xlsx)")
+    export.add_argument("what", choices=["documents", "salaries"])
+    export.add_argument("-o", "--output", help="ملف الإخراج (.csv أو .xlsx)؛ الافتراضي هو الإخراج القياسي")
+    _add_fanout_arguments(export)
+    export.set_defaults(func=cmd_export)
+
+    expiry = commands.add_parser("expiry", help="تقارير صلاحية المستندات")
+    expiry_commands = expiry.add_subparsers(dest="action", required=True)
+    report = expiry_commands.add_parser("report", help="المستندات المنتهية أو القريبة من الانتهاء")
+    report.add_argument("--days", type=int, default=90)
+    report.add_argument("-o", "--output")
+    _add_fanout_arguments(report)
+    report.set_defaults(func=cmd_expiry_report)
+
+    search = commands.add_parser("search", help="البحث في المستندات")
+    search.add_argument("keyword", nargs="?", default="")
+    search.add_argument("--category")
+    search.add_argument("--tag", help="المستندات التي تحمل هذه العلامة تماماً")
+    search_mode = search.add_mutually_exclusive_group()
+    search_mode.add_argument("--fuzzy", action="store_true", help="بحث تقريبي متسامح مع الأخطاء الإملائية، مرتب حسب التشابه")
+    search_mode.add_argument("--content", action="store_true", help="البحث في النص المستخرج من المرفقات")
+    search_mode.add_argument("--archives", action="store_true", help="تضمين المستندات المؤرشفة")
+    search.add_argument("-o", "--output")
+    _add_fanout_arguments(search)
+    search.set_defaults(func=cmd_search)
+
+    databases = commands.add_parser("databases", help="عرض قواعد البيانات المسجلة")
+    databases.set_defaults(func=cmd_databases)
+
+    import_parser = commands.add_parser("import", help="استيراد الموظفين أو المستندات من CSV/xlsx")
+    import_parser.add_argument("what", choices=["employees", "documents"])
+    import_parser.add_argument("file")
+    import_parser.set_defaults(func=cmd_import)
+
+    maintenance = commands.add_parser("maintenance", help="مهام الصيانة")
+    maintenance_commands = maintenance.add_subparsers(dest="action", required=True)
+    verify = maintenance_commands.add_parser("verify-attachments", help="فحص تطابق سجلات المرفقات مع الملفات")
+    verify.add_argument("--repair", action="store_true", help="حذف سجلات المستندات المحذوفة ونقل الملفات اليتيمة إلى الحجر")
+    verify.add_argument("--delete-missing", action="store_true",
+                        help="مع --repair: حذف السجلات التي فُقد ملفها أيضاً (افتراضياً يُبلغ عنها فقط)")
+    verify.add_argument("--hashes", action="store_true", help="التحقق من بصمة SHA-256 لكل ملف (أبطأ)")
+    verify.add_argument("-o", "--output")
+    verify.set_defaults(func=cmd_verify_attachments)
+    index = maintenance_commands.add_parser("index-attachments", help="استخراج نص المرفقات الجديدة وفهرسته للبحث في المحتوى")
+    index.add_argument("--rebuild", action="store_true", help="حذف الفهرس وإعادة استخراج كل المرفقات")
+    index.add_argument("--workers", type=int, default=2, help="عدد عمليات الاستخراج")
+    index.set_defaults(func=cmd_index_attachments)
+    compress = maintenance_commands.add_parser("compress-attachments", help="ضغط المرفقات المخزنة دون ضغط")
+    compress.set_defaults(func=cmd_compress_attachments)
+    migrate = maintenance_commands.add_parser("migrate", help="ترقية مخطط القاعدة (أو القواعد المحددة) إلى إصدار البرنامج")
+    _add_fanout_arguments(migrate)
+    migrate.set_defaults(func=cmd_migrate)
+    database = maintenance_commands.add_parser("database", help="إحصاءات ملف القاعدة وصيانته")
+    database.add_argument("--vacuum", action="store_true", help="استعادة كل الصفحات الحرة إلى نظام الملفات")
+    database.add_argument("--analyze", action="store_true", help="تحديث إحصاءات المخطط (ANALYZE)")
+    database.add_argument("--checkpoint", action="store_true", help="نقل WAL إلى القاعدة وتفريغه")
+    database.add_argument("--check", action="store_true", help="فحص السلامة (quick_check) لكل جدول")
+    database.add_argument("--fragmentation", action="store_true", help="حساب نسبة التجزئة (يقرأ كل الصفحات)")
+    database.set_defaults(func=cmd_database_maintenance)
+
+    archive = commands.add_parser("archive", help="أرشفة السنوات المغلقة في قواعد منفصلة لكل سنة")
+    archive_commands = archive.add_subparsers(dest="action", required=True)
+    archive_run = archive_commands.add_parser("run", help="نقل الرواتب والمستندات المنتهية للسنوات المغلقة إلى الأرشيف")
+    archive_run.add_argument("--salary-open-years", type=int, default=backend.SALARY_OPEN_YEARS,
+                             help="عدد سنوات الرواتب الأخيرة التي تبقى مفتوحة (مع السنة الحالية)")
+    archive_run.add_argument("--document-after-years", type=int, default=backend.DOCUMENT_ARCHIVE_AFTER_YEARS,
+                             help="تُؤرشف المستندات المنتهية في سنة أقدم من هذا العدد من السنوات")
+    archive_run.add_argument("--dry-run", action="store_true", help="عرض السنوات التي ستُؤرشف فقط")
+    archive_run.set_defaults(func=cmd_archive_run)
+    archive_list = archive_commands.add_parser("list", help="عرض السنوات المؤرشفة")
+    archive_list.set_defaults(func=cmd_archive_list)
+    archive_restore = archive_commands.add_parser("restore", help="إعادة سنة مؤرشفة إلى القاعدة الرئيسية")
+    archive_restore.add_argument("--year", type=int, required=True)
+    archive_restore.add_argument("--kind", choices=backend.ARCHIVE_KINDS, required=True)
+    archive_restore.set_defaults(func=cmd_archive_restore)
+
+    backup_parser = commands.add_parser("backup", help="النسخ الاحتياطي الحي للقاعدة والمرفقات")
+    backup_parser.add_argument("--dir", help="مجلد النسخ (الافتراضي من DMS_BACKUPS_DIR أو ملف الإعداد)")
+    backup_commands = backup_parser.add_subparsers(dest="action", required=True)
+    backup_run = backup_commands.add_parser("run", help="إنشاء نسخة احتياطية الآن")
+    backup_run.add_argument("--if-due", action="store_true", help="النسخ فقط إذا مضت المدة المحددة منذ آخر نسخة (للجدولة)")
+    backup_run.add_argument("--interval-hours", type=float, default=24)
+    backup_run.add_argument("--keep", type=int, default=14, help="عدد النسخ التي يُحتفظ بها")
+    backup_run.set_defaults(func=cmd_backup_run)
+    backup_list = backup_commands.add_parser("list", help="عرض النسخ المكتملة")
+    backup_list.set_defaults(func=cmd_backup_list)
+    backup_verify = backup_commands.add_parser("verify", help="التحقق من سلامة نسخة")
+    backup_verify.add_argument("path")
+    backup_verify.add_argument("--quick", action="store_true", help="التحقق من الأحجام فقط دون البصمات")
+    backup_verify.set_defaults(func=cmd_backup_verify)
+    backup_restore = backup_commands.add_parser("restore", help="استعادة نسخة إلى القاعدة الحالية")
+    backup_restore.add_argument("path")
+    backup_restore.add_argument("--yes", action="store_true")
+    backup_restore.set_defaults(func=cmd_backup_restore)
+    return parser
+
+
+def main(argv=None):
+    options = build_parser().parse_args(argv)
+    if options.db:
+        backend.set_database(db_registry.resolve_database(options.db))
+    if options.func is not cmd_databases and not _fanout_targets(options):
+        backend.create_database()
+    return options.func(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
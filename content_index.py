@@ -0,0 +1,233 @@
+"""
+استخراج نص المرفقات وفهرسته في الخلفية للبحث في المحتوى.
+
+- الاستخراج (TXT/CSV، DOCX، PDF) يجري في مجمع عمليات منفصل بأولوية منخفضة، فلا
+  ينافس الواجهة على المعالج ولا على قفل GIL.
+- المرفقات تُعالج على دفعات حسب id مع استراحة بين الدفعات، ويُحفظ آخر id معالج في
+  maintenance_state، فالفهرسة تزايدية وتُستأنف من حيث توقفت بعد إعادة التشغيل.
+- add_attachment يوقظ المفهرس فور إضافة مرفق؛ وإلا يتحقق من الجديد كل IDLE_SECONDS.
+
+النص يُخزن موحداً (normalize_arabic) في الجدول attachment_content (انظر backend).
+قراءة PDF تتطلب مكتبة pypdf؛ بدونها تُتخطى ملفات PDF وتُعد غير مدعومة.
+"""
+import os
+import re
+import html
+import time
+import zipfile
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import backend
+import attachment_store
+from arabic_text import normalize_arabic
+
+CURSOR_KEY = "content_index.last_attachment_id"
+BATCH_SIZE = 10
+BATCH_PAUSE_SECONDS = 0.5
+IDLE_SECONDS = 30
+MAX_FILE_BYTES = 50 * 1024 * 1024
+MAX_TEXT_CHARS = 2_000_000
+
+TEXT_EXTENSIONS = {".txt", ".csv", ".md", ".log", ".json", ".xml", ".html", ".htm"}
+
+# نتائج الاستخراج
+INDEXED = "indexed"
+UNSUPPORTED = "unsupported"
+FAILED = "failed"
+
+_XML_TAGS = re.compile(r"<[^>]+>")
+
+
+# --- الاستخراج (يعمل داخل عمليات المجمع) ---
+def _lower_priority():
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+def _read_plain(filepath):
+    with open(filepath, "rb") as f:
+        data = f.read()
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        # ملفات نصية عربية قديمة بترميز Windows
+        return data.decode("cp1256", errors="replace")
+
+
+def _read_docx(filepath):
+    with zipfile.ZipFile(filepath) as archive:
+        xml = archive.read("word/document.xml").decode("utf-8")
+    xml = xml.replace("</w:p>", "\n").replace("<w:tab/>", " ")
+    return html.unescape(_XML_TAGS.sub("", xml))
+
+
+def _read_pdf(filepath):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        return None
+    reader = PdfReader(filepath)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+_READERS = {".docx": _read_docx, ".pdf": _read_pdf, **{ext: _read_plain for ext in TEXT_EXTENSIONS}}
+
+
+def extract_text(filepath):
+    """استخراج النص الموحد من ملف (مضغوط أو لا). يعيد (النتيجة، النص أو رسالة الخطأ)."""
+    compressed = attachment_store.is_compressed(filepath)
+    name = filepath[:-len(attachment_store.COMPRESSED_SUFFIX)] if compressed else filepath
+    extension = os.path.splitext(name)[1].lower()
+    reader = _READERS.get(extension)
+    if reader is None:
+        return UNSUPPORTED, None
+    temp_path = None
+    try:
+        if os.path.getsize(filepath) > MAX_FILE_BYTES:
+            return UNSUPPORTED, None
+        if compressed:
+            # القارئات (zipfile، pypdf) تحتاج ملفاً قابلاً للتنقل، فيُفك إلى ملف مؤقت
+            handle, temp_path = tempfile.mkstemp(suffix=extension)
+            os.close(handle)
+            attachment_store.extract_to(filepath, temp_path)
+        text = reader(temp_path or filepath)
+    except Exception as e:
+        return FAILED, str(e)
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+    if text is None:
+        return UNSUPPORTED, None
+    return INDEXED, normalize_arabic(text[:MAX_TEXT_CHARS])
+
+
+# --- المفهرس ---
+class ContentIndexer:
+    """
+    مفهرس محتوى يعمل في خيط خلفي يوزع الاستخراج على مجمع عمليات.
+    workers=0 يستخرج داخل الخيط نفسه (للبرامج التي لا يمكنها إنشاء عمليات فرعية بأمان).
+    """
+
+    def __init__(self, workers=1, batch_size=BATCH_SIZE, pause=BATCH_PAUSE_SECONDS, idle_seconds=IDLE_SECONDS):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.pause = pause
+        self.idle_seconds = idle_seconds
+        self.progress = {INDEXED: 0, UNSUPPORTED: 0, FAILED: 0}
+        self.error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._db_path = backend.current_database()
+
+    # --- التحكم ---
+    def start(self):
+        """تشغيل المفهرس في الخلفية حتى stop()، مع الاستيقاظ عند إضافة كل مرفق."""
+        backend.on_attachment_added(lambda attachment_id: self.wake())
+        self._thread = threading.Thread(target=self._loop, name="dms-content-index", daemon=True)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_running()
+
+    def run(self):
+        """فهرسة كل المرفقات الجديدة ثم العودة (لسطر الأوامر). يعيد progress."""
+        try:
+            with backend.using_database(self._db_path):
+                while not self._stop.is_set() and self._index_batch():
+                    time.sleep(self.pause)
+        finally:
+            self._shutdown_pool()
+        return self.snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.progress)
+
+    # --- التنفيذ ---
+    def _loop(self):
+        try:
+            with backend.using_database(self._db_path):
+                while not self._stop.is_set():
+                    if self._index_batch():
+                        self._stop.wait(self.pause)
+                    else:
+                        self._wake.wait(self.idle_seconds)
+                        self._wake.clear()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._shutdown_pool()
+
+    def _extract(self, filepaths):
+        if self.workers <= 0:
+            return [extract_text(path) for path in filepaths]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_lower_priority)
+        return list(self._pool.map(extract_text, filepaths))
+
+    def _shutdown_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def _index_batch(self):
+        """فهرسة الدفعة التالية. يعيد عدد المرفقات المعالجة (0 عند عدم وجود جديد)."""
+        last_id = int(backend.get_maintenance_state(CURSOR_KEY, 0))
+        with backend.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, filepath FROM attachments WHERE id > ? ORDER BY id LIMIT ?", (last_id, self.batch_size))
+            rows = cursor.fetchall()
+        if not rows:
+            return 0
+
+        results = self._extract([filepath for _, filepath in rows])
+        with backend.get_connection() as conn:
+            cursor = conn.cursor()
+            for (attachment_id, _), (status, text) in zip(rows, results):
+                if status == INDEXED:
+                    cursor.execute("DELETE FROM attachment_content WHERE rowid = ?", (attachment_id,))
+                    # المرفق قد يُحذف أثناء الاستخراج: لا يُفهرس نص لمرفق غير موجود
+                    cursor.execute(
+                        "INSERT INTO attachment_content (rowid, text) SELECT ?, ? "
+                        "WHERE EXISTS (SELECT 1 FROM attachments WHERE id = ?)",
+                        (attachment_id, text, attachment_id)
+                    )
+            cursor.execute(
+                "INSERT INTO maintenance_state (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (CURSOR_KEY, str(rows[-1][0]))
+            )
+            conn.commit()
+        with self._lock:
+            for status, _ in results:
+                self.progress[status] += 1
+        return len(rows)
+
+
+def reset_index():
+    """حذف المحتوى المفهرس وإعادة المؤشر، لإعادة الاستخراج من البداية (مثلاً بعد تثبيت pypdf)."""
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM attachment_content")
+        cursor.execute("DELETE FROM maintenance_state WHERE key = ?", (CURSOR_KEY,))
+        conn.commit()
@@ -0,0 +1,70 @@
+"""
+ترميز التواريخ المخزنة في قاعدة البيانات.
+
+- التواريخ (date, expiry_date, hire_date, payment_date) تُخزن كرقم يوم صحيح:
+  عدد الأيام منذ 1970-01-01، فتصبح المقارنات والنطاقات مقارنات أعداد صحيحة.
+- الطوابع الزمنية (audit_log.timestamp, attachments.upload_date) تُخزن كثوانٍ منذ 1970-01-01 (UTC).
+
+تحويلات العرض محفوظة في ذاكرة مؤقتة، إذ تتكرر نفس التواريخ في آلاف الصفوف.
+"""
+import time
+from datetime import date, datetime
+from functools import lru_cache
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+
+# تعبير SQL يحول رقم اليوم إلى مفتاح الشهر YYYY-MM
+SQL_MONTH = "strftime('%Y-%m', {} * 86400, 'unixepoch')"
+
+
+def day_from_date(value):
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def date_from_day(day):
+    return date.fromordinal(day + EPOCH_ORDINAL)
+
+
+def today():
+    """رقم يوم اليوم الحالي (بالتوقيت المحلي)."""
+    return day_from_date(date.today())
+
+
+def month_range(year, month):
+    """(رقم أول يوم، رقم أول يوم في الشهر التالي) لشهر معين."""
+    start = day_from_date(date(year, month, 1))
+    end = day_from_date(date(year + month // 12, month % 12 + 1, 1))
+    return start, end
+
+
+def year_range(year):
+    """(رقم أول يوم في السنة، رقم أول يوم في السنة التالية)."""
+    return day_from_date(date(year, 1, 1)), day_from_date(date(year + 1, 1, 1))
+
+
+@lru_cache(maxsize=16384)
+def format_day(day):
+    """رقم اليوم -> DD-MM-YYYY، أو نص فارغ إذا لم يوجد تاريخ."""
+    if day is None or day == "":
+        return ""
+    d = date_from_day(int(day))
+    return f"{d.day:02d}-{d.month:02d}-{d.year:04d}"
+
+
+@lru_cache(maxsize=16384)
+def parse_display(text):
+    """DD-MM-YYYY -> رقم اليوم. يرفع ValueError إذا كان التنسيق غير صحيح."""
+    return day_from_date(datetime.strptime(text, "%d-%m-%Y").date())
+
+
+def now_timestamp():
+    return int(time.time())
+
+
+@lru_cache(maxsize=4096)
+def format_timestamp(seconds):
+    """ثوانٍ منذ 1970 -> YYYY-MM-DD HH:MM:SS بالتوقيت المحلي."""
+    if seconds is None or seconds == "":
+        return ""
+    return datetime.fromtimestamp(int(seconds)).strftime("%Y-%m-%d %H:%M:%S")
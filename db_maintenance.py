@@ -0,0 +1,320 @@
+"""
+صيانة ملف قاعدة البيانات: استعادة المساحة، إحصاءات المخطط، نقاط تفتيش WAL، وفحص السلامة.
+
+- create_database تفعّل auto_vacuum=INCREMENTAL (ترحيل لمرة واحدة). صفحات المحذوفات تبقى
+  بعدها في قائمة الصفحات الحرة حتى تُعاد إلى نظام الملفات بـ incremental_vacuum على
+  شرائح صغيرة (VACUUM_PAGES_PER_SLICE)، كل شريحة معاملة قصيرة لا تحجب المستخدمين.
+- run_idle_slice() تنفذ خطوة واحدة حسب السياسة، و MaintenanceScheduler يكررها في خيط
+  خلفي ما دام البرنامج خاملاً (حسب دالة is_idle يمررها المستدعي)، ويشغل فحص السلامة
+  عند حلول موعده.
+- IntegrityCheck: quick_check جدولاً جدولاً، فلا يُمسك قفل القراءة على الملف كله دفعة واحدة.
+- close_database(): PRAGMA optimize ونقطة تفتيش TRUNCATE عند إغلاق البرنامج.
+"""
+import os
+import sqlite3
+import threading
+
+import backend
+import datecodec
+
+VACUUM_PAGES_PER_SLICE = 256
+# لا تُستعاد المساحة لبضع صفحات حرة؛ SQLite يعيد استخدامها للإضافات القادمة
+MIN_FREE_PAGES = 64
+WAL_CHECKPOINT_BYTES = 16 * 1024 * 1024
+ANALYSIS_LIMIT = 400
+ANALYZE_INTERVAL_DAYS = 7
+INTEGRITY_INTERVAL_HOURS = 24
+IDLE_CHECK_SECONDS = 30
+SLICE_PAUSE_SECONDS = 0.2
+TABLE_PAUSE_SECONDS = 0.05
+
+LAST_ANALYZE_KEY = "db_maintenance.last_analyze"
+LAST_CHECK_KEY = "db_maintenance.last_check"
+LAST_CHECK_RESULT_KEY = "db_maintenance.last_check_result"
+
+_AUTO_VACUUM_MODES = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}
+
+
+# --- الإحصاءات ---
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _fragmentation(cursor):
+    """
+    نسبة الصفحات غير المتتالية في الملف: لكل جدول وفهرس تُرتب صفحاته بترتيب المرور على
+    الشجرة، وتُعد الصفحة مجزأة إذا لم تلِ سابقتها مباشرة. يقرأ كل الصفحات (للتشخيص فقط).
+    يعيد None إذا لم تكن SQLite مبنية مع dbstat.
+    """
+    try:
+        cursor.execute('''
+            SELECT COUNT(*), COALESCE(SUM(pageno != previous + 1), 0) FROM (
+                SELECT pageno, LAG(pageno) OVER (PARTITION BY name ORDER BY path) AS previous FROM dbstat
+            ) WHERE previous IS NOT NULL
+        ''')
+    except sqlite3.OperationalError:
+        return None
+    pages, scattered = cursor.fetchone()
+    return scattered / pages if pages else 0.0
+
+
+def database_stats(measure_fragmentation=False):
+    """
+    إحصاءات ملف القاعدة الحالية: الحجم وحجم WAL، الصفحات والصفحات الحرة، أوضاع auto_vacuum
+    والسجل، وآخر فحص سلامة. measure_fragmentation يضيف نسبة التجزئة (أبطأ).
+    """
+    db_path = backend.current_database()
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+
+        def pragma(name):
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+        stats = {
+            "page_size": pragma("page_size"),
+            "page_count": pragma("page_count"),
+            "freelist_count": pragma("freelist_count"),
+            "auto_vacuum": _AUTO_VACUUM_MODES.get(pragma("auto_vacuum"), "?"),
+            "journal_mode": pragma("journal_mode").upper(),
+        }
+        if measure_fragmentation:
+            stats["fragmentation"] = _fragmentation(cursor)
+    stats["path"] = db_path
+    stats["file_size"] = _file_size(db_path)
+    stats["wal_size"] = _file_size(db_path + "-wal")
+    stats["free_bytes"] = stats["freelist_count"] * stats["page_size"]
+    stats["free_ratio"] = stats["freelist_count"] / stats["page_count"] if stats["page_count"] else 0.0
+    stats["last_check"] = datecodec.format_timestamp(backend.get_maintenance_state(LAST_CHECK_KEY))
+    stats["last_check_result"] = backend.get_maintenance_state(LAST_CHECK_RESULT_KEY, "")
+    stats["last_analyze"] = datecodec.format_timestamp(backend.get_maintenance_state(LAST_ANALYZE_KEY))
+    return stats
+
+
+# --- خطوات الصيانة ---
+def reclaim_free_pages(pages=VACUUM_PAGES_PER_SLICE):
+    """إعادة حتى pages صفحة حرة إلى نظام الملفات. يعيد عدد الصفحات المستعادة."""
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != backend.AUTO_VACUUM_INCREMENTAL:
+            return 0
+        cursor.execute("PRAGMA freelist_count")
+        before = cursor.fetchone()[0]
+        # incremental_vacuum تحرر صفحة في كل خطوة تنفيذ، وexecute تنفذ خطوة واحدة فقط؛
+        # executescript تكمل الخطوات حتى النهاية
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        cursor.execute("PRAGMA freelist_count")
+        return before - cursor.fetchone()[0]
+
+
+def checkpoint(mode="PASSIVE"):
+    """نقطة تفتيش WAL (PASSIVE لا تنتظر القراء؛ TRUNCATE تفرغ الملف). يعيد None خارج وضع WAL."""
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"نوع نقطة تفتيش غير معروف: {mode}")
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode")
+        if cursor.fetchone()[0].lower() != "wal":
+            return None
+        cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+        busy, wal_pages, checkpointed = cursor.fetchone()
+    return {"busy": bool(busy), "wal_pages": wal_pages, "checkpointed": checkpointed}
+
+
+def analyze():
+    """تحديث إحصاءات المخطط (ANALYZE) بحد أقصى للصفوف المفحوصة في كل فهرس."""
+    with backend.get_connection() as conn:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        conn.execute("ANALYZE")
+        conn.commit()
+    backend.set_maintenance_state(LAST_ANALYZE_KEY, datecodec.now_timestamp())
+
+
+def _analyze_due():
+    last = backend.get_maintenance_state(LAST_ANALYZE_KEY)
+    return last is None or datecodec.now_timestamp() - int(last) >= ANALYZE_INTERVAL_DAYS * 86400
+
+
+def _integrity_due():
+    last = backend.get_maintenance_state(LAST_CHECK_KEY)
+    return last is None or datecodec.now_timestamp() - int(last) >= INTEGRITY_INTERVAL_HOURS * 3600
+
+
+def run_idle_slice():
+    """
+    خطوة صيانة قصيرة واحدة لأوقات الخمول، بالأولوية: نقطة تفتيش إذا تجاوز WAL حد
+    WAL_CHECKPOINT_BYTES، ثم شريحة من الصفحات الحرة، ثم ANALYZE إذا قدمت الإحصاءات.
+    يعيد وصف ما نُفذ، أو None إذا لم يبق عمل.
+    """
+    db_path = backend.current_database()
+    if _file_size(db_path + "-wal") > WAL_CHECKPOINT_BYTES:
+        # TRUNCATE تعيد الملف إلى الصفر؛ إذا منعها قارئ نشط تُعاد في فرصة الخمول التالية
+        result = checkpoint("TRUNCATE")
+        if result is not None and not result["busy"]:
+            return f"نقطة تفتيش WAL: {result['checkpointed']} صفحة"
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA freelist_count")
+        free_pages = cursor.fetchone()[0]
+    if free_pages >= MIN_FREE_PAGES:
+        reclaimed = reclaim_free_pages()
+        if reclaimed:
+            return f"استعادة {reclaimed} صفحة حرة"
+    if _analyze_due():
+        analyze()
+        return "تحديث إحصاءات المخطط"
+    return None
+
+
+def close_database():
+    """صيانة الإغلاق: PRAGMA optimize (لكل الجداول حيث تدعمه SQLite) ثم تفريغ WAL."""
+    with backend.get_connection() as conn:
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        # 0x10000: فحص كل الجداول لا ما استعلم عنه هذا الاتصال فقط (SQLite 3.46+؛ يُتجاهل فيما قبله)
+        conn.execute("PRAGMA optimize = 0x10002")
+        conn.commit()
+    checkpoint("TRUNCATE")
+
+
+# --- فحص السلامة ---
+def _check_targets(cursor):
+    """الجداول العادية (مع فهارسها) بترتيب الاسم؛ الجداول الافتراضية تُفحص عبر جداول ظلها."""
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL TABLE%' ORDER BY name"
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+class IntegrityCheck:
+    """
+    quick_check لكل جدول على حدة في خيط خلفي. النتيجة ("ok" أو أول المشكلات) ووقت
+    الانتهاء تُحفظ في maintenance_state لتعرضها نافذة التشخيص.
+    """
+
+    def __init__(self, pause=TABLE_PAUSE_SECONDS):
+        self.pause = pause
+        self.problems = []
+        self.progress = {"tables": 0, "total": 0}
+        self.error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._db_path = backend.current_database()
+
+    # --- التحكم ---
+    def start(self):
+        self._thread = threading.Thread(target=self._guard, name="dms-db-integrity", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_running()
+
+    def run(self):
+        """تشغيل الفحص في الخيط الحالي. يعيد قائمة المشكلات."""
+        with backend.using_database(self._db_path):
+            self._check()
+        return self.problems
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.progress), list(self.problems)
+
+    # --- التنفيذ ---
+    def _guard(self):
+        try:
+            self.run()
+        except Exception as e:
+            self.error = e
+
+    def _check(self):
+        with backend.get_connection() as conn:
+            tables = _check_targets(conn.cursor())
+        with self._lock:
+            self.progress["total"] = len(tables)
+        for table in tables:
+            if self._stop.is_set():
+                return
+            with backend.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'PRAGMA quick_check("{table}")')
+                messages = [row[0] for row in cursor.fetchall() if row[0] != "ok"]
+            with self._lock:
+                self.problems.extend(f"{table}: {message}" for message in messages)
+                self.progress["tables"] += 1
+            self._stop.wait(self.pause)
+        result = "ok" if not self.problems else "; ".join(self.problems[:5])
+        backend.set_maintenance_state(LAST_CHECK_KEY, datecodec.now_timestamp())
+        backend.set_maintenance_state(LAST_CHECK_RESULT_KEY, result)
+        if self.problems:
+            backend.log_audit_event("فحص سلامة قاعدة البيانات", f"وُجدت {len(self.problems)} مشكلة: {result}")
+
+
+# --- الجدولة ---
+class MaintenanceScheduler:
+    """
+    خيط خلفي يتحقق كل idle_seconds من خمول البرنامج (is_idle)، وعندها ينفذ شرائح
+    run_idle_slice متتالية حتى ينتهي العمل أو يعود المستخدم، ثم فحص السلامة إذا حل موعده.
+    """
+
+    def __init__(self, is_idle, idle_seconds=IDLE_CHECK_SECONDS, pause=SLICE_PAUSE_SECONDS, on_error=None):
+        self.is_idle = is_idle
+        self.idle_seconds = idle_seconds
+        self.pause = pause
+        self.on_error = on_error
+        self.last_action = None
+        self._check = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._db_path = backend.current_database()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="dms-db-maintenance", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._check is not None:
+            self._check.stop()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_running()
+
+    def _loop(self):
+        with backend.using_database(self._db_path):
+            while not self._stop.wait(self.idle_seconds):
+                try:
+                    self._run_while_idle()
+                except Exception as e:
+                    if self.on_error:
+                        self.on_error(e)
+
+    def _run_while_idle(self):
+        while not self._stop.is_set() and self.is_idle():
+            action = run_idle_slice()
+            if action is None:
+                break
+            self.last_action = action
+            self._stop.wait(self.pause)
+        if not self._stop.is_set() and self.is_idle() and _integrity_due():
+            self._check = IntegrityCheck()
+            self._check.run()
+            self.last_action = "فحص السلامة"
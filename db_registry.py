@@ -0,0 +1,120 @@
+"""
+سجل قواعد البيانات: يحدد موقع قاعدة البيانات الافتراضية وقواعد الشركات التابعة.
+
+المصادر بالترتيب (الأحدث يتغلب):
+1. ملف الإعداد databases.json بجانب البرنامج (أو المسار في DMS_CONFIG):
+       {
+           "default": "main",
+           "attachments_dir": "attachments",
+           "backups_dir": "/mnt/backup/dms",
+           "compress_attachments": true,
+           "databases": {"main": "document_management.db", "sub_a": "/data/sub_a.db"}
+       }
+   المسارات النسبية تُحل نسبة إلى مجلد ملف الإعداد.
+2. المتغير DMS_DATABASES بالشكل "main=/data/a.db;sub_a=/data/b.db".
+3. المتغير DMS_DB لاختيار القاعدة الافتراضية (اسم من السجل أو مسار ملف).
+4. المتغير DMS_ATTACHMENTS_DIR لمجلد المرفقات، وDMS_BACKUPS_DIR لمجلد النسخ الاحتياطية، وDMS_PAYSLIPS_DIR لمجلد قسائم الرواتب.
+5. المتغير DMS_COMPRESS_ATTACHMENTS (1 أو 0) لتفعيل ضغط المرفقات عند التخزين.
+"""
+import os
+import json
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_FILENAME = 'document_management.db'
+DEFAULT_NAME = 'main'
+
+
+def _config_path():
+    return os.environ.get("DMS_CONFIG", os.path.join(script_dir, 'databases.json'))
+
+
+def _load_config():
+    path = _config_path()
+    if not os.path.exists(path):
+        return {}, script_dir
+    with open(path, encoding="utf-8") as f:
+        return json.load(f), os.path.dirname(os.path.abspath(path))
+
+
+def _resolve(path, base_dir):
+    return os.path.abspath(os.path.join(base_dir, os.path.expanduser(path)))
+
+
+def get_registry():
+    """يعيد قاموساً مرتباً {اسم القاعدة: المسار المطلق}."""
+    config, base_dir = _load_config()
+    registry = {name: _resolve(path, base_dir) for name, path in config.get("databases", {}).items()}
+    for entry in filter(None, os.environ.get("DMS_DATABASES", "").split(";")):
+        name, _, path = entry.partition("=")
+        if name.strip() and path.strip():
+            registry[name.strip()] = _resolve(path.strip(), os.getcwd())
+    if not registry:
+        registry[DEFAULT_NAME] = os.path.join(script_dir, DEFAULT_DB_FILENAME)
+    return registry
+
+
+def resolve_database(name_or_path):
+    """تحويل اسم من السجل أو مسار ملف إلى مسار مطلق."""
+    registry = get_registry()
+    if name_or_path in registry:
+        return registry[name_or_path]
+    if os.sep in name_or_path or name_or_path.endswith(".db") or os.path.exists(name_or_path):
+        return os.path.abspath(name_or_path)
+    raise ValueError(f"قاعدة البيانات غير معروفة: {name_or_path}. القواعد المتاحة: {', '.join(registry)}")
+
+
+def default_database_path():
+    """مسار قاعدة البيانات الافتراضية."""
+    selected = os.environ.get("DMS_DB")
+    if selected:
+        return resolve_database(selected)
+    config, _ = _load_config()
+    registry = get_registry()
+    default_name = config.get("default")
+    if default_name in registry:
+        return registry[default_name]
+    return next(iter(registry.values()))
+
+
+def attachments_dir():
+    """مجلد المرفقات من DMS_ATTACHMENTS_DIR أو ملف الإعداد، وإلا مجلد attachments بجانب البرنامج."""
+    if os.environ.get("DMS_ATTACHMENTS_DIR"):
+        return os.path.abspath(os.environ["DMS_ATTACHMENTS_DIR"])
+    config, base_dir = _load_config()
+    if config.get("attachments_dir"):
+        return _resolve(config["attachments_dir"], base_dir)
+    return os.path.join(script_dir, 'attachments')
+
+
+def backups_dir():
+    """مجلد النسخ الاحتياطية من DMS_BACKUPS_DIR أو ملف الإعداد، وإلا مجلد backups بجانب البرنامج."""
+    if os.environ.get("DMS_BACKUPS_DIR"):
+        return os.path.abspath(os.environ["DMS_BACKUPS_DIR"])
+    config, base_dir = _load_config()
+    if config.get("backups_dir"):
+        return _resolve(config["backups_dir"], base_dir)
+    return os.path.join(script_dir, 'backups')
+
+
+def payslips_dir():
+    """مجلد قسائم الرواتب من DMS_PAYSLIPS_DIR أو ملف الإعداد، وإلا مجلد payslips بجانب البرنامج."""
+    if os.environ.get("DMS_PAYSLIPS_DIR"):
+        return os.path.abspath(os.environ["DMS_PAYSLIPS_DIR"])
+    config, base_dir = _load_config()
+    if config.get("payslips_dir"):
+        return _resolve(config["payslips_dir"], base_dir)
+    return os.path.join(script_dir, 'payslips')
+
+
+def archives_dir(db_path):
+    """مجلد قواعد أرشيف السنوات لقاعدة معينة: <اسم القاعدة>_archives بجانب ملفها."""
+    stem = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), f"{stem}_archives")
+
+
+def compress_attachments():
+    """هل تُضغط المرفقات الجديدة عند تخزينها (DMS_COMPRESS_ATTACHMENTS أو ملف الإعداد، الافتراضي لا)."""
+    if os.environ.get("DMS_COMPRESS_ATTACHMENTS"):
+        return os.environ["DMS_COMPRESS_ATTACHMENTS"].strip().lower() in ("1", "true", "yes")
+    config, _ = _load_config()
+    return bool(config.get("compress_attachments", False))
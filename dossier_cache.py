@@ -0,0 +1,60 @@
+"""
+ذاكرة LRU صغيرة لملفات الموظفين (backend.fetch_employee_dossier) في الواجهة.
+
+عند عرض ملف موظف سبق فتحه لا يُعاد الاستعلام، والأقدم استخداماً يُسقط عند امتلاء الذاكرة.
+مع كل ملف تُحفظ معرفات مستنداته ومرفقاته ورواتبه، فتُسقط apply_changes ملفات الموظفين المتأثرين فقط
+بتغييرات سجل التغييرات: الموظفون المرتبطون بالصفوف الحالية، ومن كانت الصفوف المحذوفة أو المنقولة ضمن ملفه.
+"""
+from collections import OrderedDict
+
+DEFAULT_SIZE = 32
+
+# الجدول في سجل التغييرات -> مفتاح قائمة المعرفات في الملف المحفوظ
+_ROW_KEYS = {"documents": "documents", "salaries": "salaries", "attachments": "attachment_ids"}
+
+
+class DossierCache:
+    """{معرف الموظف: (الملف، {الجدول: مجموعة المعرفات})} بترتيب آخر استخدام."""
+
+    def __init__(self, maxsize=DEFAULT_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, employee_id):
+        entry = self._entries.get(employee_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(employee_id)
+        return entry[0]
+
+    def put(self, employee_id, dossier):
+        row_ids = {
+            table: {item[0] if isinstance(item, (list, tuple)) else item for item in dossier[key]}
+            for table, key in _ROW_KEYS.items()
+        }
+        self._entries[employee_id] = (dossier, row_ids)
+        self._entries.move_to_end(employee_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, employee_id):
+        self._entries.pop(employee_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def apply_changes(self, tables):
+        """إسقاط ملفات الموظفين المتأثرين بتغييرات fetch_changes_since()["tables"]. يعيد مجموعة معرفاتهم."""
+        affected = set()
+        for table, change in tables.items():
+            changed_ids = {row[0] for row in change["rows"]} | set(change["deleted"])
+            if table == "employees":
+                affected |= changed_ids
+                continue
+            affected |= set(change.get("employees", []))
+            for employee_id, (_, row_ids) in self._entries.items():
+                if changed_ids & row_ids.get(table, set()):
+                    affected.add(employee_id)
+        for employee_id in affected:
+            self.invalidate(employee_id)
+        return affected
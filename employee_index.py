@@ -0,0 +1,73 @@
+"""
+فهرس بادئات في الذاكرة لاختيار الموظف بالكتابة (type-ahead).
+
+المفاتيح موحدة (normalize_arabic) ومرتبة في قائمتين:
+- بدايات الأسماء: الاسم كاملاً، فتُعرض أولاً الأسماء التي تبدأ بالنص المكتوب.
+- بدايات الكلمات: كل جزء من الاسم يبدأ عند كلمة (فيطابق "الحربي" الاسم "محمد الحربي")، والرقم الوظيفي.
+البحث bisect على أول مفتاح >= النص ثم مرور متتابع حتى تنتهي المطابقة أو يكتمل العدد المطلوب،
+فلا يُمسح كل الموظفين مع كل حرف. يُعاد البناء فقط بعد invalidate (عند تغير الموظفين).
+"""
+import bisect
+
+from arabic_text import normalize_arabic
+
+DEFAULT_LIMIT = 20
+
+
+class EmployeeIndex:
+    """loader يعيد صفوف الموظفين بالشكل (id, name, employee_number, department, ...)."""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._names = ([], [])   # (المفاتيح، المعرفات) مرتبة حسب المفتاح
+        self._words = ([], [])
+        self._employees = {}
+        self._stale = True
+
+    def invalidate(self):
+        """تعليم الفهرس كقديم؛ يُعاد بناؤه عند أول بحث."""
+        self._stale = True
+
+    def _build(self):
+        names = []
+        words = []
+        employees = {}
+        for row in self._loader():
+            emp_id, name, number, department = row[:4]
+            employees[emp_id] = (emp_id, name, number, department)
+            parts = (normalize_arabic(name) or "").split(" ")
+            names.append((" ".join(parts), emp_id))
+            words += [(" ".join(parts[i:]), emp_id) for i in range(1, len(parts))]
+            if number:
+                words.append((normalize_arabic(number), emp_id))
+        names.sort()
+        words.sort()
+        self._names = ([key for key, _ in names], [emp_id for _, emp_id in names])
+        self._words = ([key for key, _ in words], [emp_id for _, emp_id in words])
+        self._employees = employees
+        self._stale = False
+
+    def get(self, emp_id):
+        """(id, name, employee_number, department) لموظف، أو None."""
+        if self._stale:
+            self._build()
+        return self._employees.get(emp_id)
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        """أفضل limit موظف يطابقون النص كبادئة: بدايات الأسماء أولاً ثم بدايات الكلمات والأرقام الوظيفية."""
+        if self._stale:
+            self._build()
+        prefix = normalize_arabic(text) or ""
+        found = []
+        seen = set()
+        for keys, ids in (self._names, self._words):
+            position = bisect.bisect_left(keys, prefix)
+            while position < len(keys) and len(found) < limit and keys[position].startswith(prefix):
+                emp_id = ids[position]
+                if emp_id not in seen:
+                    seen.add(emp_id)
+                    found.append(self._employees[emp_id])
+                position += 1
+            if len(found) >= limit or not prefix:
+                break
+        return found
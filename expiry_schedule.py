@@ -0,0 +1,77 @@
+"""
+جدولة انتقالات حالة الصلاحية (صالحة -> قرب الانتهاء -> منتهية) للصفوف المعروضة.
+
+لكل صف يُسجل تاريخ انتقاله القادم فقط في كومة صغرى (min-heap)، فتعرف الواجهة متى
+تستيقظ (بداية يوم أقرب انتقال) وأي الصفوف تعيد تلوينها دون إعادة تحميل الجدول.
+الحدود مطابقة لـ get_row_color: "قرب الانتهاء" من (الانتهاء - NEAR_DAYS)، و"منتهية" من اليوم التالي للانتهاء.
+"""
+import heapq
+from datetime import datetime, time
+
+import datecodec
+
+NEAR_DAYS = 90
+
+
+def next_transition(expiry_day, today, near_days=NEAR_DAYS):
+    """رقم يوم الانتقال القادم لحالة مستند، أو None إذا كان منتهياً أو بلا تاريخ انتهاء."""
+    if expiry_day is None or expiry_day == "":
+        return None
+    if today < expiry_day - near_days:
+        return expiry_day - near_days
+    if today <= expiry_day:
+        return expiry_day + 1
+    return None
+
+
+def milliseconds_until(day):
+    """المدة حتى بداية يوم معين بالتوقيت المحلي (0 إذا حل)."""
+    start = datetime.combine(datecodec.date_from_day(day), time())
+    return max(0, int((start - datetime.now()).total_seconds() * 1000))
+
+
+class ExpirySchedule:
+    """كومة (يوم الانتقال، المعرف، تاريخ الانتهاء) مع حذف كسول للمدخلات القديمة."""
+
+    def __init__(self, near_days=NEAR_DAYS):
+        self.near_days = near_days
+        self._heap = []
+        self._expiry = {}
+
+    def clear(self):
+        self._heap.clear()
+        self._expiry.clear()
+
+    def track(self, item_id, expiry_day, today):
+        """تسجيل (أو تحديث) صف. المدخل السابق لنفس الصف يُهمل عند إخراجه."""
+        if expiry_day is None or expiry_day == "":
+            self._expiry.pop(item_id, None)
+            return
+        if self._expiry.get(item_id) == expiry_day:
+            return
+        self._expiry[item_id] = expiry_day
+        day = next_transition(expiry_day, today, self.near_days)
+        if day is not None:
+            heapq.heappush(self._heap, (day, item_id, expiry_day))
+
+    def forget(self, item_id):
+        self._expiry.pop(item_id, None)
+
+    def next_day(self):
+        """يوم أقرب انتقال مسجل، أو None."""
+        while self._heap and self._expiry.get(self._heap[0][1]) != self._heap[0][2]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, today):
+        """إخراج الصفوف التي حل انتقالها حتى اليوم. يعيد [(المعرف، تاريخ الانتهاء)] ويعيد جدولة انتقالها التالي."""
+        due = []
+        while self._heap and self._heap[0][0] <= today:
+            _, item_id, expiry_day = heapq.heappop(self._heap)
+            if self._expiry.get(item_id) != expiry_day:
+                continue
+            due.append((item_id, expiry_day))
+            day = next_transition(expiry_day, today, self.near_days)
+            if day is not None:
+                heapq.heappush(self._heap, (day, item_id, expiry_day))
+        return due
@@ -0,0 +1,95 @@
+"""
+تشغيل نفس الاستعلام القرائي على عدة قواعد بيانات بالتوازي ودمج النتائج.
+
+كل قاعدة تُقرأ في خيط مستقل عبر backend.using_database، ويُضاف اسم القاعدة
+كأول عمود في الصفوف المدمجة. القواعد التي تفشل لا توقف البقية، بل تُعاد
+أخطاؤها في قاموس errors.
+
+التقارير قرائية فقط: لا تُرحّل القواعد هنا، بل يُرفض الاستعلام على قاعدة مخططها أقدم من
+backend.SCHEMA_VERSION حتى تُرحّل مرة واحدة بـ "cli.py maintenance migrate".
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import backend
+import datecodec
+import db_registry
+
+
+def _selected_databases(databases=None):
+    registry = db_registry.get_registry()
+    if not databases:
+        return registry
+    return {name: db_registry.resolve_database(name) for name in databases}
+
+
+def fan_out(func, *args, databases=None, max_workers=8, **kwargs):
+    """
+    تنفيذ func(*args, **kwargs) على كل قاعدة في databases (أسماء من السجل، الافتراضي: كل السجل).
+    يعيد (results, errors) حيث results = {اسم القاعدة: النتيجة} وerrors = {اسم القاعدة: رسالة الخطأ}.
+    """
+    targets = _selected_databases(databases)
+
+    def run(name, db_path):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"ملف قاعدة البيانات غير موجود: {db_path}")
+        version = backend.schema_version(db_path)
+        if version < backend.SCHEMA_VERSION:
+            raise ValueError(f"مخطط القاعدة أقدم من البرنامج (الإصدار {version} < {backend.SCHEMA_VERSION})؛ "
+                             f"شغّل الترحيل أولاً: python cli.py --db {name} maintenance migrate")
+        with backend.using_database(db_path):
+            return func(*args, **kwargs)
+
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+        futures = {name: executor.submit(run, name, path) for name, path in targets.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors[name] = str(e)
+    return results, errors
+
+
+def _format_document_row(row):
+    return tuple(row[:3]) + (datecodec.format_day(row[3]), datecodec.format_day(row[4])) + tuple(row[5:])
+
+
+def _merge_rows(results):
+    return [(name,) + tuple(row) for name, rows in results.items() for row in rows]
+
+
+def fanout_search_documents(keyword="", category=None, databases=None, tag=None, search=None):
+    """
+    البحث في المستندات عبر عدة قواعد. كل صف يبدأ باسم القاعدة.
+    search: دالة البحث في backend (الافتراضي fetch_documents، أو البحث التقريبي أو بحث المحتوى).
+    """
+    results, errors = fan_out(search or backend.fetch_documents, keyword, category, tag, databases=databases)
+    rows = {name: [_format_document_row(row) for row in found] for name, found in results.items()}
+    return _merge_rows(rows), errors
+
+
+def fanout_expiry_counts(days=90, databases=None):
+    """
+    عدد المستندات المنتهية والقريبة من الانتهاء لكل قاعدة مع الإجمالي.
+    يعيد ([(اسم القاعدة، منتهية، قريبة)، ...، ("الإجمالي"، ...)], errors).
+    """
+    results, errors = fan_out(backend.count_expiring_documents, days, databases=databases)
+    rows = [(name, expired, near) for name, (expired, near) in results.items()]
+    rows.append(("الإجمالي", sum(r[1] for r in rows), sum(r[2] for r in rows)))
+    return rows, errors
+
+
+def fanout_salaries_for_export(databases=None):
+    """بيانات تصدير الرواتب من عدة قواعد مدمجة ومرتبة تنازلياً حسب تاريخ الدفع."""
+    results, errors = fan_out(backend.fetch_all_salaries_for_export, databases=databases)
+    rows = _merge_rows(results)
+
+    def payment_date_key(row):
+        try:
+            return datecodec.parse_display(row[-1])
+        except (TypeError, ValueError):
+            return float("-inf")
+    rows.sort(key=payment_date_key, reverse=True)
+    return rows, errors
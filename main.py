@@ -1,23 +1,39 @@
+import os
+import sys
+
+# وضع العميل: عند تحديد عنوان خادم (--server أو DMS_SERVER_URL) تُوجه دوال backend إلى server.py
+SERVER_URL = os.environ.get("DMS_SERVER_URL")
+if "--server" in sys.argv[1:-1]:
+    SERVER_URL = sys.argv[sys.argv.index("--server") + 1]
+if SERVER_URL:
+    import remote_client
+    remote_client.activate(SERVER_URL)
+elif "--db" in sys.argv[1:-1]:
+    # اسم قاعدة من سجل القواعد (databases.json / DMS_DATABASES) أو مسار ملف
+    os.environ["DMS_DB"] = sys.argv[sys.argv.index("--db") + 1]
+
 from backend import (
     create_database,
     add_document,
     update_document,
-    delete_document,
+    delete_documents,
     add_employee,
     update_employee,
     delete_employee,
-    fetch_employee_id_name,
     fetch_all_employees,
+    fetch_employee_dossier,
     fetch_audit_log,
     convert_date_from_db_format,
     convert_date_to_db_format,
     add_attachment,
+    readable_attachment_path,
     get_attachments_for_document,
-    delete_attachment,
-    get_all_categories,
+    get_attachments_for_documents,
+    delete_attachments,
+    get_document_facets,
     calculate_remaining_time,
     fetch_all_documents_for_export,
-    log_audit_event,
+    log_data_export,
     calculate_net_salary,
     add_salary,
     update_salary,
@@ -26,15 +42,39 @@ from backend import (
     get_all_departments,
     fetch_all_salaries_for_export,
     get_last_employee_salary, # New import
-    salary_exists_for_month   # New import
+    salary_exists_for_month,   # New import
+    fetch_documents,
+    get_last_change_id,
+    fetch_changes_since,
+    fuzzy_search_documents,
+    search_document_content,
+    fetch_documents_with_expiry,
+    count_expiring_documents,
+    get_dashboard_stats,
+    fetch_expiry_calendar,
+    prepare_monthly_salaries,
+    current_database,
+    fetch_payroll_summary,
+    get_payroll_summary_years,
+    preview_salary_adjustment,
+    apply_salary_adjustment,
+    archivable_years,
+    archive_closed_years
 )
+from query_metrics import get_metrics_snapshot, dump_metrics, reset_metrics
+import datecodec
+from expiry_schedule import ExpirySchedule, NEAR_DAYS, milliseconds_until
+from employee_index import EmployeeIndex
+from dossier_cache import DossierCache
+from attachment_cache import AttachmentCache
+from search_cache import DocumentSearchCache, CONTENT_SOURCE
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from tkcalendar import DateEntry
-import sqlite3
-from datetime import datetime, timedelta
-import os
+from datetime import datetime
+import queue
+import threading
 import subprocess
 import pandas as pd
 
@@ -42,7 +82,7 @@ import pandas as pd
 create_database()
 
 root = tk.Tk()
-root.title("نظام إدارة المستندات")
+root.title("نظام إدارة المستندات — " + (SERVER_URL or current_database()))
 root.geometry("1400x850")
 
 # تطبيق ثيم
@@ -113,12 +153,13 @@ def treeview_sort_column(tv, col, reverse):
     l = [(tv.set(k, col), k) for k in tv.get_children('')]
 
     try:
-        if col in ["id", "الرقم", "الرقم الوظيفي", "الراتب الأساسي (شهري)", "الراتب الأساسي (سنوي)", "البدلات", "الخصومات", "صافي الراتب"]:
+        if col in ["id", "الرقم", "الرقم الوظيفي", "الراتب الأساسي (شهري)", "الراتب الأساسي (سنوي)", "البدلات", "الخصومات", "صافي الراتب",
+                   "إجمالي الأساسي", "إجمالي البدلات", "إجمالي الخصومات", "إجمالي الصافي", "عدد السجلات"]:
             # تحويل إلى عدد حقيقي، مع التعامل مع القيم غير الرقمية بوضعها في النهاية
             l.sort(key=lambda t: float(t[0]) if str(t[0]).replace('.', '', 1).isdigit() else float('inf'), reverse=reverse)
         elif col in ["تاريخ الإصدار", "تاريخ الانتهاء", "تاريخ التعيين", "الوقت", "تاريخ الدفع"]:
             # تحويل إلى كائن تاريخ، مع التعامل مع القيم الفارغة بوضعها في البداية/النهاية
-            l.sort(key=lambda t: datetime.strptime(t[0], "%d-%m-%Y") if t[0] and t[0] != "N/A" else (datetime.min if not reverse else datetime.max), reverse=reverse)
+            l.sort(key=lambda t: datecodec.parse_display(t[0]) if t[0] and t[0] != "N/A" else (float('-inf') if not reverse else float('inf')), reverse=reverse)
         else:
             l.sort(key=lambda t: t[0], reverse=reverse)
     except Exception as e:
@@ -149,22 +190,34 @@ root.bind_all("<Control-v>", paste_event_handler)
 root.bind_all("<Command-v>", paste_event_handler) # لدعم macOS
 
 # --- دوال مساعدة للمستندات ---
-def get_row_color(expiry_date_str):
-    """تحديد لون الصف بناءً على تاريخ الانتهاء."""
-    try:
-        if not expiry_date_str:
-            return "valid"
-        expiry = datetime.strptime(expiry_date_str, "%Y-%m-%d").date()
-        today = datetime.today().date()
-        if expiry < today:
-            return "expired"
-        elif expiry <= today + timedelta(days=90):
-            return "near"
-        else:
-            return "valid"
-    except:
+def get_row_color(expiry_day, today=None):
+    """تحديد لون الصف بناءً على رقم يوم الانتهاء."""
+    if expiry_day is None or expiry_day == "":
+        return "valid"
+    today = datecodec.today() if today is None else today
+    if expiry_day < today:
+        return "expired"
+    elif expiry_day <= today + NEAR_DAYS:
+        return "near"
+    else:
         return "valid"
 
+# --- تحويل صفوف backend إلى قيم الجداول (مشتركة بين التحميل الكامل وتطبيق التغييرات) ---
+def document_values(row):
+    return tuple(row[:3]) + (datecodec.format_day(row[3]), datecodec.format_day(row[4])) + tuple(row[5:])
+
+def attachment_values(att):
+    return (att[0], att[1], att[2], datecodec.format_timestamp(att[3]))
+
+def employee_values(emp):
+    return (emp[0], emp[1], emp[2], emp[3], emp[4], convert_date_from_db_format(emp[5]))
+
+def salary_values(sal):
+    # البيانات من fetch_all_salaries: id, employee_name, department, basic_salary (monthly), allowances, deductions, net_salary, payment_method, payment_date, employee_id
+    monthly_basic = sal[3]
+    return (sal[0], sal[1], sal[2], monthly_basic, monthly_basic * 12, sal[4], sal[5], sal[6], sal[7],
+            convert_date_from_db_format(sal[8]), sal[9])
+
 def clear_fields():
     """مسح جميع حقول إدخال المستندات."""
     for entry in entries:
@@ -212,12 +265,12 @@ def populate_form_from_selection():
     entry_name.insert(0, values[1])
     entry_number.insert(0, values[2])
     
-    date_ddmmyyyy = convert_date_from_db_format(values[3])
-    entry_date.set_date(datetime.strptime(date_ddmmyyyy, "%d-%m-%Y").date())
+    # التواريخ في الجدول معروضة بتنسيق DD-MM-YYYY
+    entry_date.set_date(datecodec.date_from_day(datecodec.parse_display(values[3])))
     
-    expiry_ddmmyyyy = convert_date_from_db_format(values[4])
+    expiry_ddmmyyyy = values[4]
     if expiry_ddmmyyyy:
-        entry_expiry.set_date(datetime.strptime(expiry_ddmmyyyy, "%d-%m-%Y").date())
+        entry_expiry.set_date(datecodec.date_from_day(datecodec.parse_display(expiry_ddmmyyyy)))
     else:
         entry_expiry.set_date("")
 
@@ -225,7 +278,7 @@ def populate_form_from_selection():
     entry_category.insert(0, values[6] if values[6] else "")
     entry_tags.insert(0, values[7] if values[7] else "")
 
-    load_attachments(values[0])
+    show_document_attachments(values[0])
     set_status(f"تم تحديد المستند: {values[1]}.")
 
 def update_selected_document():
@@ -265,64 +318,93 @@ def update_selected_document():
         set_status(f"خطأ: {e}")
 
 def delete_selected_document():
-    """حذف المستند المحدد من قاعدة البيانات."""
+    """حذف المستندات المحددة (واحد أو أكثر) من قاعدة البيانات."""
     selected = doc_table.selection()
     if not selected:
         messagebox.showwarning("تحذير", "يرجى تحديد مستند للحذف.")
         return
-    
-    dialog = CustomConfirmDialog(root, "تأكيد الحذف", "هل أنت متأكد أنك تريد حذف هذا المستند وكل مرفقاته؟")
+
+    if len(selected) == 1:
+        message = "هل أنت متأكد أنك تريد حذف هذا المستند وكل مرفقاته؟"
+    else:
+        message = f"هل أنت متأكد أنك تريد حذف {len(selected)} مستندات وكل مرفقاتها؟"
+    dialog = CustomConfirmDialog(root, "تأكيد الحذف", message)
     if dialog.result:
-        doc_id = doc_table.item(selected[0])['values'][0]
-        set_status(f"جاري حذف المستند ID: {doc_id}...")
+        doc_ids = [doc_table.item(item)['values'][0] for item in selected]
+        set_status(f"جاري حذف {len(doc_ids)} مستند/ات...")
         try:
-            delete_document(doc_id)
+            deleted_count = delete_documents(doc_ids)
             load_documents()
             update_category_filter_options()
-            messagebox.showinfo("نجاح", "تم حذف المستند بنجاح.")
+            messagebox.showinfo("نجاح", f"تم حذف {deleted_count} مستند/ات بنجاح.")
             clear_fields()
-            set_status("تم حذف المستند بنجاح.")
+            set_status(f"تم حذف {deleted_count} مستند/ات بنجاح.")
         except Exception as e:
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حذف المستند: {e}")
             set_status(f"خطأ في الحذف: {e}")
 
+# نتائج البحث محفوظة حسب الكلمة والعلامة والمصدر؛ الفئة والحالة تُصفّيان في الذاكرة (انظر search_cache)
+document_search_cache = DocumentSearchCache()
+
+def _query_documents(keyword, tag, source):
+    """تنفيذ البحث في القاعدة لكل الفئات. يعيد (الصفوف، تقريبية)."""
+    if source == CONTENT_SOURCE:
+        return search_document_content(keyword, None, tag), False
+    rows = fetch_documents(keyword, None, tag, include_archives=source == "archives")
+    if not rows and len(keyword.strip()) >= 3:
+        # لا تطابق مباشر: عرض أقرب النتائج بدل قائمة فارغة (أخطاء إملائية مثلاً)
+        rows = fuzzy_search_documents(keyword, None, tag)
+        return rows, bool(rows)
+    return rows, False
+
 def search_documents():
     """البحث عن المستندات وتصفيتها وعرضها في الجدول."""
     keyword = search_var.get()
     filter_status = filter_var.get()
-    selected_category = category_filter_var.get()
+    selected_category = _selected_facet(category_filter_var, "category")
+    selected_tag = _selected_facet(tag_filter_var, "tag")
 
     doc_table.delete(*doc_table.get_children())
     attachments_table.delete(*attachments_table.get_children())
     set_status("جاري البحث عن المستندات...")
 
     try:
-        with sqlite3.connect("document_management.db") as conn:
-            cursor = conn.cursor()
-            
-            query = """
-                SELECT id, name, number, date, expiry_date, issuer, category, tags
-                FROM documents
-                WHERE (name LIKE ? OR number LIKE ? OR issuer LIKE ? OR category LIKE ? OR tags LIKE ?)
-            """
-            params = (f"%{keyword}%", f"%{keyword}%", f"%{keyword}%", f"%{keyword}%", f"%{keyword}%")
-
-            if selected_category != "الكل":
-                query += " AND category = ?"
-                params += (selected_category,)
-
-            cursor.execute(query, params)
-
-            results_count = 0
-            for row in cursor.fetchall():
-                color = get_row_color(row[4])
-                if filter_status == "الكل" or \
-                   (filter_status == "صالحة" and color == "valid") or \
-                   (filter_status == "قرب الانتهاء" and color == "near") or \
-                   (filter_status == "منتهية" and color == "expired"):
-                    doc_table.insert("", "end", values=row, tags=(color,))
-                    results_count += 1
-
+        results_count = 0
+        today = datecodec.today()
+        expiry_schedule.clear()
+        if content_search_var.get() and keyword.strip():
+            source = CONTENT_SOURCE
+        else:
+            source = "archives" if include_archives_var.get() else "fields"
+        scope = (selected_tag, source)
+        # رقم آخر تغيير كجيل للذاكرة: أي كتابة منذ الحفظ تُسقط النتائج المحفوظة
+        generation = get_last_change_id()
+        cached = document_search_cache.lookup(keyword, scope, generation)
+        if cached is None:
+            rows, approximate = _query_documents(keyword, selected_tag, source)
+            document_search_cache.store(keyword, scope, generation, rows, approximate)
+        else:
+            rows, approximate = cached
+        if selected_category != "الكل":
+            rows = [row for row in rows if row[6] == selected_category]
+            if not rows and not approximate and source != CONTENT_SOURCE and len(keyword.strip()) >= 3:
+                # المطابقات التامة كلها في فئات أخرى: أقرب النتائج داخل الفئة المختارة
+                rows = fuzzy_search_documents(keyword, selected_category, selected_tag)
+                approximate = bool(rows)
+        for row in rows:
+            color = get_row_color(row[4], today)
+            if filter_status == "الكل" or \
+               (filter_status == "صالحة" and color == "valid") or \
+               (filter_status == "قرب الانتهاء" and color == "near") or \
+               (filter_status == "منتهية" and color == "expired"):
+                doc_table.insert("", "end", iid=str(row[0]), values=document_values(row), tags=(color,))
+                expiry_schedule.track(str(row[0]), row[4], today)
+                results_count += 1
+        schedule_expiry_tick()
+
+        if approximate:
+            set_status(f"لا توجد نتائج مطابقة تماماً؛ عرض {results_count} نتيجة تقريبية مرتبة حسب التشابه.")
+        else:
             set_status(f"تم العثور على {results_count} مستند/ات.")
 
     except Exception as e:
@@ -333,23 +415,105 @@ def load_documents():
     """تحميل جميع المستندات أو المستندات بناءً على البحث/التصفية."""
     search_documents()
 
+# تسميات قوائم التصفية مع العدد، مثل "هوية (12)" -> "هوية"
+facet_choices = {"category": {}, "tag": {}}
+
+def _selected_facet(var, kind):
+    return facet_choices[kind].get(var.get(), "الكل")
+
+def _fill_facet_menu(menu, var, kind, counts):
+    """تعبئة قائمة تصفية بالقيم وأعدادها مع إبقاء القيمة المختارة إن بقيت موجودة."""
+    current = _selected_facet(var, kind)
+    choices = {f"{value} ({count})": value for value, count in counts}
+    facet_choices[kind] = choices
+    menu['values'] = ["الكل"] + list(choices)
+    var.set(next((label for label, value in choices.items() if value == current), "الكل"))
+
 def update_category_filter_options():
-    """تحديث خيارات تصفية الفئات."""
-    categories = get_all_categories()
-    category_filter_menu['values'] = ["الكل"] + categories
+    """تحديث خيارات تصفية الفئات والعلامات مع عدد المستندات لكل منها."""
+    facets = get_document_facets()
+    _fill_facet_menu(category_filter_menu, category_filter_var, "category", facets["categories"])
+    _fill_facet_menu(tag_filter_menu, tag_filter_var, "tag", facets["tags"])
 
 # --- دوال إدارة المرفقات في الواجهة ---
-def load_attachments(document_id):
-    """تحميل وعرض المرفقات لمستند معين."""
+# مرفقات الصفوف الظاهرة في جدول المستندات تُجلب مسبقاً باستعلام واحد عند البحث والتمرير، فتُعرض مرفقات
+# الصف المحدد من الذاكرة دون استعلام لكل نقرة. المستند الذي عمود مرفقاته 0 لا يُستعلم عنه أصلاً.
+attachment_cache = AttachmentCache()
+attachment_prefetch_state = {"job": None}
+
+def _show_attachments(attachments):
     attachments_table.delete(*attachments_table.get_children())
+    for att in attachments:
+        attachments_table.insert("", "end", iid=str(att[0]), values=attachment_values(att))
+
+def load_attachments(document_id):
+    """تحميل وعرض المرفقات لمستند معين من القاعدة (بعد تعديل مرفقاته) وتحديث الذاكرة."""
     try:
         attachments = get_attachments_for_document(document_id)
-        for att in attachments:
-            attachments_table.insert("", "end", values=att)
+        attachment_cache.put(int(document_id), attachments)
+        _show_attachments(attachments)
     except Exception as e:
+        attachments_table.delete(*attachments_table.get_children())
         messagebox.showerror("خطأ", f"فشل تحميل المرفقات: {e}")
         set_status(f"خطأ في تحميل المرفقات: {e}")
 
+def show_document_attachments(document_id):
+    """عرض مرفقات مستند من الذاكرة إن كانت محملة مسبقاً، وإلا تحميلها."""
+    attachments = attachment_cache.get(int(document_id))
+    if attachments is None:
+        load_attachments(document_id)
+    else:
+        _show_attachments(attachments)
+
+def on_document_selected(event=None):
+    selected = doc_table.selection()
+    if len(selected) == 1:
+        show_document_attachments(selected[0])
+    else:
+        attachments_table.delete(*attachments_table.get_children())
+
+def visible_document_ids():
+    """معرفات الصفوف الظاهرة حالياً في جدول المستندات (من موضع التمرير)."""
+    children = doc_table.get_children()
+    if not children:
+        return []
+    first, last = doc_table.yview()
+    return children[int(first * len(children)):int(last * len(children)) + 1]
+
+def prefetch_visible_attachments():
+    """جلب مرفقات الصفوف الظاهرة غير المحملة في استعلام واحد."""
+    attachment_prefetch_state["job"] = None
+    missing = []
+    for iid in visible_document_ids():
+        doc_id = int(iid)
+        # get يجدد ترتيب استخدام الصفوف الظاهرة فلا تُسقط قبل غيرها
+        if attachment_cache.get(doc_id) is not None:
+            continue
+        if int(doc_table.set(iid, "المرفقات") or 0):
+            missing.append(doc_id)
+        else:
+            attachment_cache.put(doc_id, [])
+    if not missing:
+        return
+    try:
+        rows = get_attachments_for_documents(missing)
+    except Exception as e:
+        set_status(f"تعذر تحميل المرفقات مسبقاً: {e}")
+        return
+    fetched = {doc_id: [] for doc_id in missing}
+    for row in rows:
+        fetched[row[0]].append(tuple(row[1:]))
+    for doc_id, attachments in fetched.items():
+        attachment_cache.put(doc_id, attachments)
+
+def schedule_attachment_prefetch():
+    if attachment_prefetch_state["job"] is None:
+        attachment_prefetch_state["job"] = root.after(100, prefetch_visible_attachments)
+
+def on_document_table_scroll(first, last):
+    doc_table_scrollbar_y.set(first, last)
+    schedule_attachment_prefetch()
+
 def add_attachment_to_selected():
     """إرفاق ملف بالمستند المحدد."""
     selected = doc_table.selection()
@@ -380,63 +544,64 @@ def open_selected_attachment():
         messagebox.showwarning("تحذير", "يرجى تحديد مرفق لفتحه.")
         return
     
-    values = attachments_table.item(selected[0])['values']
-    filepath = values[2]
-
-    if os.path.exists(filepath):
-        try:
-            if os.name == 'nt':
-                os.startfile(filepath)
-            elif os.uname().sysname == 'Darwin':
-                subprocess.call(('open', filepath))
-            else:
-                subprocess.call(('xdg-open', filepath))
-            set_status(f"تم فتح الملف: {os.path.basename(filepath)}.")
-        except Exception as e:
-            messagebox.showerror("خطأ", f"فشل فتح الملف: {e}")
-            set_status(f"فشل فتح الملف: {e}")
-    else:
-        messagebox.showerror("خطأ", "الملف غير موجود في المسار المحدد.")
+    attachment_id = attachments_table.item(selected[0])['values'][0]
+    try:
+        # المرفقات المضغوطة تُفك إلى ذاكرة مؤقتة، ومرفقات الخادم تُنزل إلى نسخة محلية
+        filepath = readable_attachment_path(attachment_id)
+        if os.name == 'nt':
+            os.startfile(filepath)
+        elif os.uname().sysname == 'Darwin':
+            subprocess.call(('open', filepath))
+        else:
+            subprocess.call(('xdg-open', filepath))
+        set_status(f"تم فتح الملف: {os.path.basename(filepath)}.")
+    except ValueError as e:
+        messagebox.showerror("خطأ", str(e))
         set_status("الملف غير موجود.")
+    except Exception as e:
+        messagebox.showerror("خطأ", f"فشل فتح الملف: {e}")
+        set_status(f"فشل فتح الملف: {e}")
 
 def delete_selected_attachment():
-    """حذف المرفق المحدد."""
+    """حذف المرفقات المحددة (واحد أو أكثر)."""
     selected = attachments_table.selection()
     if not selected:
         messagebox.showwarning("تحذير", "يرجى تحديد مرفق لحذفه.")
         return
-    
-    dialog = CustomConfirmDialog(root, "تأكيد الحذف", "هل أنت متأكد أنك تريد حذف هذا المرفق؟")
+
+    if len(selected) == 1:
+        message = "هل أنت متأكد أنك تريد حذف هذا المرفق؟"
+    else:
+        message = f"هل أنت متأكد أنك تريد حذف {len(selected)} مرفقات؟"
+    dialog = CustomConfirmDialog(root, "تأكيد الحذف", message)
     if dialog.result:
-        values = attachments_table.item(selected[0])['values']
-        attachment_id = values[0]
-        filepath = values[2]
+        attachment_ids = [attachments_table.item(item)['values'][0] for item in selected]
         selected_doc_item = doc_table.selection()
         if selected_doc_item:
             doc_id = doc_table.item(selected_doc_item[0])['values'][0]
         else:
             doc_id = None
 
-        set_status(f"جاري حذف المرفق: {values[1]}...")
+        set_status(f"جاري حذف {len(attachment_ids)} مرفق/ات...")
         try:
-            delete_attachment(attachment_id, filepath)
+            deleted_count = delete_attachments(attachment_ids)
             if doc_id:
                 load_attachments(doc_id)
             else:
                 attachments_table.delete(*attachments_table.get_children())
-            messagebox.showinfo("نجاح", "تم حذف المرفق بنجاح.")
-            set_status("تم حذف المرفق بنجاح.")
+            messagebox.showinfo("نجاح", f"تم حذف {deleted_count} مرفق/ات بنجاح.")
+            set_status(f"تم حذف {deleted_count} مرفق/ات بنجاح.")
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل حذف المرفق: {e}")
             set_status(f"فشل حذف المرفق: {e}")
 
 def delete_all_attachments_for_document():
-    """حذف جميع المرفقات للمستند المحدد."""
+    """حذف جميع المرفقات للمستند المحدد دفعة واحدة."""
     selected_doc_item = doc_table.selection()
     if not selected_doc_item:
         messagebox.showwarning("تحذير", "يرجى تحديد مستند أولاً لحذف مرفقاته.")
         return
-    
+
     doc_id = doc_table.item(selected_doc_item[0])['values'][0]
     doc_name = doc_table.item(selected_doc_item[0])['values'][1]
 
@@ -450,12 +615,10 @@ def delete_all_attachments_for_document():
                 set_status("لا توجد مرفقات لحذفها.")
                 return
 
-            for att_id, att_filename, att_filepath, _ in attachments:
-                delete_attachment(att_id, att_filepath)
-            
+            delete_attachments([att[0] for att in attachments])
+
             load_attachments(doc_id)
             messagebox.showinfo("نجاح", f"تم حذف جميع المرفقات للمستند: {doc_name} بنجاح.")
-            log_audit_event("حذف جميع المرفقات", f"تم حذف جميع المرفقات للمستند ID: {doc_id} ({doc_name})")
             set_status("تم حذف جميع المرفقات بنجاح.")
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل حذف جميع المرفقات: {e}")
@@ -478,8 +641,8 @@ def load_employees():
     try:
         employees = fetch_all_employees()
         for emp in employees:
-            formatted_hire_date = convert_date_from_db_format(emp[5])
-            emp_table.insert("", "end", values=(emp[0], emp[1], emp[2], emp[3], emp[4], formatted_hire_date))
+            emp_table.insert("", "end", iid=str(emp[0]), values=employee_values(emp))
+        employee_index.invalidate()
         set_status(f"تم تحميل {len(employees)} موظف/موظفين.")
     except Exception as e:
         messagebox.showerror("خطأ", f"حدث خطأ أثناء تحميل بيانات الموظفين: {e}")
@@ -523,7 +686,7 @@ def populate_employee_form_from_selection():
     
     hire_date_ddmmyyyy = values[5]
     if hire_date_ddmmyyyy:
-        emp_entry_hire_date.set_date(datetime.strptime(hire_date_ddmmyyyy, "%d-%m-%Y").date())
+        emp_entry_hire_date.set_date(datecodec.date_from_day(datecodec.parse_display(hire_date_ddmmyyyy)))
     else:
         emp_entry_hire_date.set_date("")
     set_status(f"تم تحديد الموظف: {values[1]}.")
@@ -563,7 +726,7 @@ def delete_selected_employee():
         messagebox.showwarning("تحذير", "يرجى تحديد موظف للحذف.")
         return
     
-    dialog = CustomConfirmDialog(root, "تأكيد الحذف", "هل أنت متأكد أنك تريد حذف هذا الموظف؟\n(ملاحظة: سيتم إزالة ربط هذا الموظف بأي مستندات.)")
+    dialog = CustomConfirmDialog(root, "تأكيد الحذف", "هل أنت متأكد أنك تريد حذف هذا الموظف؟\n(ملاحظة: سيتم إزالة ربط هذا الموظف بأي مستندات، وحذف جميع سجلات رواتبه.)")
     if dialog.result:
         emp_id = emp_table.item(selected[0])['values'][0]
         set_status(f"جاري حذف الموظف ID: {emp_id}...")
@@ -577,6 +740,98 @@ def delete_selected_employee():
             messagebox.showerror("خطأ", f"حدث خطأ أثناء حذف الموظف: {e}")
             set_status(f"خطأ في الحذف: {e}")
 
+# --- ملف الموظف (يُحمّل في الخلفية عند تحديد موظف) ---
+# الملفات المحملة تُحفظ في ذاكرة LRU، وتُسقط عند تغير بيانات الموظف في سجل التغييرات.
+# الملف الذي تغير أثناء تحميله يُعلّم كقديم فلا يُحفظ، ويُعاد تحميله إن كان معروضاً.
+dossier_cache = DossierCache()
+dossier_results = queue.Queue()
+dossier_state = {"employee": None, "job": None, "loading": set(), "stale": set()}
+DOSSIER_SELECT_DELAY_MS = 150
+
+def on_employee_selected(event=None):
+    """تأجيل قصير قبل التحميل حتى لا يُستعلم عن كل صف يمر عليه التنقل بالأسهم."""
+    if dossier_state["job"] is not None:
+        root.after_cancel(dossier_state["job"])
+    dossier_state["job"] = root.after(DOSSIER_SELECT_DELAY_MS, show_selected_dossier)
+
+def show_selected_dossier():
+    """عرض ملف الموظف المحدد من الذاكرة، أو بدء تحميله في خيط خلفي."""
+    dossier_state["job"] = None
+    selected = emp_table.selection()
+    if len(selected) != 1:
+        dossier_state["employee"] = None
+        dossier_frame.config(text="ملف الموظف")
+        render_dossier(None)
+        return
+    employee_id = int(selected[0])
+    dossier_state["employee"] = employee_id
+    dossier_frame.config(text=f"ملف الموظف: {emp_table.item(selected[0])['values'][1]}")
+    dossier = dossier_cache.get(employee_id)
+    if dossier is not None:
+        render_dossier(dossier)
+        return
+    dossier_status_label.config(text="جاري التحميل...")
+    load_dossier(employee_id)
+
+def load_dossier(employee_id):
+    if employee_id in dossier_state["loading"]:
+        return
+
+    def worker():
+        try:
+            dossier_results.put((employee_id, fetch_employee_dossier(employee_id), None))
+        except Exception as e:
+            dossier_results.put((employee_id, None, e))
+
+    if not dossier_state["loading"]:
+        root.after(100, poll_dossier_results)
+    dossier_state["loading"].add(employee_id)
+    threading.Thread(target=worker, name="dms-employee-dossier", daemon=True).start()
+
+def poll_dossier_results():
+    while not dossier_results.empty():
+        employee_id, dossier, error = dossier_results.get_nowait()
+        dossier_state["loading"].discard(employee_id)
+        shown = employee_id == dossier_state["employee"]
+        if employee_id in dossier_state["stale"]:
+            dossier_state["stale"].discard(employee_id)
+            if shown:
+                load_dossier(employee_id)
+        elif error is not None:
+            if shown:
+                dossier_status_label.config(text=f"تعذر تحميل ملف الموظف: {error}")
+        else:
+            dossier_cache.put(employee_id, dossier)
+            if shown:
+                render_dossier(dossier)
+    if dossier_state["loading"]:
+        root.after(100, poll_dossier_results)
+
+def invalidate_dossiers(employee_ids):
+    """إسقاط ملفات محفوظة (أو قيد التحميل) بعد تغيير، وإعادة عرض الملف الحالي إن كان منها."""
+    for employee_id in employee_ids:
+        dossier_cache.invalidate(employee_id)
+        if employee_id in dossier_state["loading"]:
+            dossier_state["stale"].add(employee_id)
+    if dossier_state["employee"] in employee_ids:
+        show_selected_dossier()
+
+def render_dossier(dossier):
+    dossier_documents_table.delete(*dossier_documents_table.get_children())
+    dossier_salaries_table.delete(*dossier_salaries_table.get_children())
+    if dossier is None:
+        dossier_status_label.config(text="حدد موظفاً لعرض مستنداته ورواتبه.")
+        return
+    today = datecodec.today()
+    for doc_id, name, number, date_day, expiry_day, category, attachments in dossier["documents"]:
+        dossier_documents_table.insert("", "end", values=(
+            doc_id, name, number, datecodec.format_day(date_day), datecodec.format_day(expiry_day), category or "", attachments
+        ), tags=(get_row_color(expiry_day, today),))
+    for salary in dossier["salaries"]:
+        dossier_salaries_table.insert("", "end", values=tuple(salary))
+    dossier_status_label.config(text=f"{len(dossier['documents'])} مستند، {len(dossier['attachment_ids'])} مرفق، "
+                                     f"{len(dossier['salaries'])} سجل راتب.")
+
 # --- دوال سجل التدقيق ---
 def load_audit_log():
     """تحميل وعرض سجل التدقيق في الجدول."""
@@ -584,33 +839,79 @@ def load_audit_log():
     set_status("جاري تحميل سجل التدقيق...")
     try:
         logs = fetch_audit_log()
-        for log in logs:
-            audit_table.insert("", "end", values=log)
+        for timestamp, action, details in logs:
+            audit_table.insert("", "end", values=(datecodec.format_timestamp(timestamp), action, details))
         set_status(f"تم تحميل {len(logs)} سجل/سجلات تدقيق.")
     except Exception as e:
         messagebox.showerror("خطأ", f"حدث خطأ أثناء تحميل سجل التدقيق: {e}")
         set_status(f"خطأ في تحميل سجل التدقيق: {e}")
 
 # --- دوال المدة المتبقية ---
+# --- انتقالات الصلاحية أثناء بقاء البرنامج مفتوحاً ---
+# الكومة تحفظ تاريخ الانتقال القادم لكل صف معروض في جدول المستندات؛ المؤقت يستيقظ عند بداية
+# يوم أقرب انتقال فقط (أو غداً إن كان جدول المدة المتبقية معروضاً) ويحدّث الصفوف المعنية وحدها.
+expiry_schedule = ExpirySchedule()
+expiry_tick_job = None
+# أقصى مدة بين إيقاظين، تحسباً لتغيير ساعة النظام أو السبات
+EXPIRY_TICK_MAX_MS = 60 * 60 * 1000
+expiry_state = {"day": datecodec.today()}
+
+def schedule_expiry_tick():
+    """إعادة ضبط المؤقت على أقرب انتقال مسجل."""
+    global expiry_tick_job
+    if expiry_tick_job is not None:
+        root.after_cancel(expiry_tick_job)
+        expiry_tick_job = None
+    next_day = expiry_schedule.next_day()
+    if remaining_time_table.get_children():
+        tomorrow = expiry_state["day"] + 1
+        next_day = tomorrow if next_day is None else min(next_day, tomorrow)
+    if next_day is not None:
+        expiry_tick_job = root.after(min(milliseconds_until(next_day), EXPIRY_TICK_MAX_MS) + 1000, expiry_tick)
+
+def expiry_tick():
+    """إعادة تلوين المستندات التي تغيرت حالتها، وتحديث خلايا المدة المتبقية عند بدء يوم جديد."""
+    global expiry_tick_job
+    expiry_tick_job = None
+    today = datecodec.today()
+    filter_status = filter_var.get()
+    status_names = {"valid": "صالحة", "near": "قرب الانتهاء", "expired": "منتهية"}
+    for iid, expiry_day in expiry_schedule.pop_due(today):
+        if not doc_table.exists(iid):
+            expiry_schedule.forget(iid)
+            continue
+        color = get_row_color(expiry_day, today)
+        if filter_status != "الكل" and status_names[color] != filter_status:
+            # لم يعد الصف يطابق تصفية الحالة المختارة
+            doc_table.delete(iid)
+            expiry_schedule.forget(iid)
+        else:
+            doc_table.item(iid, tags=(color,))
+    if today != expiry_state["day"]:
+        expiry_state["day"] = today
+        for item in remaining_time_table.get_children():
+            values = remaining_time_table.item(item)['values']
+            expiry_day = datecodec.parse_display(values[3]) if values[3] else None
+            remaining_time_table.set(item, "المدة المتبقية", calculate_remaining_time(expiry_day))
+    schedule_expiry_tick()
+
 def load_remaining_time_documents():
     """تحميل وعرض معلومات المدة المتبقية للمستندات في الجدول."""
     remaining_time_table.delete(*remaining_time_table.get_children())
     set_status("جاري تحميل معلومات المدة المتبقية للمستندات...")
     try:
-        with sqlite3.connect("document_management.db") as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name, number, expiry_date FROM documents WHERE expiry_date IS NOT NULL")
-            
-            for row in cursor.fetchall():
-                doc_id, name, number, expiry_date_db = row
-                
-                remaining_time_str = calculate_remaining_time(expiry_date_db)
-                
-                display_expiry_date = convert_date_from_db_format(expiry_date_db)
-
-                remaining_time_table.insert("", "end", values=(doc_id, name, number, display_expiry_date, remaining_time_str))
-            
-            set_status(f"تم تحميل معلومات المدة المتبقية لـ {len(remaining_time_table.get_children())} مستند/ات.")
+        for row in fetch_documents_with_expiry():
+            doc_id, name, number, expiry_date_db = row
+
+            remaining_time_str = calculate_remaining_time(expiry_date_db)
+
+            display_expiry_date = convert_date_from_db_format(expiry_date_db)
+
+            remaining_time_table.insert("", "end", values=(doc_id, name, number, display_expiry_date, remaining_time_str))
+
+        expiry_state["day"] = datecodec.today()
+        schedule_expiry_tick()
+        set_status(f"تم تحميل معلومات المدة المتبقية لـ {len(remaining_time_table.get_children())} مستند/ات.")
     except Exception as e:
         messagebox.showerror("خطأ", f"حدث خطأ أثناء تحميل المدة المتبقية للمستندات: {e}")
         set_status(f"خطأ في تحميل المدة المتبقية: {e}")
@@ -634,8 +935,8 @@ def export_documents_to_excel():
         formatted_documents_data = []
         for doc in documents_data:
             doc_list = list(doc)
-            if doc_list[4]:
-                doc_list[4] = convert_date_from_db_format(doc_list[4])
+            doc_list[3] = convert_date_from_db_format(doc_list[3])
+            doc_list[4] = convert_date_from_db_format(doc_list[4])
             formatted_documents_data.append(doc_list)
 
         df = pd.DataFrame(formatted_documents_data, columns=[
@@ -643,18 +944,97 @@ def export_documents_to_excel():
         ])
         df.to_excel(filepath, index=False)
         messagebox.showinfo("نجاح", f"تم تصدير المستندات بنجاح إلى:\n{filepath}")
-        log_audit_event("تصدير بيانات", f"تم تصدير جميع المستندات إلى ملف Excel: {filepath}")
+        log_data_export("documents", filepath)
         set_status(f"تم تصدير المستندات بنجاح إلى: {filepath}")
     except Exception as e:
         messagebox.showerror("خطأ في التصدير", f"حدث خطأ أثناء تصدير المستندات: {e}")
         set_status(f"خطأ في التصدير: {e}")
 
 # --- دوال الرواتب ---
-def update_employee_salary_options():
-    """تحديث خيارات الموظفين في قائمة الرواتب المنسدلة."""
-    employees = fetch_employee_id_name()
-    employee_options = [f"{emp[1]} (ID: {emp[0]})" for emp in employees]
-    emp_id_salary_combobox['values'] = employee_options
+class EmployeePicker(ttk.Frame):
+    """حقل اختيار موظف بالكتابة: قائمة منبثقة بأفضل المطابقات من فهرس البادئات، ويحتفظ بمعرف الموظف المختار."""
+    def __init__(self, parent, index, limit=20, width=40):
+        super().__init__(parent)
+        self.index = index
+        self.limit = limit
+        self.employee_id = None
+        self._matches = []
+        self._setting = False
+
+        self.text_var = tk.StringVar()
+        self.entry = ttk.Entry(self, textvariable=self.text_var, width=width, justify="right")
+        self.entry.pack(fill="x", expand=True)
+        self.text_var.trace_add("write", lambda *args: self._on_text())
+        self.entry.bind("<Down>", lambda e: self._move(1))
+        self.entry.bind("<Up>", lambda e: self._move(-1))
+        self.entry.bind("<Return>", lambda e: self._choose())
+        self.entry.bind("<Escape>", lambda e: self._hide())
+        self.entry.bind("<FocusOut>", lambda e: self.after(150, self._hide))
+
+        self.popup = tk.Toplevel(self)
+        self.popup.overrideredirect(True)
+        self.popup.withdraw()
+        self.listbox = tk.Listbox(self.popup, height=8, justify="right", exportselection=False)
+        self.listbox.pack(fill="both", expand=True)
+        self.listbox.bind("<ButtonRelease-1>", lambda e: self._choose())
+
+    def _on_text(self):
+        if self._setting:
+            return
+        self.employee_id = None
+        self._show(self.text_var.get())
+
+    def _show(self, text):
+        self._matches = self.index.search(text, self.limit)
+        self.listbox.delete(0, tk.END)
+        for emp_id, name, number, department in self._matches:
+            self.listbox.insert(tk.END, f"{name} - {number or ''} ({department or 'بدون قسم'})")
+        if not self._matches:
+            self._hide()
+            return
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(0)
+        self.popup.geometry(f"{self.entry.winfo_width()}x{min(len(self._matches), 8) * 20 + 4}"
+                            f"+{self.entry.winfo_rootx()}+{self.entry.winfo_rooty() + self.entry.winfo_height()}")
+        self.popup.deiconify()
+        self.popup.lift()
+
+    def _hide(self):
+        self.popup.withdraw()
+
+    def _move(self, step):
+        if not self.popup.winfo_viewable():
+            self._show(self.text_var.get())
+            return "break"
+        selection = self.listbox.curselection()
+        position = max(0, min(len(self._matches) - 1, (selection[0] if selection else -1) + step))
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(position)
+        self.listbox.see(position)
+        return "break"
+
+    def _choose(self):
+        selection = self.listbox.curselection()
+        if self.popup.winfo_viewable() and selection:
+            emp_id, name = self._matches[selection[0]][:2]
+            self.set(emp_id, name)
+        self._hide()
+        return "break"
+
+    def set(self, emp_id, name):
+        self._setting = True
+        self.text_var.set(name)
+        self._setting = False
+        self.employee_id = emp_id
+        self.entry.icursor(tk.END)
+
+    def get(self):
+        """معرف الموظف المختار من القائمة، أو None إذا عُدل النص دون اختيار."""
+        return self.employee_id
+
+    def clear(self):
+        self.set(None, "")
+        self._hide()
 
 def update_department_salary_filter_options():
     """تحديث خيارات تصفية الأقسام في قائمة الرواتب المنسدلة."""
@@ -704,7 +1084,7 @@ def update_salary_display_fields(event=None):
 
 def clear_salary_fields():
     """مسح جميع حقول إدخال الرواتب."""
-    emp_id_salary_combobox.set("")
+    employee_picker.clear()
     monthly_basic_salary_var.set("")
     annual_basic_salary_var.set("")
     entry_allowances.delete(0, tk.END)
@@ -718,11 +1098,10 @@ def save_salary():
     """حفظ سجل راتب جديد."""
     set_status("جاري حفظ الراتب...")
     try:
-        selected_emp_str = emp_id_salary_combobox.get()
-        if not selected_emp_str:
-            messagebox.showwarning("تحذير", "يرجى تحديد موظف.")
+        emp_id = employee_picker.get()
+        if emp_id is None:
+            messagebox.showwarning("تحذير", "يرجى اختيار موظف من القائمة.")
             return
-        emp_id = int(selected_emp_str.split('(ID: ')[1][:-1])
 
         # نأخذ الراتب الشهري من الحقل المخصص له
         basic_salary_monthly = float(monthly_basic_salary_var.get() or 0)
@@ -766,7 +1145,7 @@ def populate_salary_form_from_selection():
 
     clear_salary_fields()
 
-    emp_id_salary_combobox.set(f"{employee_name} (ID: {employee_id_from_db})")
+    employee_picker.set(int(employee_id_from_db), employee_name)
     
     monthly_basic_salary_var.set(str(monthly_basic_salary))
     annual_basic_salary_var.set(str(annual_basic_salary))
@@ -774,7 +1153,7 @@ def populate_salary_form_from_selection():
     entry_deductions.insert(0, str(deductions))
     label_net_salary_value.config(text=f"{net_salary:.2f}")
     payment_method_var.set(payment_method)
-    entry_payment_date.set_date(datetime.strptime(payment_date_ddmmyyyy, "%d-%m-%Y").date())
+    entry_payment_date.set_date(datecodec.date_from_day(datecodec.parse_display(payment_date_ddmmyyyy)))
     
     salary_table.current_salary_id = salary_id
     set_status(f"تم تحديد سجل الراتب للموظف: {employee_name}.")
@@ -793,11 +1172,10 @@ def update_selected_salary():
 
     set_status("جاري تعديل الراتب...")
     try:
-        selected_emp_str = emp_id_salary_combobox.get()
-        if not selected_emp_str:
-            messagebox.showwarning("تحذير", "يرجى تحديد موظف.")
+        emp_id = employee_picker.get()
+        if emp_id is None:
+            messagebox.showwarning("تحذير", "يرجى اختيار موظف من القائمة.")
             return
-        emp_id = int(selected_emp_str.split('(ID: ')[1][:-1])
 
         basic_salary_monthly = float(monthly_basic_salary_var.get() or 0)
         allowances = float(entry_allowances.get() or 0)
@@ -846,14 +1224,9 @@ def load_salaries():
     selected_department = department_salary_filter_var.get()
     
     try:
-        salaries = fetch_all_salaries(department_filter=selected_department)
+        salaries = fetch_all_salaries(department_filter=selected_department, include_archives=include_salary_archives_var.get())
         for sal in salaries:
-            # البيانات من fetch_all_salaries: id, employee_name, department, basic_salary (monthly), allowances, deductions, net_salary, payment_method, payment_date, employee_id
-            monthly_basic = sal[3]
-            annual_basic = monthly_basic * 12
-            display_payment_date = convert_date_from_db_format(sal[8]) # تاريخ الدفع هو العنصر التاسع (الفهرس 8)
-            
-            salary_table.insert("", "end", values=(sal[0], sal[1], sal[2], monthly_basic, annual_basic, sal[4], sal[5], sal[6], sal[7], display_payment_date, sal[9]))
+            salary_table.insert("", "end", iid=str(sal[0]), values=salary_values(sal))
         set_status(f"تم تحميل {len(salaries)} سجل/سجلات رواتب.")
     except Exception as e:
         messagebox.showerror("خطأ", f"حدث خطأ أثناء تحميل بيانات الرواتب: {e}")
@@ -880,7 +1253,7 @@ def export_salaries_to_excel():
         ])
         df.to_excel(filepath, index=False)
         messagebox.showinfo("نجاح", f"تم تصدير الرواتب بنجاح إلى:\n{filepath}")
-        log_audit_event("تصدير رواتب", f"تم تصدير جميع الرواتب إلى ملف Excel: {filepath}")
+        log_data_export("salaries", filepath)
         set_status(f"تم تصدير الرواتب بنجاح إلى: {filepath}")
     except Exception as e:
         messagebox.showerror("خطأ في التصدير", f"حدث خطأ أثناء تصدير الرواتب: {e}")
@@ -897,30 +1270,10 @@ def prepare_monthly_salaries_for_all():
     current_month = current_date.month
     payment_date_str = current_date.strftime("%d-%m-%Y") # تاريخ الدفع الافتراضي هو اليوم الحالي
 
-    employees = fetch_all_employees()
-    new_salaries_count = 0
-
-    for emp in employees:
-        emp_id = emp[0]
-        emp_name = emp[1]
-
-        if not salary_exists_for_month(emp_id, current_year, current_month):
-            last_salary_data = get_last_employee_salary(emp_id)
-            
-            basic_salary = 0.0
-            allowances = 0.0
-            deductions = 0.0
-
-            if last_salary_data:
-                basic_salary, allowances, deductions = last_salary_data
-
-            try:
-                add_salary(emp_id, basic_salary, allowances, deductions, "تحويل بنكي", payment_date_str)
-                new_salaries_count += 1
-                log_audit_event("إعداد راتب شهري", f"تم إعداد راتب افتراضي للموظف: {emp_name} لشهر {current_month}/{current_year}")
-            except Exception as e:
-                print(f"Error preparing salary for employee {emp_name} (ID: {emp_id}): {e}")
-                set_status(f"خطأ في إعداد راتب {emp_name}: {e}")
+    new_salaries_count, failures = prepare_monthly_salaries(current_year, current_month, payment_date_str)
+    for emp_id, emp_name, error in failures:
+        print(f"Error preparing salary for employee {emp_name} (ID: {emp_id}): {error}")
+        set_status(f"خطأ في إعداد راتب {emp_name}: {error}")
 
     load_salaries() # تحديث الجدول لعرض الرواتب الجديدة
     if new_salaries_count > 0:
@@ -930,6 +1283,394 @@ def prepare_monthly_salaries_for_all():
         messagebox.showinfo("إعداد الرواتب", "جميع الموظفين لديهم بالفعل سجلات رواتب لهذا الشهر.")
         set_status("لا توجد رواتب جديدة لإعدادها لهذا الشهر.")
 
+# --- نافذة ملخص الرواتب ---
+class PayrollSummaryDialog(tk.Toplevel):
+    """عرض إجماليات الرواتب الشهرية حسب القسم وطريقة الدفع من جدول الملخص."""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("ملخص الرواتب الشهرية")
+        self.geometry("1000x550")
+        self.transient(parent)
+
+        filters_frame = ttk.Frame(self)
+        filters_frame.pack(padx=10, pady=5, fill="x")
+
+        self.year_var = tk.StringVar(value="الكل")
+        self.department_var = tk.StringVar(value="الكل")
+        self.method_var = tk.StringVar(value="الكل")
+
+        ttk.Label(filters_frame, text="السنة:").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(filters_frame, textvariable=self.year_var, values=["الكل"] + get_payroll_summary_years(),
+                     state="readonly", width=10).pack(side=tk.LEFT, padx=5)
+        ttk.Label(filters_frame, text="القسم:").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(filters_frame, textvariable=self.department_var, values=["الكل"] + get_all_departments(),
+                     state="readonly", width=20).pack(side=tk.LEFT, padx=5)
+        ttk.Label(filters_frame, text="طريقة الدفع:").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(filters_frame, textvariable=self.method_var, values=["الكل", "تحويل بنكي", "كاش"],
+                     state="readonly", width=12).pack(side=tk.LEFT, padx=5)
+        for child in filters_frame.winfo_children():
+            if isinstance(child, ttk.Combobox):
+                child.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+
+        columns = ("الشهر", "القسم", "طريقة الدفع", "إجمالي الأساسي", "إجمالي البدلات", "إجمالي الخصومات", "إجمالي الصافي", "عدد السجلات")
+        table_frame = ttk.Frame(self)
+        table_frame.pack(padx=10, pady=5, fill="both", expand=True)
+        self.table = ttk.Treeview(table_frame, columns=columns, show="headings")
+        for col in columns:
+            self.table.heading(col, text=col, command=lambda _col=col: treeview_sort_column(self.table, _col, False))
+            self.table.column(col, width=110, anchor="center")
+        self.table.pack(side="left", fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.table.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.table.configure(yscrollcommand=scrollbar.set)
+
+        self.totals_label = ttk.Label(self, text="", font=('Arial', 10, 'bold'))
+        self.totals_label.pack(padx=10, pady=5, anchor="w")
+
+        self.refresh()
+
+    def refresh(self):
+        self.table.delete(*self.table.get_children())
+        year = self.year_var.get()
+        try:
+            rows = fetch_payroll_summary(
+                year=None if year == "الكل" else year,
+                department=self.department_var.get(),
+                payment_method=self.method_var.get()
+            )
+        except Exception as e:
+            messagebox.showerror("خطأ", f"حدث خطأ أثناء تحميل ملخص الرواتب: {e}", parent=self)
+            return
+        totals = [0.0, 0.0, 0.0, 0.0, 0]
+        for month, department, method, basic, allowances, deductions, net, headcount in rows:
+            self.table.insert("", "end", values=(
+                month, department or "بدون قسم", method,
+                f"{basic:.2f}", f"{allowances:.2f}", f"{deductions:.2f}", f"{net:.2f}", headcount
+            ))
+            for i, value in enumerate((basic, allowances, deductions, net, headcount)):
+                totals[i] += value
+        self.totals_label.config(text=(
+            f"الإجمالي — الأساسي: {totals[0]:.2f}، البدلات: {totals[1]:.2f}، الخصومات: {totals[2]:.2f}، "
+            f"الصافي: {totals[3]:.2f}، عدد السجلات: {totals[4]}"
+        ))
+
+def show_payroll_summary():
+    """فتح نافذة ملخص الرواتب."""
+    PayrollSummaryDialog(root)
+
+# --- نافذة توقعات الرواتب (سيناريوهات ماذا لو) ---
+class PayrollProjectionDialog(tk.Toplevel):
+    """تقييم سيناريوهات الزيادات والتعيينات على آخر راتب لكل موظف، مع إمكانية اعتماد السيناريو."""
+    def __init__(self, parent, payroll_model):
+        super().__init__(parent)
+        self.title("توقعات الرواتب")
+        self.geometry("1100x650")
+        self.transient(parent)
+        self.model = payroll_model
+        self.workforce = payroll_model.load_workforce()
+
+        general_frame = ttk.LabelFrame(self, text="السيناريو")
+        general_frame.pack(padx=10, pady=5, fill="x")
+        self.months_var = tk.StringVar(value="12")
+        self.default_raise_var = tk.StringVar(value="0")
+        self.annual_raise_var = tk.StringVar(value="0")
+        ttk.Label(general_frame, text="مدة التوقع (أشهر):").grid(row=0, column=0, padx=5, pady=3, sticky="w")
+        ttk.Spinbox(general_frame, from_=payroll_model.MIN_PROJECTION_MONTHS, to=payroll_model.MAX_PROJECTION_MONTHS,
+                    textvariable=self.months_var, width=6).grid(row=0, column=1, padx=5, pady=3, sticky="w")
+        ttk.Label(general_frame, text="زيادة عامة (%):").grid(row=0, column=2, padx=5, pady=3, sticky="w")
+        ttk.Entry(general_frame, textvariable=self.default_raise_var, width=8).grid(row=0, column=3, padx=5, pady=3, sticky="w")
+        ttk.Label(general_frame, text="زيادة سنوية مركبة (%):").grid(row=0, column=4, padx=5, pady=3, sticky="w")
+        ttk.Entry(general_frame, textvariable=self.annual_raise_var, width=8).grid(row=0, column=5, padx=5, pady=3, sticky="w")
+
+        departments_frame = ttk.LabelFrame(self, text="حسب القسم (اتركها فارغة لاستخدام الزيادة العامة)")
+        departments_frame.pack(padx=10, pady=5, fill="x")
+        ttk.Label(departments_frame, text="القسم").grid(row=0, column=0, padx=5)
+        ttk.Label(departments_frame, text="زيادة الأساسي (%)").grid(row=0, column=1, padx=5)
+        ttk.Label(departments_frame, text="تغيير البدلات (مبلغ)").grid(row=0, column=2, padx=5)
+        self.department_vars = {}
+        for row, department in enumerate(self.workforce.department_names, start=1):
+            raise_var, allowance_var = tk.StringVar(), tk.StringVar()
+            self.department_vars[department] = (raise_var, allowance_var)
+            ttk.Label(departments_frame, text=department or "بدون قسم").grid(row=row, column=0, padx=5, sticky="w")
+            ttk.Entry(departments_frame, textvariable=raise_var, width=10).grid(row=row, column=1, padx=5)
+            ttk.Entry(departments_frame, textvariable=allowance_var, width=10).grid(row=row, column=2, padx=5)
+
+        hires_frame = ttk.LabelFrame(self, text="تعيينات جديدة")
+        hires_frame.pack(padx=10, pady=5, fill="x")
+        self.hire_vars = [tk.StringVar() for _ in range(5)]
+        for column, (label, var) in enumerate(zip(["القسم", "العدد", "الأساسي", "البدلات", "الخصومات"], self.hire_vars)):
+            ttk.Label(hires_frame, text=label + ":").grid(row=0, column=column * 2, padx=5, pady=3)
+            if column == 0:
+                ttk.Combobox(hires_frame, textvariable=var, values=self.workforce.department_names, width=15).grid(row=0, column=1, padx=5)
+            else:
+                ttk.Entry(hires_frame, textvariable=var, width=10).grid(row=0, column=column * 2 + 1, padx=5)
+
+        table_frame = ttk.Frame(self)
+        table_frame.pack(padx=10, pady=5, fill="both", expand=True)
+        self.table = ttk.Treeview(table_frame, columns=payroll_model.RESULT_COLUMNS, show="headings")
+        for col in payroll_model.RESULT_COLUMNS:
+            self.table.heading(col, text=col, command=lambda _col=col: treeview_sort_column(self.table, _col, False))
+            self.table.column(col, width=140, anchor="center")
+        self.table.pack(side="left", fill="both", expand=True)
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.table.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.table.configure(yscrollcommand=scrollbar.set)
+
+        buttons_frame = ttk.Frame(self)
+        buttons_frame.pack(pady=5)
+        ttk.Button(buttons_frame, text="حساب", command=self.evaluate).pack(side=tk.LEFT, padx=5)
+        ttk.Label(buttons_frame, text="تاريخ الدفع:").pack(side=tk.LEFT, padx=5)
+        self.payment_date_entry = DateEntry(buttons_frame, width=12, background='darkblue', foreground='white', borderwidth=2, date_pattern='dd-mm-yyyy')
+        self.payment_date_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="اعتماد السيناريو كرواتب جديدة", command=self.commit).pack(side=tk.LEFT, padx=5)
+
+        self.evaluate()
+
+    def build_scenario(self):
+        def number(var):
+            text = var.get().strip()
+            return float(text) if text else None
+        try:
+            department_raises = {}
+            allowance_changes = {}
+            for department, (raise_var, allowance_var) in self.department_vars.items():
+                if number(raise_var) is not None:
+                    department_raises[department] = number(raise_var)
+                if number(allowance_var) is not None:
+                    allowance_changes[department] = number(allowance_var)
+            new_hires = []
+            department, count, basic, allowances, deductions = (var.get().strip() for var in self.hire_vars)
+            if count and basic:
+                new_hires.append((department, int(count), float(basic), float(allowances or 0), float(deductions or 0)))
+            return self.model.make_scenario(
+                number(self.default_raise_var) or 0, department_raises, allowance_changes, new_hires,
+                int(self.months_var.get()), number(self.annual_raise_var) or 0
+            )
+        except ValueError as e:
+            messagebox.showerror("خطأ في الإدخال", f"قيمة غير صحيحة: {e}", parent=self)
+            return None
+
+    def evaluate(self):
+        scenario = self.build_scenario()
+        if scenario is None:
+            return
+        self.table.delete(*self.table.get_children())
+        for row in self.model.evaluate_scenario(self.workforce, scenario):
+            self.table.insert("", "end", values=(row[0] or "بدون قسم",) + tuple(row[1:]))
+        set_status(f"تم تقييم السيناريو على {len(self.workforce)} موظف لمدة {scenario['months']} شهراً.")
+
+    def commit(self):
+        scenario = self.build_scenario()
+        if scenario is None:
+            return
+        payment_date = self.payment_date_entry.get_date().strftime("%d-%m-%Y")
+        dialog = CustomConfirmDialog(self, "تأكيد الاعتماد",
+                                     f"سيتم إضافة سجل راتب جديد بتاريخ {payment_date} لكل موظف ليس لديه راتب في ذلك الشهر.\nهل تريد المتابعة؟")
+        if not dialog.result:
+            return
+        try:
+            added, skipped = self.model.commit_scenario(self.workforce, scenario, payment_date)
+        except Exception as e:
+            messagebox.showerror("خطأ", str(e), parent=self)
+            return
+        load_salaries()
+        messagebox.showinfo("نجاح", f"تمت إضافة {added} سجل راتب، وتخطي {skipped} موظف لديهم راتب في نفس الشهر.", parent=self)
+        set_status(f"تم اعتماد سيناريو الرواتب: {added} سجل جديد.")
+
+# --- نافذة التعديل الجماعي للرواتب ---
+class SalaryAdjustmentDialog(tk.Toplevel):
+    """تطبيق زيادة أو خصم (نسبة أو مبلغ ثابت) على آخر راتب لكل موظف في قسم أو في الصفوف المحددة دفعة واحدة."""
+    FIELDS = {"الراتب الأساسي": "basic_salary", "البدلات": "allowances", "الخصومات": "deductions"}
+    MODES = {"نسبة مئوية (%)": "percent", "مبلغ ثابت": "fixed"}
+
+    def __init__(self, parent, selected_employee_ids):
+        super().__init__(parent)
+        self.title("تعديل جماعي للرواتب")
+        self.transient(parent)
+        self.grab_set()
+        self.selected_employee_ids = selected_employee_ids
+
+        self.field_var = tk.StringVar(value="الراتب الأساسي")
+        self.mode_var = tk.StringVar(value="نسبة مئوية (%)")
+        self.amount_var = tk.StringVar()
+        self.department_var = tk.StringVar(value="الكل")
+        self.selected_only_var = tk.BooleanVar(value=bool(selected_employee_ids))
+
+        form = ttk.Frame(self)
+        form.pack(padx=15, pady=10, fill="x")
+        ttk.Label(form, text="الحقل:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        ttk.Combobox(form, textvariable=self.field_var, values=list(self.FIELDS), state="readonly", width=20).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(form, text="نوع التعديل:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        ttk.Combobox(form, textvariable=self.mode_var, values=list(self.MODES), state="readonly", width=20).grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(form, text="القيمة (سالبة للتخفيض):").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        ttk.Entry(form, textvariable=self.amount_var, width=22).grid(row=2, column=1, padx=5, pady=5)
+        ttk.Label(form, text="القسم:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        department_menu = ttk.Combobox(form, textvariable=self.department_var, values=["الكل"] + get_all_departments(), state="readonly", width=20)
+        department_menu.grid(row=3, column=1, padx=5, pady=5)
+        department_menu.bind("<<ComboboxSelected>>", lambda e: self.update_preview())
+        selected_check = ttk.Checkbutton(form, text=f"الموظفون المحددون في الجدول فقط ({len(selected_employee_ids)})",
+                                         variable=self.selected_only_var, command=self.update_preview)
+        selected_check.grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+        if not selected_employee_ids:
+            selected_check.config(state="disabled")
+
+        self.preview_label = ttk.Label(self, text="", font=('Arial', 10, 'bold'))
+        self.preview_label.pack(padx=15, pady=5, anchor="w")
+
+        buttons_frame = ttk.Frame(self)
+        buttons_frame.pack(pady=10)
+        ttk.Button(buttons_frame, text="تطبيق", command=self.apply).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="إلغاء", command=self.destroy).pack(side=tk.LEFT, padx=5)
+
+        self.update_preview()
+
+    def scope(self):
+        employee_ids = self.selected_employee_ids if self.selected_only_var.get() else None
+        return self.department_var.get(), employee_ids
+
+    def update_preview(self):
+        department, employee_ids = self.scope()
+        try:
+            count = preview_salary_adjustment(department, employee_ids)
+        except Exception as e:
+            self.preview_label.config(text=f"تعذر حساب عدد السجلات: {e}")
+            return
+        self.preview_label.config(text=f"سيتم تعديل آخر راتب لـ {count} موظف.")
+
+    def apply(self):
+        department, employee_ids = self.scope()
+        field_label = self.field_var.get()
+        amount = self.amount_var.get().strip()
+        try:
+            count = preview_salary_adjustment(department, employee_ids)
+            if not count:
+                messagebox.showwarning("تحذير", "لا توجد سجلات رواتب ضمن النطاق المحدد.", parent=self)
+                return
+            dialog = CustomConfirmDialog(self, "تأكيد التعديل الجماعي",
+                                         f"سيتم تعديل {field_label} بمقدار {amount} في آخر راتب لـ {count} موظف.\nهل تريد المتابعة؟")
+            if not dialog.result:
+                return
+            updated = apply_salary_adjustment(self.FIELDS[field_label], self.MODES[self.mode_var.get()], amount, department, employee_ids)
+        except ValueError as e:
+            messagebox.showerror("خطأ في الإدخال", str(e), parent=self)
+            return
+        except Exception as e:
+            messagebox.showerror("خطأ", f"فشل التعديل الجماعي: {e}", parent=self)
+            return
+        load_salaries()
+        set_status(f"تم تعديل آخر راتب لـ {updated} موظف.")
+        messagebox.showinfo("نجاح", f"تم تعديل آخر راتب لـ {updated} موظف.", parent=self)
+        self.destroy()
+
+def show_salary_adjustment():
+    """فتح نافذة التعديل الجماعي مع الموظفين المحددين في جدول الرواتب (إن وجدوا)."""
+    selected_employee_ids = sorted({int(salary_table.item(item)['values'][10]) for item in salary_table.selection()})
+    SalaryAdjustmentDialog(root, selected_employee_ids)
+
+def show_payroll_projection():
+    """فتح نافذة توقعات الرواتب (تتطلب NumPy وقاعدة بيانات محلية)."""
+    if SERVER_URL:
+        messagebox.showwarning("غير متاح", "توقعات الرواتب متاحة فقط عند العمل على قاعدة بيانات محلية.")
+        return
+    try:
+        import payroll_model
+    except ImportError:
+        messagebox.showerror("خطأ", "توقعات الرواتب تتطلب مكتبة NumPy. يرجى تثبيتها: pip install numpy")
+        return
+    PayrollProjectionDialog(root, payroll_model)
+
+# --- دوال لوحة المعلومات ---
+# الأرقام تُقرأ من عدادات تحدثها مشغلات المستندات، فلا يُمسح جدول المستندات عند كل عرض.
+# الحالات مشتقة من اليوم الحالي، لذا يُعاد عرض اللوحة عند بداية كل يوم جديد وهي مفتوحة.
+DASHBOARD_CALENDAR_DAYS = 365
+HEATMAP_CELL = 14
+HEATMAP_EMPTY = "#eeeeee"
+HEATMAP_LOW = (255, 245, 204)    # لون "قرب الانتهاء" في جدول المستندات
+HEATMAP_HIGH = (204, 51, 51)
+# ترتيب صفوف أيام الأسبوع بدءاً من السبت (weekday(): الاثنين = 0)
+WEEKDAY_LABELS = ["السبت", "الأحد", "الاثنين", "الثلاثاء", "الأربعاء", "الخميس", "الجمعة"]
+dashboard_state = {"job": None, "cells": {}, "calendar": [], "today": None}
+
+def heatmap_color(count, peak):
+    """لون الخلية بتدرج من الأصفر الفاتح إلى الأحمر حسب نسبة العدد إلى أعلى عدد."""
+    if not count:
+        return HEATMAP_EMPTY
+    ratio = count / peak if peak else 1
+    return "#%02x%02x%02x" % tuple(round(low + (high - low) * ratio) for low, high in zip(HEATMAP_LOW, HEATMAP_HIGH))
+
+def draw_expiry_heatmap():
+    """رسم تقويم الانتهاء المحمل: أسبوع لكل عمود ويوم لكل صف، أو صف واحد بمجموع كل أسبوع."""
+    calendar, today = dashboard_state["calendar"], dashboard_state["today"]
+    if today is None:
+        return
+    heatmap_canvas.delete("all")
+    cells = dashboard_state["cells"] = {}
+    counts = dict(calendar)
+    weekly = heatmap_mode_var.get() == "أسبوعي"
+    # بداية الأسبوع (السبت) الذي يقع فيه اليوم
+    first_day = today - (datecodec.date_from_day(today).weekday() + 2) % 7
+    weeks = (today + DASHBOARD_CALENDAR_DAYS - first_day) // 7 + 1
+    left, top = 60, 20
+    if weekly:
+        totals = [sum(counts.get(day, 0) for day in range(first_day + week * 7, first_day + week * 7 + 7)) for week in range(weeks)]
+        peak = max(totals, default=0)
+        for week, total in enumerate(totals):
+            x = left + week * HEATMAP_CELL
+            item = heatmap_canvas.create_rectangle(x, top, x + HEATMAP_CELL - 2, top + HEATMAP_CELL * 3,
+                                                   fill=heatmap_color(total, peak), outline="")
+            week_start = max(first_day + week * 7, today)
+            cells[item] = f"أسبوع {datecodec.format_day(week_start)}: {total} مستند"
+    else:
+        peak = max(counts.values(), default=0)
+        for row, label in enumerate(WEEKDAY_LABELS):
+            heatmap_canvas.create_text(left - 5, top + row * HEATMAP_CELL + HEATMAP_CELL // 2, text=label, anchor="e", font=("Arial", 8))
+        for day in range(today, today + DASHBOARD_CALENDAR_DAYS + 1):
+            x = left + (day - first_day) // 7 * HEATMAP_CELL
+            y = top + (day - first_day) % 7 * HEATMAP_CELL
+            item = heatmap_canvas.create_rectangle(x, y, x + HEATMAP_CELL - 2, y + HEATMAP_CELL - 2,
+                                                   fill=heatmap_color(counts.get(day, 0), peak), outline="")
+            cells[item] = f"{datecodec.format_day(day)}: {counts.get(day, 0)} مستند"
+    # أسماء الأشهر فوق العمود الذي يبدأ فيه كل شهر
+    for day in range(today, today + DASHBOARD_CALENDAR_DAYS + 1):
+        current = datecodec.date_from_day(day)
+        if current.day == 1 or day == today:
+            x = left + (day - first_day) // 7 * HEATMAP_CELL
+            heatmap_canvas.create_text(x, top - 10, text=current.strftime("%m-%Y"), anchor="w", font=("Arial", 8))
+    heatmap_canvas.configure(scrollregion=heatmap_canvas.bbox("all"))
+
+def on_heatmap_motion(event):
+    items = heatmap_canvas.find_overlapping(heatmap_canvas.canvasx(event.x), heatmap_canvas.canvasy(event.y),
+                                            heatmap_canvas.canvasx(event.x), heatmap_canvas.canvasy(event.y))
+    text = next((dashboard_state["cells"][item] for item in items if item in dashboard_state["cells"]), "")
+    heatmap_info_label.config(text=text)
+
+def load_dashboard():
+    """عرض عدادات الحالة والفئات والجهات وتقويم الانتهاء، وجدولة إعادة العرض عند بداية اليوم التالي."""
+    if dashboard_state["job"] is not None:
+        root.after_cancel(dashboard_state["job"])
+        dashboard_state["job"] = None
+    try:
+        stats = get_dashboard_stats(NEAR_DAYS)
+        calendar = fetch_expiry_calendar(DASHBOARD_CALENDAR_DAYS)
+    except Exception as e:
+        messagebox.showerror("خطأ", f"حدث خطأ أثناء تحميل لوحة المعلومات: {e}")
+        set_status(f"خطأ في تحميل لوحة المعلومات: {e}")
+        return
+    for key, label in dashboard_counter_labels.items():
+        label.config(text=str(stats[key]))
+    for table, facet in ((dashboard_category_table, "category"), (dashboard_issuer_table, "issuer")):
+        table.delete(*table.get_children())
+        for value, count in stats[facet]:
+            table.insert("", "end", values=(value or "بدون", count))
+    dashboard_state.update(calendar=calendar, today=stats["today"])
+    draw_expiry_heatmap()
+    dashboard_state["job"] = root.after(milliseconds_until(stats["today"] + 1) + 1000, dashboard_rollover)
+    set_status(f"لوحة المعلومات: {stats['total']} مستند.")
+
+def dashboard_rollover():
+    dashboard_state["job"] = None
+    if notebook.tab(notebook.select(), "text") == "لوحة المعلومات":
+        load_dashboard()
 
 # --- دوال عامة للتبويبات ---
 def handle_tab_change(event):
@@ -944,24 +1685,18 @@ def handle_tab_change(event):
     elif selected_tab == "المدة المتبقية":
         load_remaining_time_documents()
     elif selected_tab == "الرواتب":
-        update_employee_salary_options()
         update_department_salary_filter_options()
         load_salaries()
+    elif selected_tab == "لوحة المعلومات":
+        load_dashboard()
 
 # --- تنبيه بانتهاء المستندات (يتم استدعاؤها عند بدء التشغيل) ---
 def alert_expiring_documents():
     """إظهار تنبيه للمستندات المنتهية أو القريبة من الانتهاء."""
     try:
         set_status("جاري التحقق من صلاحية المستندات...")
-        with sqlite3.connect("document_management.db") as conn:
-            cursor = conn.cursor()
-            today = datetime.today().date()
-            upcoming = today + timedelta(days=90)
-            cursor.execute("SELECT COUNT(*) FROM documents WHERE expiry_date IS NOT NULL AND date(expiry_date) < ?", (today.isoformat(),))
-            expired_count = cursor.fetchone()[0]
-            cursor.execute("SELECT COUNT(*) FROM documents WHERE expiry_date IS NOT NULL AND date(expiry_date) BETWEEN ? AND ?", (today.isoformat(), upcoming.isoformat()))
-            near_expiry_count = cursor.fetchone()[0]
-        
+        expired_count, near_expiry_count = count_expiring_documents(90)
+
         message = ""
         if expired_count:
             message += f"انتهت صلاحية {expired_count} مستند/ات.\n"
@@ -977,6 +1712,380 @@ def alert_expiring_documents():
         messagebox.showerror("خطأ في التنبيه", f"حدث خطأ أثناء التحقق من صلاحية المستندات: {e}")
         set_status(f"خطأ في التنبيه: {e}")
 
+# --- نافذة تشخيص الاستعلامات ---
+class QueryDiagnosticsDialog(tk.Toplevel):
+    """نافذة تعرض عدادات الاستعلامات ومخطط زمن الاستجابة مع إمكانية الحفظ إلى ملف."""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("تشخيص الاستعلامات")
+        self.geometry("1000x550")
+        self.transient(parent)
+
+        self.summary_label = ttk.Label(self, text="", font=('Arial', 10, 'bold'))
+        self.summary_label.pack(padx=10, pady=5, anchor="w")
+
+        histogram_frame = ttk.LabelFrame(self, text="توزيع زمن الاستجابة")
+        histogram_frame.pack(padx=10, pady=5, fill="x")
+        self.histogram_table = ttk.Treeview(histogram_frame, columns=("الفئة", "العدد"), show="headings", height=8)
+        for col in self.histogram_table["columns"]:
+            self.histogram_table.heading(col, text=col)
+            self.histogram_table.column(col, width=150, anchor="center")
+        self.histogram_table.pack(fill="x")
+
+        statements_frame = ttk.LabelFrame(self, text="الاستعلامات (مرتبة حسب الزمن الكلي)")
+        statements_frame.pack(padx=10, pady=5, fill="both", expand=True)
+        columns = ("العدد", "الزمن الكلي (ms)", "المتوسط (ms)", "الأقصى (ms)", "الصفوف", "بطيئة", "أخطاء", "الاستعلام")
+        self.statements_table = ttk.Treeview(statements_frame, columns=columns, show="headings")
+        for col in columns:
+            self.statements_table.heading(col, text=col, command=lambda _col=col: treeview_sort_column(self.statements_table, _col, False))
+            self.statements_table.column(col, width=80, anchor="center")
+        self.statements_table.column("الاستعلام", width=450, anchor="w")
+        self.statements_table.pack(fill="both", expand=True)
+
+        buttons_frame = ttk.Frame(self)
+        buttons_frame.pack(pady=5)
+        ttk.Button(buttons_frame, text="تحديث", command=self.refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="حفظ إلى ملف", command=self.save_to_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="تصفير العدادات", command=self.reset).pack(side=tk.LEFT, padx=5)
+
+        self.refresh()
+
+    def refresh(self):
+        snapshot = get_metrics_snapshot()
+        totals = snapshot["totals"]
+        self.summary_label.config(text=(
+            f"منذ {snapshot['since']} — استعلامات: {totals['queries']}، بطيئة (>= {snapshot['slow_threshold_ms']:.0f} ms): {totals['slow']}، "
+            f"أخطاء: {totals['errors']}، الزمن الكلي: {totals['time_ms']:.1f} ms"
+        ))
+        self.histogram_table.delete(*self.histogram_table.get_children())
+        for label, count in snapshot["histogram"]:
+            self.histogram_table.insert("", "end", values=(label, count))
+        self.statements_table.delete(*self.statements_table.get_children())
+        for stats in snapshot["statements"]:
+            self.statements_table.insert("", "end", values=(
+                stats["count"], f"{stats['total_ms']:.2f}", f"{stats['avg_ms']:.2f}", f"{stats['max_ms']:.2f}",
+                stats["rows"], stats["slow"], stats["errors"], stats["statement"]
+            ))
+
+    def save_to_file(self):
+        filepath = filedialog.asksaveasfilename(
+            parent=self,
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
+            title="حفظ إحصاءات الاستعلامات"
+        )
+        if not filepath:
+            return
+        try:
+            dump_metrics(filepath)
+            set_status(f"تم حفظ إحصاءات الاستعلامات إلى: {filepath}")
+        except Exception as e:
+            messagebox.showerror("خطأ", f"فشل حفظ الإحصاءات: {e}", parent=self)
+
+    def reset(self):
+        reset_metrics()
+        self.refresh()
+
+def show_query_diagnostics():
+    """فتح نافذة تشخيص الاستعلامات."""
+    QueryDiagnosticsDialog(root)
+
+class AttachmentIntegrityDialog(tk.Toplevel):
+    """نافذة فحص سلامة المرفقات: تشغيل الفحص في الخلفية ومتابعة التقدم والمشكلات المكتشفة."""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("فحص سلامة المرفقات")
+        self.geometry("900x450")
+        self.transient(parent)
+        self.check = None
+
+        options_frame = ttk.Frame(self)
+        options_frame.pack(padx=10, pady=5, fill="x")
+        self.repair_var = tk.BooleanVar(value=False)
+        self.hashes_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="إصلاح (حذف سجلات المستندات المحذوفة ونقل الملفات اليتيمة إلى الحجر)", variable=self.repair_var).pack(side=tk.RIGHT, padx=5)
+        ttk.Checkbutton(options_frame, text="التحقق من البصمة (أبطأ)", variable=self.hashes_var).pack(side=tk.RIGHT, padx=5)
+
+        self.progress_label = ttk.Label(self, text="", font=('Arial', 10, 'bold'))
+        self.progress_label.pack(padx=10, pady=5, anchor="w")
+
+        columns = ("المشكلة", "ID المرفق", "المسار", "تفاصيل")
+        self.issues_table = ttk.Treeview(self, columns=columns, show="headings")
+        for col in columns:
+            self.issues_table.heading(col, text=col, command=lambda _col=col: treeview_sort_column(self.issues_table, _col, False))
+            self.issues_table.column(col, width=120, anchor="center")
+        self.issues_table.column("المسار", width=450, anchor="w")
+        self.issues_table.pack(padx=10, pady=5, fill="both", expand=True)
+
+        buttons_frame = ttk.Frame(self)
+        buttons_frame.pack(pady=5)
+        self.start_button = ttk.Button(buttons_frame, text="بدء الفحص", command=self.start)
+        self.start_button.pack(side=tk.LEFT, padx=5)
+        self.stop_button = ttk.Button(buttons_frame, text="إيقاف", command=self.stop, state="disabled")
+        self.stop_button.pack(side=tk.LEFT, padx=5)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def start(self):
+        from attachment_integrity import AttachmentIntegrityCheck
+        self.issues_table.delete(*self.issues_table.get_children())
+        self.check = AttachmentIntegrityCheck(repair=self.repair_var.get(), verify_hashes=self.hashes_var.get()).start()
+        self.start_button.config(state="disabled")
+        self.stop_button.config(state="normal")
+        set_status("جاري فحص سلامة المرفقات في الخلفية...")
+        self.poll()
+
+    def stop(self):
+        if self.check is not None:
+            self.check.stop()
+
+    def close(self):
+        self.stop()
+        self.destroy()
+
+    def poll(self):
+        if not self.winfo_exists():
+            return
+        progress, issues = self.check.snapshot()
+        shown = len(self.issues_table.get_children())
+        for issue in issues[shown:]:
+            self.issues_table.insert("", "end", values=issue)
+        self.progress_label.config(text=(
+            f"السجلات المفحوصة: {progress['rows']}، الملفات المفحوصة: {progress['files']}، "
+            f"المشكلات: {len(issues)}، المصلحة: {progress['repaired']}"
+        ))
+        if self.check.is_running():
+            self.after(500, self.poll)
+            return
+        self.start_button.config(state="normal")
+        self.stop_button.config(state="disabled")
+        if self.check.error is not None:
+            messagebox.showerror("خطأ", f"توقف الفحص بسبب خطأ: {self.check.error}", parent=self)
+        set_status(f"انتهى فحص المرفقات: {len(issues)} مشكلة، تم إصلاح {progress['repaired']}.")
+        selected = doc_table.selection()
+        if progress["repaired"] and selected:
+            load_attachments(doc_table.item(selected[0])['values'][0])
+
+def show_attachment_integrity():
+    """فتح نافذة فحص سلامة المرفقات (محلياً فقط، إذ يحتاج الوصول إلى مجلد المرفقات)."""
+    AttachmentIntegrityDialog(root)
+
+# --- صيانة قاعدة البيانات ---
+def format_megabytes(size):
+    return f"{size / (1024 * 1024):.1f} ميجابايت"
+
+class DatabaseMaintenanceDialog(tk.Toplevel):
+    """نافذة تشخيص ملف القاعدة: الحجم والصفحات الحرة والتجزئة، مع استعادة المساحة وفحص السلامة في الخلفية."""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("صيانة قاعدة البيانات")
+        self.geometry("650x420")
+        self.transient(parent)
+        self.task = None
+        self.results = queue.Queue()
+
+        self.stats_table = ttk.Treeview(self, columns=("المؤشر", "القيمة"), show="headings", height=11)
+        self.stats_table.heading("المؤشر", text="المؤشر")
+        self.stats_table.heading("القيمة", text="القيمة")
+        self.stats_table.column("المؤشر", width=180, anchor="w")
+        self.stats_table.column("القيمة", width=420, anchor="w")
+        self.stats_table.pack(padx=10, pady=5, fill="both", expand=True)
+
+        self.progress_label = ttk.Label(self, text="", font=('Arial', 10, 'bold'))
+        self.progress_label.pack(padx=10, pady=5, anchor="w")
+
+        buttons_frame = ttk.Frame(self)
+        buttons_frame.pack(pady=5)
+        self.task_buttons = [
+            ttk.Button(buttons_frame, text="قياس التجزئة", command=lambda: self.run_task("fragmentation")),
+            ttk.Button(buttons_frame, text="استعادة المساحة الآن", command=lambda: self.run_task("vacuum")),
+            ttk.Button(buttons_frame, text="فحص السلامة الآن", command=lambda: self.run_task("check")),
+        ]
+        ttk.Button(buttons_frame, text="تحديث", command=self.refresh).pack(side=tk.LEFT, padx=5)
+        for button in self.task_buttons:
+            button.pack(side=tk.LEFT, padx=5)
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def refresh(self, stats=None):
+        import db_maintenance
+        stats = stats or db_maintenance.database_stats()
+        fragmentation = stats.get("fragmentation")
+        rows = [
+            ("الملف", stats["path"]),
+            ("حجم الملف", format_megabytes(stats["file_size"])),
+            ("حجم WAL", format_megabytes(stats["wal_size"])),
+            ("عدد الصفحات", f"{stats['page_count']} × {stats['page_size']} بايت"),
+            ("الصفحات الحرة", f"{stats['freelist_count']} ({stats['free_ratio']:.1%}، {format_megabytes(stats['free_bytes'])})"),
+            ("التجزئة", "" if "fragmentation" not in stats else ("غير مدعومة" if fragmentation is None else f"{fragmentation:.1%}")),
+            ("auto_vacuum", stats["auto_vacuum"]),
+            ("وضع السجل", stats["journal_mode"]),
+            ("آخر تحديث للإحصاءات", stats["last_analyze"]),
+            ("آخر فحص سلامة", stats["last_check"]),
+            ("نتيجة آخر فحص", stats["last_check_result"]),
+        ]
+        self.stats_table.delete(*self.stats_table.get_children())
+        for row in rows:
+            self.stats_table.insert("", "end", values=row)
+
+    def run_task(self, kind):
+        """تشغيل مهمة صيانة في خيط خلفي؛ poll يعرض التقدم والنتيجة."""
+        import db_maintenance
+
+        def worker():
+            try:
+                if kind == "fragmentation":
+                    self.results.put(("stats", db_maintenance.database_stats(measure_fragmentation=True)))
+                elif kind == "vacuum":
+                    reclaimed = 0
+                    while not self.stopped.is_set():
+                        pages = db_maintenance.reclaim_free_pages()
+                        if not pages:
+                            break
+                        reclaimed += pages
+                        self.results.put(("progress", f"الصفحات المستعادة: {reclaimed}"))
+                    self.results.put(("done", f"تمت استعادة {reclaimed} صفحة حرة."))
+                else:
+                    problems = self.check.run()
+                    self.results.put(("done", "القاعدة سليمة." if not problems else f"وُجدت {len(problems)} مشكلة: {problems[0]}"))
+            except Exception as e:
+                self.results.put(("error", e))
+
+        self.stopped = threading.Event()
+        self.check = db_maintenance.IntegrityCheck() if kind == "check" else None
+        for button in self.task_buttons:
+            button.config(state="disabled")
+        self.progress_label.config(text="جاري التنفيذ في الخلفية...")
+        self.task = threading.Thread(target=worker, name="dms-db-maintenance-task", daemon=True)
+        self.task.start()
+        self.poll()
+
+    def close(self):
+        if self.task is not None:
+            self.stopped.set()
+            if self.check is not None:
+                self.check.stop()
+        self.destroy()
+
+    def poll(self):
+        if not self.winfo_exists():
+            return
+        if self.check is not None:
+            progress, problems = self.check.snapshot()
+            self.progress_label.config(text=f"الجداول المفحوصة: {progress['tables']}/{progress['total']}، المشكلات: {len(problems)}")
+        while not self.results.empty():
+            kind, payload = self.results.get_nowait()
+            if kind == "progress":
+                self.progress_label.config(text=payload)
+            elif kind == "stats":
+                self.progress_label.config(text="")
+                self.refresh(payload)
+            elif kind == "done":
+                self.progress_label.config(text=payload)
+                set_status(payload)
+                self.refresh()
+            else:
+                self.progress_label.config(text="")
+                messagebox.showerror("خطأ", f"فشلت مهمة الصيانة: {payload}", parent=self)
+        if self.task.is_alive() or not self.results.empty():
+            self.after(300, self.poll)
+            return
+        for button in self.task_buttons:
+            button.config(state="normal")
+
+def show_database_maintenance():
+    """فتح نافذة صيانة قاعدة البيانات (محلياً فقط، إذ تعمل على ملف القاعدة مباشرة)."""
+    DatabaseMaintenanceDialog(root)
+
+# --- النسخ الاحتياطي ---
+backup_results = queue.Queue()
+
+def run_backup_now():
+    """إنشاء نسخة احتياطية في خيط خلفي مع متابعة التقدم في شريط الحالة."""
+    import backup
+
+    def progress(stage, done, total):
+        backup_results.put(("progress", f"{'قاعدة البيانات' if stage == 'database' else 'المرفقات'}: {done}/{total}"))
+
+    def worker():
+        try:
+            backup_results.put(("done", backup.create_backup(progress=progress)))
+        except Exception as e:
+            backup_results.put(("error", e))
+
+    threading.Thread(target=worker, name="dms-backup", daemon=True).start()
+    set_status("جاري إنشاء نسخة احتياطية...")
+
+def poll_backup_results():
+    """عرض نتائج النسخ الاحتياطي (اليدوي أو المجدول) القادمة من الخيوط الخلفية."""
+    while not backup_results.empty():
+        kind, payload = backup_results.get_nowait()
+        if kind == "progress":
+            set_status(f"جاري النسخ الاحتياطي — {payload}")
+        elif kind == "done":
+            set_status(f"تم إنشاء النسخة الاحتياطية: {payload}")
+            messagebox.showinfo("نجاح", f"تم إنشاء النسخة الاحتياطية في:\n{payload}")
+        else:
+            set_status(f"فشل النسخ الاحتياطي: {payload}")
+            messagebox.showerror("خطأ", f"فشل النسخ الاحتياطي: {payload}")
+    root.after(500, poll_backup_results)
+
+def restore_from_backup():
+    """استعادة نسخة احتياطية يختارها المستخدم بعد التحقق منها."""
+    import backup
+    import db_registry
+    backup_path = filedialog.askdirectory(title="اختر مجلد النسخة الاحتياطية", initialdir=db_registry.backups_dir())
+    if not backup_path:
+        return
+    dialog = CustomConfirmDialog(root, "تأكيد الاستعادة", "سيتم استبدال محتوى قاعدة البيانات الحالية بمحتوى النسخة المختارة.\nهل تريد المتابعة؟")
+    if not dialog.result:
+        return
+    set_status("جاري التحقق من النسخة واستعادتها...")
+    try:
+        restored = backup.restore_backup(backup_path)
+        handle_tab_change(None)
+        messagebox.showinfo("نجاح", f"تمت الاستعادة بنجاح ({restored} مرفق مستعاد).")
+        set_status("تمت استعادة النسخة الاحتياطية.")
+    except Exception as e:
+        messagebox.showerror("خطأ", f"فشلت الاستعادة: {e}")
+        set_status(f"فشلت الاستعادة: {e}")
+
+# --- أرشفة السنوات المغلقة ---
+ARCHIVE_KIND_LABELS = {"salaries": "رواتب", "documents": "مستندات منتهية"}
+
+def archive_closed_years_now():
+    """نقل رواتب السنوات المغلقة والمستندات المنتهية منذ زمن إلى قواعد الأرشيف بعد التأكيد."""
+    years = archivable_years()
+    if not years:
+        messagebox.showinfo("الأرشفة", "لا توجد سنوات مغلقة تحتاج إلى أرشفة.")
+        return
+    listing = "\n".join(f"{year}: {ARCHIVE_KIND_LABELS[kind]}" for year, kind in years)
+    dialog = CustomConfirmDialog(root, "تأكيد الأرشفة", f"سيتم نقل البيانات التالية إلى قواعد الأرشيف:\n{listing}\nهل تريد المتابعة؟")
+    if not dialog.result:
+        return
+    set_status("جاري أرشفة السنوات المغلقة...")
+    try:
+        results = archive_closed_years()
+        moved = sum(count for _, _, count in results)
+        handle_tab_change(None)
+        messagebox.showinfo("نجاح", f"تمت أرشفة {moved} سجل من {len(results)} سنة/سنوات.\nاستخدم خيار تضمين الأرشيف لعرضها.")
+        set_status(f"تمت أرشفة {moved} سجل.")
+    except Exception as e:
+        messagebox.showerror("خطأ", f"فشلت الأرشفة: {e}")
+        set_status(f"فشلت الأرشفة: {e}")
+
+# --- شريط القوائم ---
+menubar = tk.Menu(root)
+tools_menu = tk.Menu(menubar, tearoff=0)
+tools_menu.add_command(label="تشخيص الاستعلامات", command=show_query_diagnostics)
+tools_menu.add_command(label="فحص سلامة المرفقات", command=show_attachment_integrity, state="disabled" if SERVER_URL else "normal")
+tools_menu.add_command(label="صيانة قاعدة البيانات", command=show_database_maintenance, state="disabled" if SERVER_URL else "normal")
+tools_menu.add_command(label="أرشفة السنوات المغلقة...", command=archive_closed_years_now)
+tools_menu.add_separator()
+tools_menu.add_command(label="نسخ احتياطي الآن", command=run_backup_now, state="disabled" if SERVER_URL else "normal")
+tools_menu.add_command(label="استعادة نسخة احتياطية...", command=restore_from_backup, state="disabled" if SERVER_URL else "normal")
+menubar.add_cascade(label="أدوات", menu=tools_menu)
+root.config(menu=menubar)
+
 
 # --- إنشاء التبويبات والواجهة الرئيسية ---
 notebook = ttk.Notebook(root)
@@ -993,6 +2102,9 @@ doc_input_frame.pack(padx=10, pady=10, fill="x", expand=False)
 search_var = tk.StringVar()
 filter_var = tk.StringVar(value="الكل")
 category_filter_var = tk.StringVar(value="الكل")
+tag_filter_var = tk.StringVar(value="الكل")
+content_search_var = tk.BooleanVar(value=False)
+include_archives_var = tk.BooleanVar(value=False)
 
 ttk.Label(doc_input_frame, text="بحث:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
 search_entry = ttk.Entry(doc_input_frame, textvariable=search_var, width=30)
@@ -1006,6 +2118,14 @@ ttk.Label(doc_input_frame, text="تصفية حسب الفئة:").grid(row=0, col
 category_filter_menu = ttk.Combobox(doc_input_frame, textvariable=category_filter_var, state="readonly", width=15)
 category_filter_menu.grid(row=0, column=5, padx=5, pady=5, sticky="we")
 
+ttk.Label(doc_input_frame, text="تصفية حسب العلامة:").grid(row=0, column=6, padx=5, pady=5, sticky="e")
+tag_filter_menu = ttk.Combobox(doc_input_frame, textvariable=tag_filter_var, state="readonly", width=15)
+tag_filter_menu.grid(row=0, column=7, padx=5, pady=5, sticky="we")
+ttk.Checkbutton(doc_input_frame, text="البحث في محتوى المرفقات", variable=content_search_var,
+                command=search_documents).grid(row=1, column=3, columnspan=2, padx=5, pady=5, sticky="w")
+ttk.Checkbutton(doc_input_frame, text="تضمين المستندات المؤرشفة", variable=include_archives_var,
+                command=search_documents).grid(row=1, column=5, columnspan=2, padx=5, pady=5, sticky="w")
+
 # الحقول
 entry_name = ttk.Entry(doc_input_frame)
 entry_number = ttk.Entry(doc_input_frame)
@@ -1025,7 +2145,7 @@ for i, (label_text, entry_widget) in enumerate(zip(labels, entries), start=1):
 
 # منطقة أزرار الإدارة للمستندات
 doc_buttons_frame = ttk.Frame(doc_input_frame)
-doc_buttons_frame.grid(row=len(labels) + 1, column=0, columnspan=6, pady=10, sticky="ew")
+doc_buttons_frame.grid(row=len(labels) + 1, column=0, columnspan=8, pady=10, sticky="ew")
 
 ttk.Button(doc_buttons_frame, text="حفظ", command=save_document).pack(side=tk.LEFT, padx=5, expand=True)
 ttk.Button(doc_buttons_frame, text="تعديل", command=update_selected_document).pack(side=tk.LEFT, padx=5, expand=True)
@@ -1060,7 +2180,7 @@ ttk.Button(attachment_buttons_frame, text="حذف جميع المرفقات", co
 doc_table_frame = ttk.Frame(doc_tab)
 doc_table_frame.pack(padx=10, pady=10, fill="both", expand=True)
 
-doc_table = ttk.Treeview(doc_table_frame, columns=("id", "الاسم", "الرقم", "تاريخ الإصدار", "تاريخ الانتهاء", "الجهة", "الفئة", "العلامات"), show="headings")
+doc_table = ttk.Treeview(doc_table_frame, columns=("id", "الاسم", "الرقم", "تاريخ الإصدار", "تاريخ الانتهاء", "الجهة", "الفئة", "العلامات", "المرفقات"), show="headings")
 for col in doc_table["columns"]:
     doc_table.heading(col, text=col, command=lambda _col=col: treeview_sort_column(doc_table, _col, False))
     doc_table.column(col, anchor="center")
@@ -1073,6 +2193,7 @@ doc_table.column("تاريخ الانتهاء", width=100)
 doc_table.column("الجهة", width=120)
 doc_table.column("الفئة", width=80)
 doc_table.column("العلامات", width=150)
+doc_table.column("المرفقات", width=60)
 
 
 doc_table.tag_configure("expired", background="#ffcccc")
@@ -1084,7 +2205,8 @@ doc_table.pack(fill="both", expand=True)
 # شريط التمرير للجدول
 doc_table_scrollbar_y = ttk.Scrollbar(doc_table_frame, orient="vertical", command=doc_table.yview)
 doc_table_scrollbar_y.pack(side="right", fill="y")
-doc_table.configure(yscrollcommand=doc_table_scrollbar_y.set)
+# التمرير (وإضافة الصفوف) يحمّل مرفقات الصفوف الظاهرة مسبقاً
+doc_table.configure(yscrollcommand=on_document_table_scroll)
 
 doc_table_scrollbar_x = ttk.Scrollbar(doc_table_frame, orient="horizontal", command=doc_table.xview)
 doc_table_scrollbar_x.pack(side="bottom", fill="x")
@@ -1092,9 +2214,11 @@ doc_table.configure(xscrollcommand=doc_table_scrollbar_x.set)
 
 # ربط الأحداث للمستندات
 doc_table.bind("<Double-1>", lambda e: populate_form_from_selection())
+doc_table.bind("<<TreeviewSelect>>", on_document_selected)
 search_entry.bind("<KeyRelease>", lambda e: search_documents())
 filter_menu.bind("<<ComboboxSelected>>", lambda e: search_documents())
 category_filter_menu.bind("<<ComboboxSelected>>", lambda e: search_documents())
+tag_filter_menu.bind("<<ComboboxSelected>>", lambda e: search_documents())
 attachments_table.bind("<Double-1>", lambda e: open_selected_attachment())
 
 
@@ -1157,6 +2281,31 @@ emp_table.configure(xscrollcommand=emp_table_scrollbar_x.set)
 
 # ربط الأحداث للموظفين
 emp_table.bind("<Double-1>", lambda e: populate_employee_form_from_selection())
+emp_table.bind("<<TreeviewSelect>>", on_employee_selected)
+
+# لوحة ملف الموظف المحدد: مستنداته مع عدد مرفقاتها وسجل رواتبه
+dossier_frame = ttk.LabelFrame(emp_tab, text="ملف الموظف")
+dossier_frame.pack(padx=10, pady=(0, 10), fill="both", expand=True)
+dossier_status_label = ttk.Label(dossier_frame, text="حدد موظفاً لعرض مستنداته ورواتبه.")
+dossier_status_label.pack(fill="x", padx=5, pady=2)
+dossier_notebook = ttk.Notebook(dossier_frame)
+dossier_notebook.pack(fill="both", expand=True, padx=5, pady=5)
+
+dossier_documents_table = ttk.Treeview(dossier_notebook, columns=(
+    "id", "الاسم", "الرقم", "تاريخ الإصدار", "تاريخ الانتهاء", "الفئة", "المرفقات"
+), show="headings", height=6)
+dossier_salaries_table = ttk.Treeview(dossier_notebook, columns=(
+    "id", "الراتب الأساسي (شهري)", "الراتب الأساسي (سنوي)", "البدلات", "الخصومات", "صافي الراتب", "طريقة الدفع", "تاريخ الدفع"
+), show="headings", height=6)
+for dossier_table, title in ((dossier_documents_table, "المستندات"), (dossier_salaries_table, "الرواتب")):
+    for col in dossier_table["columns"]:
+        dossier_table.heading(col, text=col, command=lambda _table=dossier_table, _col=col: treeview_sort_column(_table, _col, False))
+        dossier_table.column(col, width=100, anchor="center")
+    dossier_table.column("id", width=40)
+    dossier_notebook.add(dossier_table, text=title)
+dossier_documents_table.tag_configure("expired", background="#ffcccc")
+dossier_documents_table.tag_configure("near", background="#fff5cc")
+dossier_documents_table.tag_configure("valid", background="#ccffcc")
 
 
 # --- تبويب سجل التدقيق ---
@@ -1226,8 +2375,10 @@ salary_input_frame.pack(padx=10, pady=10, fill="x", expand=False)
 
 # حقل اختيار الموظف
 ttk.Label(salary_input_frame, text="الموظف:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
-emp_id_salary_combobox = ttk.Combobox(salary_input_frame, state="readonly", width=40)
-emp_id_salary_combobox.grid(row=0, column=1, columnspan=2, padx=5, pady=5, sticky="we")
+# فهرس بادئات في الذاكرة لا يُعاد بناؤه إلا عند تغير الموظفين (عبر سجل التغييرات)
+employee_index = EmployeeIndex(fetch_all_employees)
+employee_picker = EmployeePicker(salary_input_frame, employee_index, width=40)
+employee_picker.grid(row=0, column=1, columnspan=2, padx=5, pady=5, sticky="we")
 
 # حقول الراتب الأساسي الشهري والسنوي
 monthly_basic_salary_var = tk.StringVar()
@@ -1278,6 +2429,9 @@ department_salary_filter_var = tk.StringVar(value="الكل")
 department_salary_filter_combobox = ttk.Combobox(salary_input_frame, textvariable=department_salary_filter_var, state="readonly", width=20)
 department_salary_filter_combobox.grid(row=3, column=3, columnspan=2, padx=5, pady=5, sticky="we")
 department_salary_filter_combobox.bind("<<ComboboxSelected>>", lambda e: load_salaries())
+include_salary_archives_var = tk.BooleanVar(value=False)
+ttk.Checkbutton(salary_input_frame, text="تضمين السنوات المؤرشفة", variable=include_salary_archives_var,
+                command=load_salaries).grid(row=4, column=3, columnspan=2, padx=5, pady=5, sticky="w")
 
 # أزرار الرواتب
 salary_buttons_frame = ttk.Frame(salary_input_frame)
@@ -1289,6 +2443,9 @@ ttk.Button(salary_buttons_frame, text="حذف راتب", command=delete_selected
 ttk.Button(salary_buttons_frame, text="مسح حقول الراتب", command=clear_salary_fields).pack(side=tk.LEFT, padx=5, expand=True)
 ttk.Button(salary_buttons_frame, text="تصدير الرواتب", command=export_salaries_to_excel).pack(side=tk.LEFT, padx=5, expand=True)
 ttk.Button(salary_buttons_frame, text="إعداد رواتب الشهر الحالي", command=prepare_monthly_salaries_for_all).pack(side=tk.LEFT, padx=5, expand=True) # New button
+ttk.Button(salary_buttons_frame, text="ملخص الرواتب", command=show_payroll_summary).pack(side=tk.LEFT, padx=5, expand=True)
+ttk.Button(salary_buttons_frame, text="توقعات الرواتب", command=show_payroll_projection).pack(side=tk.LEFT, padx=5, expand=True)
+ttk.Button(salary_buttons_frame, text="تعديل جماعي", command=show_salary_adjustment).pack(side=tk.LEFT, padx=5, expand=True)
 
 # جدول الرواتب
 salary_table_frame = ttk.Frame(salary_tab)
@@ -1328,12 +2485,209 @@ salary_table.configure(xscrollcommand=salary_table_scrollbar_x.set)
 salary_table.bind("<Double-1>", lambda e: populate_salary_form_from_selection())
 
 
-# ربط تحميل سجل التدقيق والمدة المتبقية والرواتب عند التبديل إلى التبويب
+# --- تبويب لوحة المعلومات ---
+dashboard_tab = ttk.Frame(notebook)
+notebook.add(dashboard_tab, text="لوحة المعلومات")
+
+dashboard_counters_frame = ttk.LabelFrame(dashboard_tab, text="حالة المستندات")
+dashboard_counters_frame.pack(padx=10, pady=10, fill="x")
+dashboard_counter_labels = {}
+for column, (key, title, color) in enumerate([
+    ("total", "الإجمالي", "#e8e8e8"),
+    ("expired", "منتهية", "#ffcccc"),
+    ("near", f"قرب الانتهاء ({NEAR_DAYS} يوماً)", "#fff5cc"),
+    ("valid", "صالحة", "#ccffcc"),
+    ("no_expiry", "بدون تاريخ انتهاء", "#e8e8e8"),
+]):
+    counter_frame = tk.Frame(dashboard_counters_frame, background=color, padx=15, pady=8)
+    counter_frame.grid(row=0, column=column, padx=5, pady=5, sticky="nsew")
+    dashboard_counters_frame.columnconfigure(column, weight=1)
+    tk.Label(counter_frame, text=title, background=color).pack()
+    dashboard_counter_labels[key] = tk.Label(counter_frame, text="0", background=color, font=("Arial", 16, "bold"))
+    dashboard_counter_labels[key].pack()
+
+dashboard_facets_frame = ttk.Frame(dashboard_tab)
+dashboard_facets_frame.pack(padx=10, pady=5, fill="both", expand=True)
+dashboard_tables = []
+for title, column_title in (("أكثر الفئات", "الفئة"), ("أكثر جهات الإصدار", "جهة الإصدار")):
+    facet_frame = ttk.LabelFrame(dashboard_facets_frame, text=title)
+    facet_frame.pack(side=tk.LEFT, padx=5, fill="both", expand=True)
+    facet_table = ttk.Treeview(facet_frame, columns=(column_title, "العدد"), show="headings", height=8)
+    for col in (column_title, "العدد"):
+        facet_table.heading(col, text=col, command=lambda _table=facet_table, _col=col: treeview_sort_column(_table, _col, False))
+    facet_table.column(column_title, width=250, anchor="w")
+    facet_table.column("العدد", width=80, anchor="center")
+    facet_table.pack(fill="both", expand=True)
+    dashboard_tables.append(facet_table)
+dashboard_category_table, dashboard_issuer_table = dashboard_tables
+
+heatmap_frame = ttk.LabelFrame(dashboard_tab, text=f"تقويم الانتهاء ({DASHBOARD_CALENDAR_DAYS} يوماً القادمة)")
+heatmap_frame.pack(padx=10, pady=10, fill="x")
+heatmap_controls = ttk.Frame(heatmap_frame)
+heatmap_controls.pack(fill="x")
+heatmap_mode_var = tk.StringVar(value="يومي")
+for mode in ("يومي", "أسبوعي"):
+    ttk.Radiobutton(heatmap_controls, text=mode, value=mode, variable=heatmap_mode_var, command=draw_expiry_heatmap).pack(side=tk.LEFT, padx=5)
+heatmap_info_label = ttk.Label(heatmap_controls, text="")
+heatmap_info_label.pack(side=tk.RIGHT, padx=10)
+heatmap_canvas = tk.Canvas(heatmap_frame, height=HEATMAP_CELL * 7 + 30, background="white", highlightthickness=0)
+heatmap_canvas.pack(fill="x", expand=True)
+heatmap_scrollbar_x = ttk.Scrollbar(heatmap_frame, orient="horizontal", command=heatmap_canvas.xview)
+heatmap_scrollbar_x.pack(fill="x")
+heatmap_canvas.configure(xscrollcommand=heatmap_scrollbar_x.set)
+heatmap_canvas.bind("<Motion>", on_heatmap_motion)
+
+
+# ربط تحميل سجل التدقيق والمدة المتبقية والرواتب ولوحة المعلومات عند التبديل إلى التبويب
 notebook.bind("<<NotebookTabChanged>>", lambda event: handle_tab_change(event))
 
+# --- تحديث الجداول المفتوحة من سجل التغييرات ---
+# الواجهة تتذكر آخر رقم تغيير طبقته؛ الاستطلاع الدوري يسأل عن MAX(change_id) فقط، وعند
+# وجود جديد تُجلب الصفوف المتغيرة وحدها وتُحدث في الجداول دون إعادة تحميلها.
+CHANGE_POLL_MS = 2000
+last_change_id = None
+
+def _apply_row_changes(table, change, to_values, insert_new=lambda row: True, index="end", tags_for=None):
+    """تحديث الصفوف الموجودة (برقمها كمعرف العنصر)، وإضافة الجديدة إن سمح insert_new، وحذف المحذوفة."""
+    for row in change["rows"]:
+        iid = str(row[0])
+        options = {"values": to_values(row)}
+        if tags_for:
+            options["tags"] = tags_for(row)
+        if table.exists(iid):
+            table.item(iid, **options)
+        elif insert_new(row):
+            table.insert("", index, iid=iid, **options)
+    for row_id in change["deleted"]:
+        if table.exists(str(row_id)):
+            table.delete(str(row_id))
+
+def _apply_document_changes(change):
+    today = datecodec.today()
+    # الصفوف الجديدة تُضاف فقط إذا لم يكن هناك بحث أو تصفية قد تستبعدها
+    unfiltered = not search_var.get().strip() and not content_search_var.get() and filter_var.get() == "الكل" \
+        and _selected_facet(category_filter_var, "category") == "الكل" and _selected_facet(tag_filter_var, "tag") == "الكل"
+    _apply_row_changes(doc_table, change, document_values, insert_new=lambda row: unfiltered,
+                       tags_for=lambda row: (get_row_color(row[4], today),))
+    for row in change["rows"]:
+        if doc_table.exists(str(row[0])):
+            expiry_schedule.track(str(row[0]), row[4], today)
+    for doc_id in change["deleted"]:
+        expiry_schedule.forget(str(doc_id))
+        attachment_cache.invalidate(doc_id)
+    schedule_expiry_tick()
+    update_category_filter_options()
+
+def _apply_attachment_changes(change):
+    attachment_cache.apply_changes(change)
+    schedule_attachment_prefetch()
+    selected = doc_table.selection()
+    shown_document = doc_table.item(selected[0])['values'][0] if selected else None
+    _apply_row_changes(attachments_table, change, attachment_values,
+                       insert_new=lambda att: shown_document is not None and att[4] == shown_document)
+
+def _apply_salary_changes(change):
+    department = department_salary_filter_var.get()
+    _apply_row_changes(salary_table, change, salary_values, index=0,
+                       insert_new=lambda sal: department in ("", "الكل") or sal[2] == department)
+
+def _loading_dossiers_changed(tables):
+    """الملفات قيد التحميل التي تخص الموظفين المرتبطين بالتغييرات (ليست في الذاكرة بعد)."""
+    changed = set()
+    for table, change in tables.items():
+        changed |= set(change.get("employees", []))
+        if table == "employees":
+            changed |= {row[0] for row in change["rows"]} | set(change["deleted"])
+    return changed & dossier_state["loading"]
+
+def refresh_from_change_log():
+    """تطبيق التغييرات منذ آخر تحديث على الجداول المفتوحة. يعيد عدد الصفوف المطبقة."""
+    global last_change_id
+    try:
+        if last_change_id is None:
+            last_change_id = get_last_change_id()
+            return 0
+        if get_last_change_id() == last_change_id:
+            return 0
+        changes = fetch_changes_since(last_change_id)
+    except Exception as e:
+        set_status(f"تعذر التحقق من التغييرات: {e}")
+        return 0
+    last_change_id = changes["last"]
+    if changes["reset"]:
+        employee_index.invalidate()
+        dossier_cache.clear()
+        invalidate_dossiers(set(dossier_state["loading"]) | {dossier_state["employee"]})
+        handle_tab_change(None)
+        return 0
+    tables = changes["tables"]
+    invalidate_dossiers(dossier_cache.apply_changes(tables) | _loading_dossiers_changed(tables))
+    if "documents" in tables:
+        _apply_document_changes(tables["documents"])
+    if "attachments" in tables:
+        _apply_attachment_changes(tables["attachments"])
+    if "employees" in tables:
+        _apply_row_changes(emp_table, tables["employees"], employee_values)
+        employee_index.invalidate()
+    if "salaries" in tables:
+        _apply_salary_changes(tables["salaries"])
+    # التبويبات المشتقة من عدة جداول (وصفوف الرواتب التي تعرض اسم الموظف وقسمه) تُعاد كاملة
+    current_tab = notebook.tab(notebook.select(), "text")
+    if current_tab == "سجل التدقيق" or (current_tab in ("المدة المتبقية", "لوحة المعلومات") and "documents" in tables) \
+            or (current_tab == "الرواتب" and "employees" in tables):
+        handle_tab_change(None)
+    return sum(len(change["rows"]) + len(change["deleted"]) for change in tables.values())
+
+def poll_change_log():
+    refresh_from_change_log()
+    root.after(CHANGE_POLL_MS, poll_change_log)
+
+# --- إشعارات التغيير من الخادم (وضع العميل) ---
+remote_changes = queue.Queue()
+
+def poll_remote_changes():
+    """تطبيق إشعارات الخادم في الخيط الرئيسي: جلب الصفوف المتغيرة فقط من سجل التغييرات."""
+    changed = False
+    while not remote_changes.empty():
+        remote_changes.get_nowait()
+        changed = True
+    if changed and refresh_from_change_log():
+        set_status("تم تحديث البيانات بعد تغيير من مستخدم آخر.")
+    root.after(1000, poll_remote_changes)
+
+refresh_from_change_log()
+if SERVER_URL:
+    remote_client.subscribe(remote_changes.put)
+    poll_remote_changes()
+else:
+    poll_change_log()
+    poll_backup_results()
+    # فهرسة محتوى المرفقات في الخلفية. main.py سكربت بلا حارس __main__، فعمليات spawn
+    # (ويندوز وmacOS) ستعيد تشغيله؛ لذا لا يُستخدم مجمع العمليات إلا مع fork.
+    import multiprocessing
+    import content_index
+    content_index.ContentIndexer(workers=1 if multiprocessing.get_start_method() == "fork" else 0).start()
+    if os.environ.get("DMS_BACKUP_INTERVAL_HOURS"):
+        # النسخ المجدول داخل البرنامج؛ في الخوادم يُفضل cron مع: cli.py backup run --if-due
+        import backup
+        backup.start_backup_scheduler(float(os.environ["DMS_BACKUP_INTERVAL_HOURS"]),
+                                      on_error=lambda e: backup_results.put(("error", e)))
+    # صيانة القاعدة (استعادة المساحة، الإحصاءات، فحص السلامة) بعد دقيقتين دون إدخال من المستخدم
+    import time
+    import db_maintenance
+    last_input = {"time": time.monotonic()}
+    root.bind_all("<KeyPress>", lambda event: last_input.update(time=time.monotonic()), add="+")
+    root.bind_all("<ButtonPress>", lambda event: last_input.update(time=time.monotonic()), add="+")
+    maintenance_scheduler = db_maintenance.MaintenanceScheduler(lambda: time.monotonic() - last_input["time"] >= 120).start()
+
 # --- تهيئة الفلاتر وتحميل المستندات والموظفين عند بدء التشغيل ---
 update_category_filter_options()
 load_documents()
 alert_expiring_documents()
 
-root.mainloop()
\ No newline at end of file
+root.mainloop()
+
+if not SERVER_URL:
+    maintenance_scheduler.stop()
+    maintenance_scheduler.wait(5)
+    db_maintenance.close_database()
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+نمذجة الرواتب وتوقعاتها: سيناريوهات "ماذا لو" على كامل القوى العاملة.
+
+يُحمَّل آخر راتب لكل موظف مرة واحدة في مصفوفات NumPy، ثم يُحسب كل سيناريو
+(زيادات نسبية حسب القسم، تغيير البدلات، تعيينات جديدة، توقعات 12–36 شهراً)
+بعمليات متجهة دون حلقات على الموظفين، وتُجمع النتائج حسب القسم بـ bincount.
+
+NumPy مطلوبة لهذه الوحدة فقط؛ بقية البرنامج يعمل دونها.
+"""
+import numpy as np
+
+import backend
+import datecodec
+
+MIN_PROJECTION_MONTHS = 1
+MAX_PROJECTION_MONTHS = 36
+
+RESULT_COLUMNS = [
+    "القسم", "عدد الموظفين", "الصافي الشهري الحالي", "الصافي الشهري المتوقع",
+    "إجمالي الفترة الحالي", "إجمالي الفترة المتوقع", "الفرق",
+]
+
+
+class Workforce:
+    """آخر راتب لكل موظف كمصفوفات متوازية، مع ترميز الأقسام كأرقام صحيحة."""
+
+    def __init__(self, employee_ids, departments, basic, allowances, deductions, payment_methods):
+        self.employee_ids = np.asarray(employee_ids, dtype=np.int64)
+        self.department_names, codes = np.unique(np.asarray(departments, dtype=object).astype(str), return_inverse=True)
+        self.department_names = [str(name) for name in self.department_names]
+        self.department_codes = codes.astype(np.intp)
+        self.basic = np.asarray(basic, dtype=np.float64)
+        self.allowances = np.asarray(allowances, dtype=np.float64)
+        self.deductions = np.asarray(deductions, dtype=np.float64)
+        self.payment_methods = list(payment_methods)
+
+    def __len__(self):
+        return len(self.employee_ids)
+
+
+def load_workforce():
+    """تحميل آخر سجل راتب لكل موظف موجود (حسب تاريخ الدفع ثم الرقم التعريفي)."""
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT employee_id, department, basic_salary, allowances, deductions, payment_method
+            FROM (
+                SELECT s.employee_id, COALESCE(e.department, '') AS department,
+                       s.basic_salary, s.allowances, s.deductions, s.payment_method,
+                       ROW_NUMBER() OVER (PARTITION BY s.employee_id ORDER BY s.payment_date DESC, s.id DESC) AS rn
+                FROM salaries s
+                JOIN employees e ON e.id = s.employee_id
+            )
+            WHERE rn = 1
+            ORDER BY employee_id
+        """)
+        rows = cursor.fetchall()
+    if not rows:
+        return Workforce([], [], [], [], [], [])
+    employee_ids, departments, basic, allowances, deductions, payment_methods = zip(*rows)
+    return Workforce(employee_ids, departments, basic, allowances, deductions, payment_methods)
+
+
+def make_scenario(default_raise_pct=0.0, department_raises=None, allowance_changes=None,
+                  new_hires=None, months=12, annual_raise_pct=0.0):
+    """
+    إنشاء سيناريو كقاموس بسيط:
+    - default_raise_pct: زيادة نسبية على الراتب الأساسي لكل الأقسام (مثلاً 3 تعني 3%).
+    - department_raises: {القسم: نسبة} تتقدم على النسبة العامة لذلك القسم.
+    - allowance_changes: {القسم: مبلغ} يضاف إلى البدلات الشهرية لكل موظف في القسم (قد يكون سالباً).
+    - new_hires: قائمة (القسم، العدد، الأساسي، البدلات، الخصومات).
+    - months: مدة التوقع بالأشهر.
+    - annual_raise_pct: زيادة سنوية مركبة تُطبق على الأساسي في بداية كل 12 شهراً من الفترة.
+    """
+    months = int(months)
+    if not MIN_PROJECTION_MONTHS <= months <= MAX_PROJECTION_MONTHS:
+        raise ValueError(f"مدة التوقع يجب أن تكون بين {MIN_PROJECTION_MONTHS} و{MAX_PROJECTION_MONTHS} شهراً.")
+    return {
+        "default_raise_pct": float(default_raise_pct or 0),
+        "department_raises": {str(k): float(v) for k, v in (department_raises or {}).items()},
+        "allowance_changes": {str(k): float(v) for k, v in (allowance_changes or {}).items()},
+        "new_hires": [(str(d), int(n), float(b), float(a), float(x)) for d, n, b, a, x in (new_hires or [])],
+        "months": months,
+        "annual_raise_pct": float(annual_raise_pct or 0),
+    }
+
+
+def _per_department(values, department_names, default=0.0):
+    return np.array([values.get(name, default) for name in department_names], dtype=np.float64)
+
+
+def apply_scenario(workforce, scenario):
+    """
+    الرواتب الشهرية لكل موظف حالي بعد تطبيق السيناريو.
+    يعيد (basic, allowances, deductions, net) كمصفوفات بنفس ترتيب workforce.
+    """
+    codes = workforce.department_codes
+    raise_pct = _per_department(scenario["department_raises"], workforce.department_names, scenario["default_raise_pct"])
+    allowance_delta = _per_department(scenario["allowance_changes"], workforce.department_names)
+    basic = np.round(workforce.basic * (1 + raise_pct[codes] / 100.0), 2)
+    allowances = np.maximum(workforce.allowances + allowance_delta[codes], 0.0)
+    deductions = workforce.deductions
+    net = np.round(basic + allowances - deductions, 2)
+    return basic, allowances, deductions, net
+
+
+def _money(value):
+    # إضافة 0.0 تحول -0.0 إلى 0.0 في العرض
+    return round(float(value), 2) + 0.0
+
+
+def _basic_growth_factor(months, annual_raise_pct):
+    """مجموع معاملات نمو الأساسي عبر أشهر الفترة: الشهر m يُضرب في (1+r)^(m//12)."""
+    years = np.arange(months) // 12
+    return float(np.sum((1 + annual_raise_pct / 100.0) ** years))
+
+
+def evaluate_scenario(workforce, scenario):
+    """
+    تقييم السيناريو وإرجاع صف لكل قسم بأعمدة RESULT_COLUMNS مع صف الإجمالي في النهاية.
+    الحالي = الرواتب كما هي لنفس المدة دون تعيينات أو زيادات.
+    """
+    months = scenario["months"]
+    names = list(workforce.department_names)
+    for department, *_ in scenario["new_hires"]:
+        if department not in names:
+            names.append(department)
+    size = len(names)
+    codes = workforce.department_codes
+
+    basic, allowances, deductions, net = apply_scenario(workforce, scenario)
+    headcount = np.bincount(codes, minlength=size).astype(np.int64)
+    current_net = np.bincount(codes, weights=workforce.basic + workforce.allowances - workforce.deductions, minlength=size)
+    scenario_basic = np.bincount(codes, weights=basic, minlength=size)
+    scenario_other = np.bincount(codes, weights=allowances - deductions, minlength=size)
+
+    for department, count, hire_basic, hire_allowances, hire_deductions in scenario["new_hires"]:
+        index = names.index(department)
+        headcount[index] += count
+        scenario_basic[index] += count * hire_basic
+        scenario_other[index] += count * (hire_allowances - hire_deductions)
+
+    growth = _basic_growth_factor(months, scenario["annual_raise_pct"])
+    scenario_monthly = scenario_basic + scenario_other
+    current_total = current_net * months
+    scenario_total = scenario_basic * growth + scenario_other * months
+
+    rows = [
+        (names[i], int(headcount[i]), _money(current_net[i]), _money(scenario_monthly[i]),
+         _money(current_total[i]), _money(scenario_total[i]), _money(scenario_total[i] - current_total[i]))
+        for i in sorted(range(size), key=names.__getitem__)
+    ]
+    rows.append((
+        "الإجمالي", int(headcount.sum()), _money(current_net.sum()), _money(scenario_monthly.sum()),
+        _money(current_total.sum()), _money(scenario_total.sum()), _money((scenario_total - current_total).sum()),
+    ))
+    return rows
+
+
+def commit_scenario(workforce, scenario, payment_date_ddmmyyyy, payment_method=None):
+    """
+    اعتماد السيناريو كسجلات رواتب جديدة بتاريخ الدفع المحدد في معاملة واحدة مع حدث تدقيق واحد.
+    الموظفون الذين لديهم راتب في نفس الشهر يُتخطون، والتعيينات الجديدة لا تُعتمد (لا سجلات موظفين لها).
+    يعيد (عدد السجلات المضافة، عدد المتخطين).
+    """
+    payment_day = backend.convert_date_to_db_format(payment_date_ddmmyyyy)
+    if payment_day is None:
+        raise ValueError("يرجى تحديد تاريخ الدفع.")
+    if not len(workforce):
+        return 0, 0
+    month = datecodec.date_from_day(payment_day)
+    month_start, month_end = datecodec.month_range(month.year, month.month)
+    basic, allowances, deductions, net = apply_scenario(workforce, scenario)
+
+    with backend.get_connection() as conn:
+        cursor = conn.cursor()
+        # كما في add_salary: لا رواتب في سنة مغلقة مؤرشفة
+        backend._check_salary_year_open(cursor, payment_day)
+        cursor.execute(
+            "SELECT DISTINCT employee_id FROM salaries WHERE payment_date >= ? AND payment_date < ?",
+            (month_start, month_end)
+        )
+        already_paid = {row[0] for row in cursor.fetchall()}
+        rows = [
+            (int(emp_id), float(basic[i]), float(allowances[i]), float(deductions[i]), float(net[i]),
+             payment_method or workforce.payment_methods[i], payment_day)
+            for i, emp_id in enumerate(workforce.employee_ids.tolist())
+            if emp_id not in already_paid
+        ]
+        try:
+            cursor.executemany(
+                "INSERT INTO salaries (employee_id, basic_salary, allowances, deductions, net_salary, payment_method, payment_date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            backend._insert_audit(cursor, "اعتماد سيناريو رواتب",
+                                  f"تمت إضافة {len(rows)} سجل راتب بتاريخ {payment_date_ddmmyyyy} "
+                                  f"(زيادة عامة {scenario['default_raise_pct']}%، زيادات الأقسام: {scenario['department_raises'] or '-'})")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise Exception(f"❌ فشل اعتماد السيناريو: {e}")
+    return len(rows), len(workforce) - len(rows)
@@ -0,0 +1,267 @@
+"""
+إصدار قسائم الرواتب: ملف HTML لكل سجل راتب في شهر معين (وقسم اختياري) من قالب.
+
+- السجلات تُقرأ من القاعدة على دفعات (backend.iter_salary_batches_for_payslips) وتُوزع الدفعات على
+  مجموعة عمليات بعدد أنوية المعالج، مع حد لعدد الدفعات المعلقة فلا تُحمّل الرواتب كلها في الذاكرة.
+- كل قسيمة تُكتب إلى ملف مؤقت ثم تُعاد تسميته، وكل دفعة مكتملة تُسجل في progress.jsonl مع بصمة قيم
+  السجل والقالب؛ إعادة التشغيل على نفس القاعدة والشهر والقسم تتخطى السجلات التي لم تتغير بصمتها،
+  فيُستأنف الإصدار المقطوع من حيث توقف، وتُعاد كتابة قسائم الرواتب المعدلة بعد إصدارها.
+- index.html يُكتب أخيراً بعد اكتمال كل الدفعات.
+
+القالب نص HTML بمتغيرات string.Template ($employee_name, $net_salary, ...)؛ القيم تُهرّب قبل التعويض.
+للحصول على PDF تُطبع القسائم من المتصفح، إذ لا تعتمد الأداة على مكتبة تحويل خارجية.
+
+بنية المجلد: <مجلد القسائم>/<اسم القاعدة>/<YYYY-MM>[_<القسم>]/
+    <معرف الراتب>_<الرقم الوظيفي>.html، progress.jsonl، index.html
+"""
+import os
+import re
+import json
+import html
+import hashlib
+from string import Template
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import backend
+import datecodec
+import db_registry
+
+PROGRESS_NAME = "progress.jsonl"
+INDEX_NAME = "index.html"
+BATCH_SIZE = 200
+PENDING_BATCHES_PER_WORKER = 2
+
+DEFAULT_TEMPLATE = """<!DOCTYPE html>
+<html lang="ar" dir="rtl">
+<head>
+<meta charset="utf-8">
+<title>قسيمة راتب - $employee_name - $month</title>
+<style>
+body { font-family: Arial, sans-serif; margin: 40px; }
+table { border-collapse: collapse; width: 100%; margin-top: 20px; }
+td, th { border: 1px solid #999; padding: 8px; }
+th { background: #eee; width: 40%; text-align: right; }
+.net { font-weight: bold; font-size: 1.2em; }
+</style>
+</head>
+<body>
+<h2>قسيمة راتب شهر $month</h2>
+<table>
+<tr><th>اسم الموظف</th><td>$employee_name</td></tr>
+<tr><th>الرقم الوظيفي</th><td>$employee_number</td></tr>
+<tr><th>القسم</th><td>$department</td></tr>
+<tr><th>الراتب الأساسي</th><td>$basic_salary</td></tr>
+<tr><th>البدلات</th><td>$allowances</td></tr>
+<tr><th>الخصومات</th><td>$deductions</td></tr>
+<tr><th>صافي الراتب</th><td class="net">$net_salary</td></tr>
+<tr><th>طريقة الدفع</th><td>$payment_method</td></tr>
+<tr><th>تاريخ الدفع</th><td>$payment_date</td></tr>
+</table>
+<p>رقم السجل: $salary_id</p>
+</body>
+</html>
+"""
+
+_UNSAFE_NAME = re.compile(r"[^\w\-]+")
+
+# قالب ومجلد كل عملية عاملة (تُضبط مرة واحدة في _init_worker بدل إرسالها مع كل دفعة)
+_worker = {}
+
+
+def _safe_name(text):
+    return _UNSAFE_NAME.sub("_", str(text)).strip("_")
+
+
+def output_folder(year, month, department=None, base_dir=None, db_path=None):
+    """
+    مجلد إصدار شهر (وقسم) معين لقاعدة db_path (افتراضياً الحالية)؛ نفس المجلد لنفس الطلب ليُستأنف الإصدار فيه.
+    معرفات الرواتب تتكرر بين القواعد، فلكل قاعدة مجلدها.
+    """
+    name = f"{year:04d}-{month:02d}"
+    if department:
+        name += f"_{_safe_name(department)}"
+    stem = os.path.splitext(os.path.basename(db_path or backend.current_database()))[0]
+    return os.path.join(base_dir or db_registry.payslips_dir(), _safe_name(stem), name)
+
+
+def _row_digest(row, template_digest):
+    """بصمة قيم سجل الراتب والقالب: تتغير إذا عُدل الراتب أو الموظف أو القالب بعد الإصدار."""
+    return hashlib.sha256(json.dumps([template_digest, list(row)], ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def _format_amount(value):
+    return f"{value:,.2f}"
+
+
+def _init_worker(template_text, folder):
+    _worker["template"] = Template(template_text)
+    _worker["folder"] = folder
+
+
+def _render_batch(rows, month_label):
+    """
+    كتابة قسائم دفعة [(السجل، بصمته)] في العملية العاملة.
+    يعيد [(معرف الراتب، الملف، الاسم، الرقم الوظيفي، القسم، الصافي، البصمة)].
+    """
+    template = _worker["template"]
+    folder = _worker["folder"]
+    written = []
+    for row, digest in rows:
+        salary_id, _, name, number, department, basic, allowances, deductions, net, method, payment_day = row
+        values = {
+            "salary_id": salary_id,
+            "month": month_label,
+            "employee_name": name,
+            "employee_number": number,
+            "department": department or "",
+            "basic_salary": _format_amount(basic),
+            "allowances": _format_amount(allowances),
+            "deductions": _format_amount(deductions),
+            "net_salary": _format_amount(net),
+            "payment_method": method,
+            "payment_date": datecodec.format_day(payment_day),
+        }
+        filename = f"{salary_id}_{_safe_name(number)}.html"
+        path = os.path.join(folder, filename)
+        with open(path + ".part", "w", encoding="utf-8") as f:
+            f.write(template.safe_substitute({key: html.escape(str(value)) for key, value in values.items()}))
+        os.replace(path + ".part", path)
+        written.append((salary_id, filename, name, number, department or "", net, digest))
+    return written
+
+
+def _read_progress(folder):
+    """
+    القسائم المسجلة في progress.jsonl: {معرف الراتب: بيانات القسيمة}.
+    السطر الأخير المقطوع (انقطاع أثناء الكتابة) يُقص من الملف حتى لا تُلحق به الأسطر الجديدة.
+    """
+    done = {}
+    path = os.path.join(folder, PROGRESS_NAME)
+    if not os.path.exists(path):
+        return done
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                slips = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            for slip in slips:
+                done[slip[0]] = tuple(slip)
+            valid_bytes += len(line)
+    if valid_bytes < os.path.getsize(path):
+        os.truncate(path, valid_bytes)
+    return done
+
+
+def _write_index(folder, slips, month_label, department):
+    rows = "\n".join(
+        f'<tr><td><a href="{html.escape(filename)}">{html.escape(name)}</a></td><td>{html.escape(str(number))}</td>'
+        f"<td>{html.escape(dept)}</td><td>{_format_amount(net)}</td></tr>"
+        for _, filename, name, number, dept, net, *_ in sorted(slips, key=lambda slip: (slip[4], slip[2], slip[0]))
+    )
+    title = f"قسائم رواتب {month_label}" + (f" - {department}" if department else "")
+    content = f"""<!DOCTYPE html>
+<html lang="ar" dir="rtl">
+<head><meta charset="utf-8"><title>{html.escape(title)}</title></head>
+<body>
+<h2>{html.escape(title)}</h2>
+<p>عدد القسائم: {len(slips)}، إجمالي الصافي: {_format_amount(sum(slip[5] for slip in slips))}</p>
+<table border="1" cellpadding="6" style="border-collapse: collapse">
+<tr><th>اسم الموظف</th><th>الرقم الوظيفي</th><th>القسم</th><th>صافي الراتب</th></tr>
+{rows}
+</table>
+</body>
+</html>
+"""
+    path = os.path.join(folder, INDEX_NAME)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(path + ".part", path)
+
+
+def _rewrite_progress(folder, slips):
+    """استبدال progress.jsonl بالقسائم الحالية فقط، دفعة لكل سطر كما يكتبها generate_payslips."""
+    path = os.path.join(folder, PROGRESS_NAME)
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        for start in range(0, len(slips), BATCH_SIZE):
+            f.write(json.dumps([list(slip) for slip in slips[start:start + BATCH_SIZE]], ensure_ascii=False) + "\n")
+    os.replace(path + ".part", path)
+
+
+def generate_payslips(year, month, department=None, template_path=None, base_dir=None, workers=None,
+                      batch_size=BATCH_SIZE, progress=None):
+    """
+    إصدار قسائم رواتب شهر معين. progress(عدد القسائم المكتوبة في هذا التشغيل) بعد كل دفعة.
+    يعيد {"folder": المجلد، "written": ما كُتب الآن، "skipped": ما أُصدر في تشغيل سابق ولم يتغير، "total": إجمالي القسائم}.
+    """
+    if template_path:
+        with open(template_path, encoding="utf-8") as f:
+            template_text = f.read()
+    else:
+        template_text = DEFAULT_TEMPLATE
+    folder = output_folder(year, month, department, base_dir)
+    os.makedirs(folder, exist_ok=True)
+    month_label = f"{month:02d}/{year}"
+    done = _read_progress(folder)
+    template_digest = hashlib.sha256(template_text.encode("utf-8")).hexdigest()
+    skipped = 0
+    written = 0
+    workers = workers or os.cpu_count() or 1
+
+    with open(os.path.join(folder, PROGRESS_NAME), "a", encoding="utf-8") as progress_file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(template_text, folder)) as pool:
+        pending = set()
+        current_ids = set()
+
+        def collect(futures):
+            nonlocal written
+            for future in futures:
+                slips = future.result()
+                progress_file.write(json.dumps(slips, ensure_ascii=False) + "\n")
+                progress_file.flush()
+                for slip in slips:
+                    previous = done.get(slip[0])
+                    # الرقم الوظيفي تغير: القسيمة القديمة باسم ملف آخر
+                    if previous and previous[1] != slip[1]:
+                        try:
+                            os.remove(os.path.join(folder, previous[1]))
+                        except OSError:
+                            pass
+                    done[slip[0]] = slip
+                written += len(slips)
+                if progress:
+                    progress(written)
+
+        for rows in backend.iter_salary_batches_for_payslips(year, month, department, batch_size):
+            current_ids.update(row[0] for row in rows)
+            batch = []
+            for row in rows:
+                digest = _row_digest(row, template_digest)
+                previous = done.get(row[0])
+                if previous is not None and previous[6] == digest:
+                    skipped += 1
+                else:
+                    batch.append((row, digest))
+            if not batch:
+                continue
+            pending.add(pool.submit(_render_batch, batch, month_label))
+            if len(pending) >= workers * PENDING_BATCHES_PER_WORKER:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        collect(wait(pending)[0])
+
+    # سجلات حُذفت منذ تشغيل سابق: تُحذف قسائمها من المجلد ومن progress.jsonl ولا تظهر في الفهرس
+    stale = [slip for salary_id, slip in done.items() if salary_id not in current_ids]
+    slips = [slip for salary_id, slip in done.items() if salary_id in current_ids]
+    if stale:
+        for slip in stale:
+            try:
+                os.remove(os.path.join(folder, slip[1]))
+            except OSError:
+                pass
+        _rewrite_progress(folder, slips)
+    _write_index(folder, slips, month_label, department)
+    return {"folder": folder, "written": written, "skipped": skipped, "total": len(slips)}
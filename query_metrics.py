@@ -0,0 +1,294 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import logging
+from logging.handlers import RotatingFileHandler
+from datetime import datetime
+
+# --- إعدادات القياس ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+LOGS_DIR = os.path.join(script_dir, 'logs')
+SLOW_QUERY_LOG = os.path.join(LOGS_DIR, 'slow_queries.log')
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("DMS_SLOW_QUERY_MS", "200"))
+
+# حدود فئات مخطط زمن الاستجابة بالمللي ثانية (الفئة الأخيرة لما يتجاوز آخر حد)
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+_lock = threading.Lock()
+_statements = {}
+_histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+_totals = {"queries": 0, "errors": 0, "slow": 0, "rows": 0, "time_ms": 0.0}
+_started_at = datetime.now()
+_slow_logger = None
+
+_whitespace_re = re.compile(r"\s+")
+# قائمة معاملات بطول متغير مثل IN (?,?,?) تُختصر إلى IN (?, ...)، فلا يصير كل طول مفتاحاً مستقلاً
+_placeholder_run_re = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def _normalize_statement(sql):
+    """توحيد نص الاستعلام ليصلح كمفتاح للإحصاءات."""
+    return _placeholder_run_re.sub("?, ...", _whitespace_re.sub(" ", sql).strip())
+
+
+def _describe_params(params, many=False):
+    """وصف شكل المعاملات دون تسجيل قيمها."""
+    if many:
+        try:
+            count = len(params)
+        except TypeError:
+            return "many[?]"
+        first = params[0] if count else ()
+        return f"many[{count}]x{_describe_params(first)}"
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ",".join(sorted(str(k) for k in params)) + "}"
+    try:
+        return f"tuple[{len(params)}]"
+    except TypeError:
+        return type(params).__name__
+
+
+def get_file_logger(name, filename):
+    """مسجل باسم name يكتب إلى ملف دوار في مجلد logs (أو لا يكتب شيئاً إذا تعذر إنشاء الملف)."""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        logger.propagate = False
+        try:
+            if not os.path.exists(LOGS_DIR):
+                os.makedirs(LOGS_DIR)
+            handler = RotatingFileHandler(os.path.join(LOGS_DIR, filename), maxBytes=1024 * 1024, backupCount=5, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        except OSError:
+            logger.addHandler(logging.NullHandler())
+        logger.setLevel(logging.INFO)
+    return logger
+
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        _slow_logger = get_file_logger("dms.slow_queries", os.path.basename(SLOW_QUERY_LOG))
+    return _slow_logger
+
+
+def _record(statement, params_shape, rows, elapsed_ms, error=None, plan=None):
+    """تسجيل نتيجة تنفيذ استعلام في العدادات والمخطط وسجل الاستعلامات البطيئة."""
+    bucket = len(LATENCY_BUCKETS_MS)
+    for i, limit in enumerate(LATENCY_BUCKETS_MS):
+        if elapsed_ms <= limit:
+            bucket = i
+            break
+    is_slow = elapsed_ms >= SLOW_QUERY_THRESHOLD_MS
+
+    with _lock:
+        stats = _statements.get(statement)
+        if stats is None:
+            stats = _statements[statement] = {"count": 0, "errors": 0, "rows": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0}
+        stats["count"] += 1
+        stats["rows"] += max(rows, 0)
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        _histogram[bucket] += 1
+        _totals["queries"] += 1
+        _totals["rows"] += max(rows, 0)
+        _totals["time_ms"] += elapsed_ms
+        if error is not None:
+            stats["errors"] += 1
+            _totals["errors"] += 1
+        if is_slow:
+            stats["slow"] += 1
+            _totals["slow"] += 1
+
+    if is_slow or error is not None:
+        entry = {
+            "ms": round(elapsed_ms, 2),
+            "rows": rows,
+            "params": params_shape,
+            "sql": statement,
+        }
+        if plan:
+            entry["plan"] = plan
+        if error is not None:
+            entry["error"] = str(error)
+        _get_slow_logger().info(json.dumps(entry, ensure_ascii=False))
+
+
+def _explain(connection, sql, params):
+    """جلب خطة تنفيذ الاستعلام (EXPLAIN QUERY PLAN) كنص مختصر."""
+    head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    if head not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE"):
+        return None
+    try:
+        cursor = sqlite3.Connection.cursor(connection)
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params if params is not None else ())
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception:
+        return None
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """مؤشر يقيس زمن كل استعلام وعدد صفوفه."""
+
+    def _begin(self, sql, params_shape, params):
+        self._finish()
+        self._m_sql = sql
+        self._m_params = params
+        self._m_many = False
+        self._m_shape = params_shape
+        self._m_rows = 0
+        self._m_elapsed = 0.0
+        self._m_open = True
+
+    def _finish(self, error=None):
+        if not getattr(self, "_m_open", False):
+            return
+        self._m_open = False
+        elapsed_ms = self._m_elapsed * 1000.0
+        plan = None
+        if elapsed_ms >= SLOW_QUERY_THRESHOLD_MS and error is None and not self._m_many:
+            plan = _explain(self.connection, self._m_sql, self._m_params)
+        rows = self._m_rows
+        if rows == 0 and self.rowcount > 0:
+            rows = self.rowcount
+        _record(_normalize_statement(self._m_sql), self._m_shape, rows, elapsed_ms, error, plan)
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except StopIteration:
+            raise
+        except Exception as e:
+            self._m_elapsed += time.perf_counter() - start
+            self._finish(error=e)
+            raise
+        finally:
+            if getattr(self, "_m_open", False):
+                self._m_elapsed += time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, _describe_params(parameters), parameters)
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        # قائمة واحدة تُمرر للقياس وللتنفيذ، ولا يُطلب EXPLAIN لدفعات executemany
+        if not isinstance(seq_of_parameters, list):
+            seq_of_parameters = list(seq_of_parameters)
+        self._begin(sql, _describe_params(seq_of_parameters, many=True), seq_of_parameters)
+        self._m_many = True
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._finish()
+        return self
+
+    def executescript(self, sql_script):
+        self._begin(sql_script, "script", None)
+        self._timed(super().executescript, sql_script)
+        self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        elif getattr(self, "_m_open", False):
+            self._m_rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, size if size is not None else self.arraysize)
+        if getattr(self, "_m_open", False):
+            self._m_rows += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if getattr(self, "_m_open", False):
+            self._m_rows += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if getattr(self, "_m_open", False):
+            self._m_rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """اتصال SQLite تمر كل استعلاماته عبر InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+# --- واجهة الإحصاءات ---
+def get_metrics_snapshot():
+    """إرجاع نسخة من العدادات والمخطط وإحصاءات كل استعلام مرتبة حسب الزمن الكلي."""
+    with _lock:
+        statements = [dict(stats, statement=sql) for sql, stats in _statements.items()]
+        histogram = list(_histogram)
+        totals = dict(_totals)
+    for stats in statements:
+        stats["avg_ms"] = stats["total_ms"] / stats["count"] if stats["count"] else 0.0
+    statements.sort(key=lambda s: s["total_ms"], reverse=True)
+    labels = [f"<= {limit} ms" for limit in LATENCY_BUCKETS_MS] + [f"> {LATENCY_BUCKETS_MS[-1]} ms"]
+    return {
+        "since": _started_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "slow_threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+        "totals": totals,
+        "histogram": list(zip(labels, histogram)),
+        "statements": statements,
+    }
+
+
+def dump_metrics(filepath):
+    """حفظ لقطة الإحصاءات في ملف JSON."""
+    with open(filepath, "w", encoding="utf-8") as f:
+        json.dump(get_metrics_snapshot(), f, ensure_ascii=False, indent=2)
+    return filepath
+
+
+def reset_metrics():
+    """تصفير جميع العدادات."""
+    global _started_at
+    with _lock:
+        _statements.clear()
+        for i in range(len(_histogram)):
+            _histogram[i] = 0
+        for key in _totals:
+            _totals[key] = 0.0 if key == "time_ms" else 0
+        _started_at = datetime.now()
@@ -0,0 +1,144 @@
+"""
+عميل خادم المستندات (server.py).
+
+بعد استدعاء activate(url) تحل هذه الوحدة محل backend في sys.modules، فتعمل
+عبارات `from backend import ...` الموجودة دون تغيير، وتُرسل كل دالة إلى الخادم
+كطلب JSON. الدوال الحسابية البحتة (تحويل التواريخ وحساب الصافي) تبقى محلية.
+دوال الملفات (add_attachment وreadable_attachment_path) ترفع محتوى الملف وتنزله بدل تمرير
+مسارات لا معنى لها على الجهاز الآخر. الرمز المشترك يُرسل مع كل طلب (DMS_SERVER_TOKEN).
+"""
+import os
+import sys
+import json
+import shutil
+import threading
+import urllib.request
+import urllib.error
+from urllib.parse import quote, unquote
+
+import attachment_store
+import backend as _local_backend
+
+SERVER_URL = None
+SERVER_TOKEN = None
+REQUEST_TIMEOUT = 60
+TOKEN_HEADER = "X-DMS-Token"
+FILENAME_HEADER = "X-DMS-Filename"
+DOWNLOAD_DIR = os.path.join(attachment_store.CACHE_DIR, "remote")
+
+# دوال لا تلمس قاعدة البيانات فلا داعي لإرسالها إلى الخادم
+_LOCAL_FUNCTIONS = {
+    "convert_date_to_db_format": _local_backend.convert_date_to_db_format,
+    "convert_date_from_db_format": _local_backend.convert_date_from_db_format,
+    "calculate_remaining_time": _local_backend.calculate_remaining_time,
+    "calculate_net_salary": _local_backend.calculate_net_salary,
+}
+
+
+def _headers(extra=None):
+    headers = dict(extra or {})
+    if SERVER_TOKEN:
+        headers[TOKEN_HEADER] = SERVER_TOKEN
+    return headers
+
+
+def _open(request, timeout=REQUEST_TIMEOUT):
+    """إرسال طلب إلى الخادم وتحويل أخطائه إلى ValueError أو Exception كما في backend."""
+    try:
+        return urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        try:
+            payload = json.loads(e.read())
+        except ValueError:
+            raise Exception(f"❌ خطأ من الخادم: HTTP {e.code}")
+        if payload.get("type") == "ValueError":
+            raise ValueError(payload.get("error"))
+        raise Exception(payload.get("error"))
+    except urllib.error.URLError as e:
+        raise Exception(f"❌ تعذر الاتصال بالخادم {SERVER_URL}: {e.reason}")
+
+
+def call(method, *args, **kwargs):
+    """استدعاء دالة من backend على الخادم وإرجاع نتيجتها."""
+    body = json.dumps({"args": args, "kwargs": kwargs}, ensure_ascii=False).encode("utf-8")
+    request = urllib.request.Request(
+        f"{SERVER_URL}/call/{method}", data=body,
+        headers=_headers({"Content-Type": "application/json; charset=utf-8"}), method="POST"
+    )
+    with _open(request) as response:
+        return json.loads(response.read())["result"]
+
+
+def add_attachment(document_id, original_filepath):
+    """رفع محتوى ملف محلي إلى الخادم وإرفاقه بالمستند."""
+    filename = os.path.basename(original_filepath)
+    with open(original_filepath, "rb") as f:
+        request = urllib.request.Request(
+            f"{SERVER_URL}/attachments/{int(document_id)}?filename={quote(filename)}", data=f,
+            headers=_headers({"Content-Type": "application/octet-stream",
+                              "Content-Length": str(os.path.getsize(original_filepath))}),
+            method="POST"
+        )
+        with _open(request) as response:
+            return json.loads(response.read())["result"]
+
+
+def readable_attachment_path(attachment_id):
+    """تنزيل مرفق من الخادم إلى نسخة مؤقتة محلية وإرجاع مسارها لفتحها."""
+    request = urllib.request.Request(f"{SERVER_URL}/attachments/{int(attachment_id)}", headers=_headers())
+    attachment_store.ensure_private_dir(attachment_store.CACHE_DIR)
+    attachment_store.ensure_private_dir(DOWNLOAD_DIR)
+    with _open(request) as response:
+        filename = os.path.basename(unquote(response.headers.get(FILENAME_HEADER, ""))) or "attachment"
+        path = os.path.join(DOWNLOAD_DIR, f"{int(attachment_id)}_{filename}")
+        with open(path + ".part", "wb") as f:
+            shutil.copyfileobj(response, f, attachment_store.CHUNK_SIZE)
+    os.replace(path + ".part", path)
+    attachment_store.trim_cache(path)
+    return path
+
+
+def __getattr__(name):
+    if name in _LOCAL_FUNCTIONS:
+        return _LOCAL_FUNCTIONS[name]
+    if name.startswith("_"):
+        raise AttributeError(name)
+
+    def remote_function(*args, **kwargs):
+        return call(name, *args, **kwargs)
+    remote_function.__name__ = name
+    return remote_function
+
+
+def activate(url, token=None):
+    """تفعيل وضع العميل: توجيه كل استيرادات backend إلى الخادم."""
+    global SERVER_URL, SERVER_TOKEN
+    SERVER_URL = url.rstrip("/")
+    SERVER_TOKEN = token or os.environ.get("DMS_SERVER_TOKEN")
+    sys.modules["backend"] = sys.modules[__name__]
+
+
+def subscribe(callback, poll_timeout=25):
+    """
+    بدء خيط خلفي ينتظر إشعارات التغيير من الخادم ويمرر كل دفعة أحداث إلى callback.
+    يُستدعى callback من الخيط الخلفي، فعلى الواجهة تمرير العمل إلى الخيط الرئيسي.
+    """
+    def listen():
+        since = None
+        while True:
+            try:
+                # الطلب الأول يجلب الرقم التسلسلي الحالي فقط دون انتظار
+                timeout = poll_timeout if since is not None else 0
+                url = f"{SERVER_URL}/events?since={since or 0}&timeout={timeout}"
+                request = urllib.request.Request(url, headers=_headers())
+                with urllib.request.urlopen(request, timeout=poll_timeout + 10) as response:
+                    payload = json.loads(response.read())
+                if since is not None and payload["events"]:
+                    callback(payload["events"])
+                since = payload["seq"]
+            except Exception:
+                threading.Event().wait(5)
+
+    thread = threading.Thread(target=listen, name="dms-events", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,86 @@
+"""
+ذاكرة LRU لنتائج البحث في المستندات مع تضييق تزايدي في الذاكرة.
+
+- المفتاح: (الكلمة الموحدة، الكلمة كما كُتبت، النطاق)؛ النطاق هو العلامة ومصدر البحث (الحقول أو مع الأرشيف).
+  الفئة وحالة الصلاحية لا تدخلان المفتاح: تُطبقان على النتيجة المحفوظة في الواجهة دون استعلام.
+- كل المدخلات مرتبطة بجيل واحد هو رقم آخر تغيير في سجل التغييرات؛ إذا تغير الرقم تُسقط كلها.
+- إذا كانت الكلمة الجديدة امتداداً لكلمة محفوظة في نفس النطاق (مثل "جوا" ثم "جواز") تُصفّى النتيجة الأعم
+  في الذاكرة بقاعدة المطابقة نفسها في backend.fetch_documents (الاسم والجهة بصيغتهما الموحدة، والرقم والفئة
+  والعلامات كما كُتبت)، فكل صف يطابق الكلمة الأطول موجود حتماً في نتيجة الأقصر.
+  لا يُضيَّق من نتائج تقريبية ولا من نتيجة أكبر من NARROW_LIMIT.
+- نتائج بحث المحتوى لا تُحفظ أصلاً: مفهرس المرفقات (content_index) يكتب نصوصها في الخلفية دون المرور
+  بسجل التغييرات، فلا يكشف الجيل أنها صارت قديمة.
+"""
+from collections import OrderedDict
+
+from arabic_text import normalize_arabic
+
+DEFAULT_SIZE = 16
+NARROW_LIMIT = 20000
+CONTENT_SOURCE = "content"
+
+
+def keyword_matches(row, norm, raw):
+    """هل يطابق صف المستند (بشكل fetch_documents) الكلمة الموحدة norm أو الكلمة raw (بعد casefold)؟"""
+    if norm in (normalize_arabic(row[1]) or "") or norm in (normalize_arabic(row[5]) or ""):
+        return True
+    return any(raw in str(value or "").casefold() for value in (row[2], row[6], row[7]))
+
+
+class DocumentSearchCache:
+    """{(norm, raw, scope): (الصفوف، تقريبية)} بترتيب آخر استخدام، لجيل واحد من سجل التغييرات."""
+
+    def __init__(self, maxsize=DEFAULT_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._generation = None
+
+    @staticmethod
+    def _key(keyword, scope):
+        return normalize_arabic(keyword) or "", keyword.strip().casefold(), tuple(scope)
+
+    def _set_generation(self, generation):
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def clear(self):
+        self._entries.clear()
+
+    def lookup(self, keyword, scope, generation):
+        """(الصفوف، تقريبية) من الذاكرة مباشرة أو بتضييق نتيجة أعم، أو None إذا لزم الاستعلام."""
+        if scope[-1] == CONTENT_SOURCE:
+            return None
+        self._set_generation(generation)
+        key = self._key(keyword, scope)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            return entry
+        norm, raw, scope = key
+        # أخص نتيجة محفوظة تصلح كنتيجة أعم
+        best = None
+        for (cached_norm, cached_raw, cached_scope), (rows, approximate) in self._entries.items():
+            if cached_scope != scope or approximate or len(rows) > NARROW_LIMIT:
+                continue
+            if norm.startswith(cached_norm) and raw.startswith(cached_raw):
+                if best is None or len(rows) < len(best):
+                    best = rows
+        if best is None:
+            return None
+        narrowed = [row for row in best if keyword_matches(row, norm, raw)]
+        if not narrowed:
+            # قد تعرض الواجهة نتائج تقريبية عند غياب المطابقة التامة، فيلزم الاستعلام
+            return None
+        self.store(keyword, scope, generation, narrowed)
+        return narrowed, False
+
+    def store(self, keyword, scope, generation, rows, approximate=False):
+        if scope[-1] == CONTENT_SOURCE:
+            return
+        self._set_generation(generation)
+        key = self._key(keyword, scope)
+        self._entries[key] = (list(rows), approximate)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
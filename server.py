@@ -0,0 +1,353 @@
+"""
+خادم HTTP/JSON محلي يعرض دوال backend لعدة عملاء في نفس الوقت.
+
+- القراءات تُنفذ بالتوازي على مجمع خيوط ثابت، لكل خيط اتصال دائم بقاعدة البيانات.
+- الكتابات تمر عبر كاتب واحد (خيط وحيد) فلا تتنافس على قفل الملف.
+- العملاء يستقبلون إشعارات التغيير عبر طلب انتظار طويل على /events.
+- ملفات المرفقات تُرفع بمحتواها إلى POST /attachments/<معرف المستند>?filename=... وتُنزل من
+  GET /attachments/<معرف المرفق>، فلا يقرأ الخادم أو العميل مسارات الطرف الآخر.
+- كل طلب (عدا /health) يحمل الرمز المشترك في الترويسة X-DMS-Token. بلا رمز يُقبل التشغيل على
+  عنوان محلي فقط.
+
+التشغيل:
+    python server.py --port 8765 --workers 8
+    DMS_SERVER_TOKEN=<رمز سري> python server.py --host 0.0.0.0 --port 8765
+"""
+import os
+import sys
+import argparse
+import hmac
+import ipaddress
+import json
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+import attachment_store
+import backend
+import db_registry
+
+# الدوال المسموح باستدعائها عن بُعد
+READ_METHODS = {
+    "fetch_employee_id_name",
+    "fetch_all_employees",
+    "fetch_audit_log",
+    "get_attachments_for_document",
+    "get_attachments_for_documents",
+    "get_all_categories",
+    "get_document_facets",
+    "get_all_departments",
+    "fetch_all_documents_for_export",
+    "fetch_documents",
+    "fuzzy_search_documents",
+    "search_document_content",
+    "search_employees",
+    "fetch_documents_with_expiry",
+    "count_expiring_documents",
+    "get_dashboard_stats",
+    "fetch_expiry_calendar",
+    "fetch_expiring_documents",
+    "fetch_all_salaries",
+    "fetch_all_salaries_for_export",
+    "get_last_employee_salary",
+    "salary_exists_for_month",
+    "fetch_employee_salary_history",
+    "fetch_employee_dossier",
+    "current_database",
+    "fetch_payroll_summary",
+    "get_payroll_summary_years",
+    "preview_salary_adjustment",
+    "get_last_change_id",
+    "fetch_changes_since",
+    "get_archive_partitions",
+    "archivable_years",
+}
+
+WRITE_METHODS = {
+    "create_database",
+    "log_data_export",
+    "add_document",
+    "update_document",
+    "delete_document",
+    "delete_documents",
+    "add_employee",
+    "update_employee",
+    "delete_employee",
+    "delete_attachment",
+    "delete_attachments",
+    "add_salary",
+    "update_salary",
+    "delete_salary",
+    "prepare_monthly_salaries",
+    "rebuild_payroll_summary",
+    "rebuild_document_stats",
+    "apply_salary_adjustment",
+    "archive_closed_years",
+}
+
+EVENTS_HISTORY = 1000
+LONG_POLL_TIMEOUT = 25
+TOKEN_HEADER = "X-DMS-Token"
+FILENAME_HEADER = "X-DMS-Filename"
+MAX_UPLOAD_BYTES = int(os.environ.get("DMS_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+# الرمز المشترك المطلوب من العملاء (يُضبط في run_server)
+server_token = None
+
+
+class ChangeFeed:
+    """سجل أحداث التغيير في الذاكرة مع انتظار العملاء على رقم تسلسلي."""
+
+    def __init__(self, maxlen=EVENTS_HISTORY):
+        self._events = deque(maxlen=maxlen)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @property
+    def seq(self):
+        with self._cond:
+            return self._seq
+
+    def publish(self, method):
+        with self._cond:
+            self._seq += 1
+            self._events.append({"seq": self._seq, "method": method, "time": time.time()})
+            self._cond.notify_all()
+
+    def wait_since(self, since, timeout):
+        """انتظار أحداث أحدث من since حتى انقضاء المهلة."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seq <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            events = [e for e in self._events if e["seq"] > since]
+            return self._seq, events
+
+
+change_feed = ChangeFeed()
+# كاتب وحيد: كل عمليات الكتابة تُسلسل عبر هذا المنفذ
+writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dms-writer")
+# مجمع القراءة: يُنشأ في run_server بالحجم المطلوب
+readers = None
+
+
+def _to_jsonable(value):
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_jsonable(v) for k, v in value.items()}
+    if hasattr(value, "__next__"):
+        return [_to_jsonable(v) for v in value]
+    return value
+
+
+# صيانة القاعدة (db_maintenance) تعمل فقط بعد هذه المدة دون طلبات
+IDLE_SECONDS = 60
+last_request_time = time.monotonic()
+
+
+def is_idle():
+    return time.monotonic() - last_request_time >= IDLE_SECONDS
+
+
+def dispatch(method, args, kwargs):
+    """تنفيذ دالة من backend: الكتابات عبر الكاتب الوحيد والقراءات عبر مجمع القراءة."""
+    global last_request_time
+    last_request_time = time.monotonic()
+    if method in WRITE_METHODS:
+        result = writer.submit(getattr(backend, method), *args, **kwargs).result()
+        change_feed.publish(method)
+        return result
+    if method in READ_METHODS:
+        return readers.submit(getattr(backend, method), *args, **kwargs).result()
+    raise LookupError(f"الدالة غير مسموح بها: {method}")
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def store_uploaded_attachment(document_id, filename, stream, length):
+    """حفظ ملف مرفوع في مجلد مؤقت ثم إرفاقه عبر الكاتب الوحيد (add_attachment ينسخه إلى مجلد المرفقات)."""
+    global last_request_time
+    last_request_time = time.monotonic()
+    filename = os.path.basename(filename or "")
+    if not filename:
+        raise ValueError("اسم الملف المرفوع مطلوب.")
+    if length > MAX_UPLOAD_BYTES:
+        raise ValueError(f"حجم الملف يتجاوز الحد المسموح ({MAX_UPLOAD_BYTES // (1024 * 1024)} ميجابايت).")
+    temp_dir = tempfile.mkdtemp(prefix="dms_upload_")
+    try:
+        temp_path = os.path.join(temp_dir, "upload")
+        remaining = length
+        with open(temp_path, "wb") as f:
+            while remaining:
+                chunk = stream.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError("انقطع رفع الملف قبل اكتماله.")
+                f.write(chunk)
+                remaining -= len(chunk)
+        result = writer.submit(backend.add_attachment, document_id, temp_path, filename).result()
+        change_feed.publish("add_attachment")
+        return result
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _authorized(self):
+        """التحقق من الرمز المشترك؛ يرسل 401 ويعيد False إذا لم يطابق."""
+        if server_token is None or hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), server_token):
+            return True
+        self._send_json(401, {"error": "رمز الخادم مفقود أو غير صحيح", "type": "PermissionError"})
+        return False
+
+    def _send_error(self, error):
+        if isinstance(error, LookupError):
+            self._send_json(404, {"error": str(error), "type": "LookupError"})
+        elif isinstance(error, ValueError):
+            self._send_json(400, {"error": str(error), "type": "ValueError"})
+        else:
+            self._send_json(500, {"error": str(error), "type": "Exception"})
+
+    def _send_attachment(self, attachment_id):
+        """إرسال المحتوى الأصلي لمرفق (مفكوكاً إن كان مضغوطاً)."""
+        filename, filepath = readers.submit(backend.get_attachment_file, attachment_id).result()
+        if not os.path.exists(filepath):
+            raise LookupError("ملف المرفق غير موجود على الخادم.")
+        filepath = attachment_store.readable_path(filepath)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(os.path.getsize(filepath)))
+        self.send_header(FILENAME_HEADER, quote(filename))
+        self.end_headers()
+        with open(filepath, "rb") as f:
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._send_json(200, {"status": "ok", "seq": change_feed.seq})
+            return
+        if not self._authorized():
+            return
+        if url.path == "/events":
+            query = parse_qs(url.query)
+            since = int(query.get("since", ["0"])[0])
+            timeout = min(float(query.get("timeout", [LONG_POLL_TIMEOUT])[0]), LONG_POLL_TIMEOUT)
+            seq, events = change_feed.wait_since(since, timeout)
+            self._send_json(200, {"seq": seq, "events": events})
+        elif url.path.startswith("/attachments/"):
+            try:
+                self._send_attachment(int(url.path[len("/attachments/"):]))
+            except Exception as e:
+                self._send_error(e)
+        else:
+            self._send_json(404, {"error": "غير موجود", "type": "LookupError"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if not self._authorized():
+            # الجسم غير المقروء يفسد الاتصال الدائم التالي
+            self.close_connection = True
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if url.path.startswith("/attachments/"):
+                filename = parse_qs(url.query).get("filename", [""])[0]
+                if length > MAX_UPLOAD_BYTES:
+                    self.close_connection = True
+                result = store_uploaded_attachment(int(url.path[len("/attachments/"):]), filename, self.rfile, length)
+            elif url.path.startswith("/call/"):
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                result = dispatch(url.path[len("/call/"):], payload.get("args", []), payload.get("kwargs", {}))
+            else:
+                self.close_connection = True
+                raise LookupError("غير موجود")
+            self._send_json(200, {"result": _to_jsonable(result)})
+        except Exception as e:
+            self._send_error(e)
+
+
+class DocumentServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # عشرات العملاء قد يتصلون في اللحظة نفسها
+    request_queue_size = 128
+
+
+def run_server(host="127.0.0.1", port=8765, workers=8, token=None):
+    """
+    تشغيل الخادم حتى الإيقاف بـ Ctrl+C. كل طلب HTTP في خيط خفيف، والوصول للقاعدة عبر المجمعين.
+    token هو الرمز المشترك المطلوب من العملاء، وهو إلزامي إذا لم يكن host عنواناً محلياً.
+    """
+    global readers, server_token
+    if not token and not is_loopback(host):
+        raise ValueError(f"❌ التشغيل على {host} يتطلب رمزاً مشتركاً (--token أو DMS_SERVER_TOKEN)، "
+                         "وإلا يمكن لأي جهاز في الشبكة تعديل البيانات.")
+    server_token = token or None
+    backend.enable_connection_reuse()
+    readers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dms-reader")
+    writer.submit(backend.create_database).result()
+    if os.environ.get("DMS_BACKUP_INTERVAL_HOURS"):
+        import backup
+        backup.start_backup_scheduler(float(os.environ["DMS_BACKUP_INTERVAL_HOURS"]),
+                                      on_error=lambda e: print(f"فشل النسخ الاحتياطي المجدول: {e}", file=sys.stderr))
+    import content_index
+    content_index.ContentIndexer(workers=2).start()
+    import db_maintenance
+    db_maintenance.MaintenanceScheduler(is_idle, on_error=lambda e: print(f"فشلت صيانة القاعدة: {e}", file=sys.stderr)).start()
+    server = DocumentServer((host, port), RequestHandler)
+    print(f"خادم المستندات يعمل على http://{host}:{port} ({workers} اتصال قراءة)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        readers.shutdown(wait=False)
+        writer.submit(db_maintenance.close_database).result()
+        writer.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="خادم نظام إدارة المستندات")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--db", help="اسم قاعدة البيانات من السجل أو مسار ملفها")
+    parser.add_argument("--token", default=os.environ.get("DMS_SERVER_TOKEN"),
+                        help="الرمز المشترك المطلوب من العملاء (إلزامي لغير العناوين المحلية)")
+    options = parser.parse_args()
+    if options.db:
+        backend.set_database(db_registry.resolve_database(options.db))
+    try:
+        run_server(options.host, options.port, options.workers, options.token)
+    except ValueError as e:
+        sys.exit(str(e))